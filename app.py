@@ -1,34 +1,36 @@
 import streamlit as st
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm, mm
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfgen import canvas as rl_canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-from reportlab.platypus.flowables import Flowable
+from concurrent.futures import Future, wait
 from datetime import datetime
-import io
+import copy
+import threading
+import traceback
 import pytz
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
-import re
+import pandas as pd
+
+from form_schema import (CHINESE_CITIES, PROTOCOLS, SAMPLE_TYPES, FEEL_OPTIONS, YES_NO, FIT_SIZES, TESTERS,
+                         get_protocol, ensure_protocol_fields, default_form_data)
+from pdf_report import render_report, report_texts
+from html_preview import PreviewCache, render_preview
+from translation import set_usage_log, translate_text, translate_within
+from translation_usage import UsageLog
+from autosave import DraftStore, new_draft_id
+from records import RecordStore
+from scheduler import INTERACTIVE, Overloaded, Scheduler
+from render_queue import QUEUE_URL, FileStore, open_broker, remote_renderer
+from pdf_archive import Archive
+from compare_report import render_comparison
+from render_profile import capture
+from tester_scores import panel_stats, score_matrix, set_scores, sync_day_scores
+from xlsx_import import import_workbook
 
 load_dotenv()
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
 openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
 
-# ─── Register Chinese font once ────────────────────────────────────────────────
-try:
-    pdfmetrics.registerFont(UnicodeCIDFont('STSong-Light'))
-    CHINESE_FONT = 'STSong-Light'
-except Exception:
-    CHINESE_FONT = 'Helvetica'
-
 # ─── Page config ───────────────────────────────────────────────────────────────
 st.set_page_config(
     page_title="Grandstep Wear Test Assessment",
@@ -37,33 +39,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ─── Constants ─────────────────────────────────────────────────────────────────
-CHINESE_CITIES = {
-    "Guangzhou":"广州","Shenzhen":"深圳","Dongguan":"东莞","Foshan":"佛山",
-    "Zhongshan":"中山","Huizhou":"惠州","Zhuhai":"珠海","Jiangmen":"江门",
-    "Zhaoqing":"肇庆","Shanghai":"上海","Beijing":"北京","Suzhou":"苏州",
-    "Hangzhou":"杭州","Ningbo":"宁波","Wenzhou":"温州","Wuhan":"武汉",
-    "Chengdu":"成都","Chongqing":"重庆","Tianjin":"天津","Nanjing":"南京",
-    "Xi'an":"西安","Qingdao":"青岛","Dalian":"大连","Shenyang":"沈阳",
-    "Changsha":"长沙","Zhengzhou":"郑州","Jinan":"济南","Harbin":"哈尔滨",
-    "Changchun":"长春","Taiyuan":"太原","Shijiazhuang":"石家庄","Lanzhou":"兰州",
-    "Xiamen":"厦门","Fuzhou":"福州","Nanning":"南宁","Kunming":"昆明",
-    "Guiyang":"贵阳","Haikou":"海口","Ürümqi":"乌鲁木齐","Lhasa":"拉萨",
-}
-
-time_periods  = ["1 Hour","1 Day","1 Week","2 Weeks","3 Weeks","4 Weeks"]
-days_to_track = ["Day 1","Day 2","Day 3","Day 4","Day 5","Day 6","Day 7",
-                 "2 Weeks","3 Weeks","4 Weeks","5 Weeks"]
-questions_d   = [
-    "Does shoe feel unstable when walking?",
-    "Any upper broken or damage?",
-    "Any sole gapping?",
-    "Does lining color come off?",
-    "Any appearance changes?",
-    "Any piece rubbing feet?",
-    "Is bottom severely worn?"
-]
-
 # ─── UI text lookup ────────────────────────────────────────────────────────────
 UI_TEXTS = {
     "en": {
@@ -86,6 +61,7 @@ UI_TEXTS = {
         "description":        "Description",
         "sample_type":        "Sample Type",
         "testers":            "Testers",
+        "protocol":           "Test Protocol",
         "fit_sizes":          "Fit Sizes",
         "upper_feel":         "Upper Material Feel",
         "lining_feel":        "Lining Material Feel",
@@ -109,6 +85,8 @@ UI_TEXTS = {
         "tab_basic":          "📋 Basic Info",
         "tab_testing":        "🧪 Testing Data",
         "tab_final":          "📊 Final Assessment",
+        "tab_preview":        "👁 Preview",
+        "preview_cached_tx":  "Free text shows translations already fetched; the rest is translated when the PDF is generated.",
         "fill_required":      "Please fill in at least PO Number and Brand!",
         "creating_pdf":       "Creating your professional PDF report...",
         "generate_success":   "PDF Generated Successfully!",
@@ -116,7 +94,9 @@ UI_TEXTS = {
         "report_language":    "Report Language",
         "generated":          "Generated",
         "location":           "Location",
+        "file_size":          "File Size",
         "error_generating":   "Error generating PDF",
+        "server_busy":        "The server is busy right now, please try again in a moment",
         "footer_text":        "Grandstep Wear Test Assessment System",
         "powered_by":         "Powered by Streamlit",
         "copyright":          "© 2025 - Professional Footwear Testing Platform",
@@ -148,6 +128,42 @@ UI_TEXTS = {
         "red_marks_q":        "Red marks after removing socks?",
         "instructions_title": "Quick Guide",
         "instructions":       "1. Fill all required fields\n2. Select preferred languages\n3. Choose testing location\n4. Generate PDF report\n5. Download and share",
+        "import_title":       "Import Spreadsheet",
+        "import_help":        "Legacy .xlsx, one assessment per row",
+        "import_button":      "Import",
+        "import_done":        "Imported {imported} of {rows} rows",
+        "import_skipped":     "{skipped} rows skipped",
+        "import_ignored":     "Ignored columns",
+        "tx_pending":         "Some translations were still on their way; they show the original text marked 【原文】. A fully translated PDF is being prepared…",
+        "tx_ready":           "Fully translated PDF ready",
+        "download_translated":"📥 Download Translated PDF",
+        "archive_title":      "Past Reports",
+        "archive_search":     "PO number or style",
+        "archive_none":       "No archived reports match",
+        "archive_pick":       "Report to download",
+        "archive_failed":     "Report not archived; the download below is unaffected",
+        "compare_title":      "Compare Samples",
+        "compare_style":      "Style",
+        "compare_pick":       "Samples (first one is the baseline)",
+        "compare_button":     "Build Comparison PDF",
+        "compare_download":   "📥 Download Comparison",
+        "compare_need_two":   "Pick at least two saved samples of this style",
+        "usage_title":        "Translation Usage",
+        "usage_reports":      "Reports",
+        "usage_calls":        "API calls",
+        "usage_cost":         "Cost (USD)",
+        "usage_per_report":   "Per report",
+        "usage_hit_rate":     "Cache hits",
+        "usage_tokens":       "Tokens in / out",
+        "usage_latency":      "Latency p50 / p95",
+        "usage_hist":         "Call latency (ms)",
+        "usage_by_length":    "Latency by input length",
+        "usage_recent":       "Recent reports",
+        "usage_none":         "No translation calls recorded yet",
+        "panel_hint":         "Several testers: enter each tester's score per day (leave blank if not scored). Day scores in the report are the panel means.",
+        "panel_mean":         "Panel mean",
+        "panel_min":          "Lowest",
+        "panel_spread":       "Spread (max-min)",
     },
     "zh": {
         "title":              "Grandstep 穿着测试评估",
@@ -169,6 +185,7 @@ UI_TEXTS = {
         "description":        "描述",
         "sample_type":        "样品类型",
         "testers":            "测试人员",
+        "protocol":           "测试方案",
         "fit_sizes":          "试穿尺码",
         "upper_feel":         "鞋面材料感觉",
         "lining_feel":        "内里材料感觉",
@@ -192,6 +209,8 @@ UI_TEXTS = {
         "tab_basic":          "📋 基本信息",
         "tab_testing":        "🧪 测试数据",
         "tab_final":          "📊 最终评估",
+        "tab_preview":        "👁 预览",
+        "preview_cached_tx":  "自由文本仅显示已获取的翻译，其余内容在生成PDF时翻译。",
         "fill_required":      "请至少填写PO编号和品牌！",
         "creating_pdf":       "正在创建专业PDF报告...",
         "generate_success":   "PDF生成成功！",
@@ -199,7 +218,9 @@ UI_TEXTS = {
         "report_language":    "报告语言",
         "generated":          "生成时间",
         "location":           "地点",
+        "file_size":          "文件大小",
         "error_generating":   "生成PDF出错",
+        "server_busy":        "服务器繁忙，请稍后再试",
         "footer_text":        "Grandstep 穿着测试评估系统",
         "powered_by":         "由 Streamlit 提供支持",
         "copyright":          "© 2025 - 专业鞋类测试平台",
@@ -231,67 +252,49 @@ UI_TEXTS = {
         "red_marks_q":        "脱袜后有红色印记吗？",
         "instructions_title": "快速指南",
         "instructions":       "1. 填写所有必填字段\n2. 选择偏好语言\n3. 选择测试地点\n4. 生成PDF报告\n5. 下载并分享",
+        "import_title":       "导入电子表格",
+        "import_help":        "旧版 .xlsx，每行一条评估",
+        "import_button":      "导入",
+        "import_done":        "已导入 {imported} / {rows} 行",
+        "import_skipped":     "跳过 {skipped} 行",
+        "import_ignored":     "忽略的列",
+        "tx_pending":         "部分翻译尚未返回，已显示原文并标注【原文】。完整翻译的PDF正在后台生成…",
+        "tx_ready":           "完整翻译的PDF已就绪",
+        "download_translated":"📥 下载完整翻译PDF",
+        "archive_title":      "历史报告",
+        "archive_search":     "PO号或款号",
+        "archive_none":       "没有匹配的历史报告",
+        "archive_pick":       "选择要下载的报告",
+        "archive_failed":     "报告未能存档，下方下载不受影响",
+        "compare_title":      "样品对比",
+        "compare_style":      "款号",
+        "compare_pick":       "样品（第一个为基准）",
+        "compare_button":     "生成对比PDF",
+        "compare_download":   "📥 下载对比报告",
+        "compare_need_two":   "请至少选择该款号的两个已保存样品",
+        "usage_title":        "翻译用量",
+        "usage_reports":      "报告数",
+        "usage_calls":        "API 调用",
+        "usage_cost":         "费用（美元）",
+        "usage_per_report":   "每份报告",
+        "usage_hit_rate":     "缓存命中",
+        "usage_tokens":       "输入 / 输出 Token",
+        "usage_latency":      "延迟 p50 / p95",
+        "usage_hist":         "调用延迟（毫秒）",
+        "usage_by_length":    "按输入长度的延迟",
+        "usage_recent":       "最近报告",
+        "usage_none":         "尚无翻译调用记录",
+        "panel_hint":         "多名测试人员：请按天填写每位测试人员的评分（未评分请留空）。报告中的每日评分为小组均值。",
+        "panel_mean":         "小组均值",
+        "panel_min":          "最低",
+        "panel_spread":       "极差",
     }
 }
 
-PERIOD_ZH = {
-    "1 Hour":"1小时","1 Day":"1天","1 Week":"1周",
-    "2 Weeks":"2周","3 Weeks":"3周","4 Weeks":"4周",
-}
-QUESTION_ZH = {
-    "Does shoe feel unstable when walking?":  "行走时鞋子感觉不稳定吗？",
-    "Any upper broken or damage?":            "鞋面有任何破损吗？",
-    "Any sole gapping?":                       "鞋底有脱胶吗？",
-    "Does lining color come off?":            "内里颜色有脱色吗？",
-    "Any appearance changes?":                "外观有任何变化吗？",
-    "Any piece rubbing feet?":                "有任何部件摩擦脚吗？",
-    "Is bottom severely worn?":               "底部严重磨损了吗？",
-}
-DAY_ZH = {
-    "Day 1":"第1天","Day 2":"第2天","Day 3":"第3天","Day 4":"第4天",
-    "Day 5":"第5天","Day 6":"第6天","Day 7":"第7天",
-    "2 Weeks":"2周","3 Weeks":"3周","4 Weeks":"4周","5 Weeks":"5周",
-}
-
 def t(key):
     lang = st.session_state.get('ui_language', 'en')
     return UI_TEXTS[lang].get(key, UI_TEXTS['en'].get(key, key))
 
-def translate_text_api(text, target_language="zh"):
-    """Translate free-form user text via GPT-4o-mini with caching."""
-    if not text or not text.strip():
-        return text
-    if not openai_client:
-        return text
-    cache_key = f"{text}|{target_language}"
-    if cache_key in st.session_state.translations_cache:
-        return st.session_state.translations_cache[cache_key]
-    # Don't translate pure numbers / codes
-    clean = text.replace(' ', '').replace('-', '').replace('/', '')
-    if clean.isdigit() or re.match(r'^[A-Za-z]*\d+[A-Za-z]*$', clean):
-        st.session_state.translations_cache[cache_key] = text
-        return text
-    # Already Chinese?
-    if re.search(r'[\u4e00-\u9fff]', text):
-        st.session_state.translations_cache[cache_key] = text
-        return text
-    try:
-        lang_name = "Simplified Chinese" if target_language == "zh" else "English"
-        resp = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role":"system","content":f"Translate to {lang_name}. Preserve all numbers, codes, measurements. Return ONLY the translation."},
-                {"role":"user","content":text}
-            ],
-            temperature=0.1, max_tokens=500
-        )
-        result = resp.choices[0].message.content.strip()
-        st.session_state.translations_cache[cache_key] = result
-        return result
-    except Exception:
-        st.session_state.translations_cache[cache_key] = text
-        return text
-
 # ─── Session state ──────────────────────────────────────────────────────────────
 for key, val in [
     ('ui_language', 'en'),
@@ -302,717 +305,128 @@ for key, val in [
     if key not in st.session_state:
         st.session_state[key] = val
 
+@st.cache_resource
+def draft_store():
+    """One autosave log and writer thread per server process."""
+    return DraftStore()
+
+@st.cache_resource
+def record_store():
+    return RecordStore()
+
+@st.cache_resource
+def render_scheduler():
+    # One per server process: interactive renders go ahead of API and batch work
+    return Scheduler()
+
+@st.cache_resource
+def remote_render():
+    # Set WEAR_TEST_RENDER_QUEUE to hand renders to render_queue.py workers
+    return remote_renderer(open_broker(QUEUE_URL), FileStore()) if QUEUE_URL else None
+
+@st.cache_resource
+def usage_log():
+    # Tokens, latency and cache hits of every translation; also sizes translation batches
+    log = UsageLog()
+    set_usage_log(log)
+    return log
+
+usage_log()
+
+@st.cache_resource
+def report_archive():
+    # Every downloaded PDF, deduplicated; past reports are fetched, never re-rendered
+    return Archive()
+
+def render_pdf(form, pdf_lang, city, tx, user, sched, remote, render=render_report):
+    """Render on the render workers if configured, else on the local scheduler."""
+    if remote:
+        return remote(form, pdf_lang, city, tx)   # the broker orders jobs by priority
+    return sched.submit(render, form, pdf_lang, city, tx, None, "compact",
+                        priority=INTERACTIVE, user=user).result()
+
+# Drafts survive a browser refresh: the draft id rides along in the URL and
+# the latest saved form_data is restored from the autosave log.
+if 'draft_id' not in st.session_state:
+    draft_id = st.query_params.get("draft")
+    restored = draft_store().restore(draft_id) if draft_id else None
+    if restored:
+        form_data = default_form_data(restored.get('protocol', 'standard'))
+        form_data.update(restored)
+        st.session_state.form_data = ensure_protocol_fields(form_data, get_protocol(form_data['protocol']))
+    else:
+        draft_id = new_draft_id()
+        st.query_params["draft"] = draft_id
+    st.session_state.draft_id = draft_id
+
 if 'form_data' not in st.session_state:
-    st.session_state.form_data = {
-        'po_number':'','factory':'','color':'','style':'','brand':'',
-        'sample_type':'Prototype','description':'',
-        'fit_sizes':['6/8/39'],'testers':['Tester A'],
-        'upper_feel':'Comfortable','lining_feel':'Comfortable','sock_feel':'Comfortable',
-        'toe_length':'Yes','ball_position':'Yes','shoe_flex':'Yes',
-        'arch_support':'Yes','top_gapping':'No','fit_properly':'Yes',
-        'feel_fit':'Yes','interior_lining':'Yes','feel_stability':'Yes',
-        'slipping':'No','sole_flexibility':'Yes','toe_room':'Yes',
-        'rubbing':'No','red_marks':'No',
-        'prepared_by':'','prep_date':datetime.now().date(),
-        'approved_by':'','overall_result':'',
-        'extended_data':{p:{q:"No" for q in questions_d} for p in time_periods},
-        'comfort_scores':{d:3 for d in days_to_track},
-        'appearance_scores':{d:3 for d in days_to_track},
-        'issues':{d:"" for d in days_to_track},
-    }
+    st.session_state.form_data = default_form_data()
 
 fd = st.session_state.form_data
 
-# ─── Colour helpers ─────────────────────────────────────────────────────────────
-def rating_color(r):
-    rl = r.lower()
-    if "uncomfortable" in rl: return "#e74c3c"
-    if "somewhat" in rl:      return "#f39c12"
-    return "#2ecc71"
-
-def yn_color(r):
-    return "#2ecc71" if r.lower() == "yes" else "#e74c3c"
-
-def score_color(s):
-    if s >= 4: return "#2ecc71"
-    if s >= 3: return "#f39c12"
-    return "#e74c3c"
-
 # ══════════════════════════════════════════════════════════════════════════════
-#  PDF GENERATION  (modern canvas-based design)
+#  PDF GENERATION  (drawing code lives in pdf_report.py)
 # ══════════════════════════════════════════════════════════════════════════════
 
-# Design tokens
-C_PRIMARY   = colors.HexColor('#1a1a2e')   # deep navy
-C_ACCENT    = colors.HexColor('#e94560')   # vivid red-pink
-C_ACCENT2   = colors.HexColor('#0f3460')   # mid blue
-C_LIGHT     = colors.HexColor('#f0f4ff')
-C_WHITE     = colors.white
-C_GREY_TEXT = colors.HexColor('#555555')
-C_GREY_LINE = colors.HexColor('#dddddd')
-C_GREEN     = colors.HexColor('#27ae60')
-C_RED       = colors.HexColor('#e74c3c')
-C_ORANGE    = colors.HexColor('#f39c12')
-PAGE_W, PAGE_H = A4
-
-HEADER_H    = 60
-FOOTER_H    = 36
-MARGIN_L    = 40
-MARGIN_R    = 40
-CONTENT_W   = PAGE_W - MARGIN_L - MARGIN_R
-
-
-def _font(pdf_lang, bold=False):
-    if pdf_lang == "zh":
-        return CHINESE_FONT
-    return 'Helvetica-Bold' if bold else 'Helvetica'
-
-
-def _char_width(char, font_size, pdf_lang):
-    """Estimate the rendered width of a single character."""
-    # Chinese/CJK characters are full-width (roughly 1x font_size)
-    if '\u4e00' <= char <= '\u9fff' or '\u3000' <= char <= '\u303f' or '\uff00' <= char <= '\uffef':
-        return font_size * 0.95
-    # ASCII average width
-    return font_size * 0.52
-
-
-def _text_width(text, font_size, pdf_lang):
-    """Estimate pixel width of a string, handling mixed CJK + ASCII."""
-    return sum(_char_width(ch, font_size, pdf_lang) for ch in text)
-
-
-def _wrap_text(text, max_width, font_size, pdf_lang):
-    """
-    Wrap text into lines that fit within max_width pixels.
-    Handles Chinese (character-level) and English (word-level) wrapping.
-    Returns a list of strings.
-    """
-    if not text:
-        return []
-
-    has_chinese = bool(re.search(r'[\u4e00-\u9fff]', text))
-
-    if has_chinese:
-        # Character-level wrapping for Chinese text
-        lines = []
-        current_line = ""
-        current_width = 0
-        for char in text:
-            char_w = _char_width(char, font_size, pdf_lang)
-            if char == '\n':
-                lines.append(current_line)
-                current_line = ""
-                current_width = 0
-            elif current_width + char_w > max_width and current_line:
-                lines.append(current_line)
-                current_line = char
-                current_width = char_w
-            else:
-                current_line += char
-                current_width += char_w
-        if current_line:
-            lines.append(current_line)
-        return lines
-    else:
-        # Word-level wrapping for English text
-        lines = []
-        for paragraph in text.split('\n'):
-            words = paragraph.split()
-            if not words:
-                lines.append("")
-                continue
-            current_line = ""
-            current_width = 0
-            for word in words:
-                word_w = _text_width(word + " ", font_size, pdf_lang)
-                if current_width + word_w > max_width and current_line:
-                    lines.append(current_line.rstrip())
-                    current_line = word + " "
-                    current_width = word_w
-                else:
-                    current_line += word + " "
-                    current_width += word_w
-            if current_line.strip():
-                lines.append(current_line.rstrip())
-        return lines
-
-
-def draw_page_frame(c, page_num, total_pages, pdf_lang, city, city_zh, gen_time):
-    """Draw header + footer on every page."""
-    w, h = PAGE_W, PAGE_H
-
-    # ── header bar ──────────────────────────────────────────────
-    c.setFillColor(C_PRIMARY)
-    c.rect(0, h - HEADER_H, w, HEADER_H, fill=1, stroke=0)
-    # accent stripe
-    c.setFillColor(C_ACCENT)
-    c.rect(0, h - HEADER_H, 6, HEADER_H, fill=1, stroke=0)
-
-    fn = _font(pdf_lang, bold=True)
-    if pdf_lang == "zh":
-        header_l = "GRAND STEP (H.K.) LTD"
-        header_r = "穿着测试评估报告"
-    else:
-        header_l = "GRAND STEP (H.K.) LTD"
-        header_r = "WEAR TEST ASSESSMENT REPORT"
-
-    c.setFillColor(C_WHITE)
-    c.setFont(fn, 13)
-    c.drawString(MARGIN_L, h - HEADER_H + 22, header_l)
-    c.setFont(_font(pdf_lang), 9)
-    c.drawRightString(w - MARGIN_R, h - HEADER_H + 22, header_r)
-
-    # ── footer bar ───────────────────────────────────────────────
-    c.setFillColor(C_PRIMARY)
-    c.rect(0, 0, w, FOOTER_H, fill=1, stroke=0)
-    c.setFillColor(C_ACCENT)
-    c.rect(0, FOOTER_H - 3, w, 3, fill=1, stroke=0)
-
-    c.setFillColor(C_WHITE)
-    c.setFont(_font(pdf_lang), 7.5)
-
-    if pdf_lang == "zh":
-        loc_str  = f"地点: {city} ({city_zh})"
-        pg_str   = f"第 {page_num} 页 / 共 {total_pages} 页"
-        time_str = f"生成时间: {gen_time}"
-    else:
-        loc_str  = f"Location: {city}"
-        pg_str   = f"Page {page_num} of {total_pages}"
-        time_str = f"Generated: {gen_time}"
-
-    c.drawString(MARGIN_L, 13, loc_str)
-    c.drawCentredString(w / 2, 13, time_str)
-    c.drawRightString(w - MARGIN_R, 13, pg_str)
-
-
-def draw_section_header(c, y, label, pdf_lang):
-    """Draw a coloured section title bar. Returns new y."""
-    bar_h = 22
-    c.setFillColor(C_ACCENT2)
-    c.roundRect(MARGIN_L, y - bar_h, CONTENT_W, bar_h, 4, fill=1, stroke=0)
-    c.setFillColor(C_WHITE)
-    c.setFont(_font(pdf_lang, bold=True), 10)
-    c.drawString(MARGIN_L + 10, y - bar_h + 7, label)
-    return y - bar_h - 8
-
-
-def draw_kv_row(c, x, y, w, label, value, pdf_lang, shade=False):
-    """
-    Draw a label-value pair row with dynamic height to fit wrapped text.
-    Returns new y after the row.
-    """
-    FONT_SIZE = 8
-    PADDING   = 5
-    LINE_H    = 13
-    lw        = w * 0.38
-    val_w     = w - lw - 12  # available width for value text
-
-    # Wrap the value text
-    val_lines = _wrap_text(str(value), val_w, FONT_SIZE, pdf_lang)
-    num_lines = max(1, len(val_lines))
-    ROW_H     = num_lines * LINE_H + PADDING * 2
-
-    if shade:
-        c.setFillColor(C_LIGHT)
-        c.rect(x, y - ROW_H, w, ROW_H, fill=1, stroke=0)
-    c.setStrokeColor(C_GREY_LINE)
-    c.setLineWidth(0.4)
-    c.line(x, y - ROW_H, x + w, y - ROW_H)
-
-    # Draw label (vertically centered)
-    c.setFillColor(C_ACCENT2)
-    c.setFont(_font(pdf_lang, bold=True), FONT_SIZE)
-    c.drawString(x + 6, y - ROW_H // 2 - FONT_SIZE // 2 + 2, label)
-
-    # Draw wrapped value lines
-    c.setFillColor(C_PRIMARY)
-    c.setFont(_font(pdf_lang), FONT_SIZE)
-    text_start_y = y - PADDING - LINE_H + 4
-    for line in val_lines:
-        c.drawString(x + lw + 6, text_start_y, line)
-        text_start_y -= LINE_H
-
-    return y - ROW_H
-
-
-def draw_two_col_kv(c, y, pairs, pdf_lang, shade_alt=True):
-    """
-    Draw a two-column grid of label:value rows.
-    Each row pair shares the same height (the max of the two sides).
-    """
-    FONT_SIZE = 8
-    PADDING   = 5
-    LINE_H    = 13
-    col_w     = (CONTENT_W - 10) / 2
-    val_w     = col_w * 0.62 - 12
-
-    for i, (l1, v1, l2, v2) in enumerate(pairs):
-        shade = (i % 2 == 0) and shade_alt
-
-        # Calculate the required height for both columns
-        lines1 = _wrap_text(str(v1), val_w, FONT_SIZE, pdf_lang)
-        lines2 = _wrap_text(str(v2), val_w, FONT_SIZE, pdf_lang)
-        num_lines = max(1, len(lines1), len(lines2))
-        ROW_H = num_lines * LINE_H + PADDING * 2
-
-        for col_x, label, val, val_lines in [
-            (MARGIN_L,              l1, v1, lines1),
-            (MARGIN_L + col_w + 10, l2, v2, lines2),
-        ]:
-            if shade:
-                c.setFillColor(C_LIGHT)
-                c.rect(col_x, y - ROW_H, col_w, ROW_H, fill=1, stroke=0)
-            c.setStrokeColor(C_GREY_LINE)
-            c.setLineWidth(0.4)
-            c.line(col_x, y - ROW_H, col_x + col_w, y - ROW_H)
-
-            lw = col_w * 0.38
-            c.setFillColor(C_ACCENT2)
-            c.setFont(_font(pdf_lang, bold=True), FONT_SIZE)
-            c.drawString(col_x + 6, y - ROW_H // 2 - FONT_SIZE // 2 + 2, label)
-
-            c.setFillColor(C_PRIMARY)
-            c.setFont(_font(pdf_lang), FONT_SIZE)
-            text_start_y = y - PADDING - LINE_H + 4
-            for line in val_lines:
-                c.drawString(col_x + lw + 6, text_start_y, line)
-                text_start_y -= LINE_H
-
-        y -= ROW_H
-
-    return y
-
-
-def draw_description_block(c, y, label, text, pdf_lang):
-    """
-    Draw a full-width multi-line description block.
-    Properly wraps Chinese and English text.
-    Returns new y position.
-    """
-    if not text or not text.strip():
-        return y
-
-    fn_b      = _font(pdf_lang, bold=True)
-    fn_r      = _font(pdf_lang)
-    FONT_SIZE = 8
-    LINE_H    = 14       # line height in pts
-    PADDING   = 8        # inner padding
-    LABEL_H   = 20       # height of the label bar
-    INNER_W   = CONTENT_W - 20  # text area width with padding
-
-    # Wrap text using proper character-width-aware function
-    lines = _wrap_text(text, INNER_W, FONT_SIZE, pdf_lang)
-    if not lines:
-        return y
-
-    total_text_h = len(lines) * LINE_H + PADDING * 2
-    block_h      = LABEL_H + total_text_h
-
-    # Background
-    c.setFillColor(C_LIGHT)
-    c.rect(MARGIN_L, y - block_h, CONTENT_W, block_h, fill=1, stroke=0)
-    # Label bar
-    c.setFillColor(C_ACCENT2)
-    c.rect(MARGIN_L, y - LABEL_H, CONTENT_W, LABEL_H, fill=1, stroke=0)
-    # Border
-    c.setStrokeColor(C_GREY_LINE)
-    c.setLineWidth(0.4)
-    c.rect(MARGIN_L, y - block_h, CONTENT_W, block_h, fill=0, stroke=1)
-
-    # Label text
-    c.setFillColor(C_WHITE)
-    c.setFont(fn_b, 8)
-    c.drawString(MARGIN_L + 8, y - LABEL_H + 6, label)
-
-    # Content text lines
-    ty = y - LABEL_H - PADDING - LINE_H + 4
-    c.setFillColor(C_PRIMARY)
-    c.setFont(fn_r, FONT_SIZE)
-    for line in lines:
-        c.drawString(MARGIN_L + 10, ty, line)
-        ty -= LINE_H
-
-    return y - block_h - 6
-
-
-def draw_qa_table(c, y, rows, pdf_lang):
+def generate_pdf():
+    """Render the report within the translation deadline. Returns (pdf, pending futures)."""
+    pdf_lang = st.session_state.pdf_language
+    city     = st.session_state.selected_city
+    user     = st.session_state.draft_id
+    tx, pending = None, []
+    # With WEAR_TEST_PROFILE_MS set, slow generations leave a profile and a scrubbed snapshot
+    with capture(fd, pdf_lang, city) as prof:
+        if pdf_lang == "zh" and openai_client:
+            # ── Translate all free text up front; late strings render marked ─────
+            tx, pending = translate_within(openai_client, report_texts(fd, pdf_lang, city), "zh",
+                                           st.session_state.translations_cache, user=user,
+                                           report=f"{user}:{datetime.now():%Y%m%d_%H%M%S}")
+            prof.mark("translate")
+        prof.tx, prof.pending = tx, pending
+        pdf = render_pdf(fd, pdf_lang, city, tx, user, render_scheduler(), remote_render(),
+                         prof.wrap(render_report))
+        prof.mark("render")
+    return pdf, pending
+
+
+def archive_report(archive, pdf, fname, form, city, pdf_lang, generated):
     """
-    rows: list of (question_str, answer_str)
-    Draws a clean alternating-row Q&A table with dynamic row heights.
-    Returns new y.
+    Archive a downloaded PDF. Never fatal to the download: False if archiving
+    failed. ``archive`` is an Archive, or a callable returning one.
     """
-    FONT_SIZE = 8
-    LINE_H    = 13
-    PADDING   = 4
-    q_col     = CONTENT_W * 0.72
-    a_col     = CONTENT_W * 0.28
-    hdr_h     = 20
-
-    # Header
-    c.setFillColor(C_ACCENT)
-    c.rect(MARGIN_L, y - hdr_h, CONTENT_W, hdr_h, fill=1, stroke=0)
-    c.setFillColor(C_WHITE)
-    fn = _font(pdf_lang, bold=True)
-    c.setFont(fn, 8.5)
-    q_lbl = "问题" if pdf_lang == "zh" else "Question"
-    a_lbl = "回答" if pdf_lang == "zh" else "Response"
-    c.drawString(MARGIN_L + 8, y - hdr_h + 7, q_lbl)
-    c.drawRightString(MARGIN_L + CONTENT_W - 8, y - hdr_h + 7, a_lbl)
-    y -= hdr_h
-
-    q_text_w = q_col - 16  # inner width for question text
-
-    for i, (q, a) in enumerate(rows):
-        # Wrap the question text
-        q_lines   = _wrap_text(q, q_text_w, FONT_SIZE, pdf_lang)
-        num_lines = max(1, len(q_lines))
-        ROW_H     = num_lines * LINE_H + PADDING * 2
-
-        shade = (i % 2 == 0)
-        if shade:
-            c.setFillColor(C_LIGHT)
-            c.rect(MARGIN_L, y - ROW_H, CONTENT_W, ROW_H, fill=1, stroke=0)
-        c.setStrokeColor(C_GREY_LINE)
-        c.setLineWidth(0.3)
-        c.line(MARGIN_L, y - ROW_H, MARGIN_L + CONTENT_W, y - ROW_H)
-
-        # Question lines
-        c.setFillColor(C_PRIMARY)
-        c.setFont(_font(pdf_lang), FONT_SIZE)
-        text_y = y - PADDING - LINE_H + 4
-        for line in q_lines:
-            c.drawString(MARGIN_L + 8, text_y, line)
-            text_y -= LINE_H
-
-        # Answer badge — vertically centred in the row
-        ans_en = a.strip().lower()
-        if ans_en in ("yes", "是"):
-            badge_c = C_GREEN
-        elif ans_en in ("no", "否"):
-            badge_c = C_RED
-        elif "comfortable" in ans_en or "舒适" in ans_en:
-            badge_c = C_GREEN
-        elif "somewhat" in ans_en or "较" in ans_en:
-            badge_c = C_ORANGE
-        elif "uncomfortable" in ans_en or "不舒" in ans_en:
-            badge_c = C_RED
-        else:
-            badge_c = C_GREY_TEXT
-
-        badge_x = MARGIN_L + CONTENT_W - 66
-        badge_y = y - ROW_H // 2 - 7  # centre badge vertically
-        c.setFillColor(badge_c)
-        c.roundRect(badge_x, badge_y, 58, 14, 3, fill=1, stroke=0)
-        c.setFillColor(C_WHITE)
-        c.setFont(_font(pdf_lang, bold=True), 7.5)
-        c.drawCentredString(badge_x + 29, badge_y + 4, a[:16])
-        y -= ROW_H
-
-    return y - 6
+    try:
+        archive = archive() if callable(archive) else archive
+        archive.put(pdf, fname, form.get('po_number', ''), city, generated, form.get('style', ''), pdf_lang)
+        return True
+    except Exception:
+        traceback.print_exc()
+        return False
 
 
-def draw_score_bar(c, x, y, score, max_score=5, bar_w=80, bar_h=8):
-    """Draw a mini progress-bar for numeric scores."""
-    c.setFillColor(C_GREY_LINE)
-    c.roundRect(x, y, bar_w, bar_h, 3, fill=1, stroke=0)
-    fill_w = bar_w * (score / max_score)
-    col = C_GREEN if score >= 4 else (C_ORANGE if score >= 3 else C_RED)
-    c.setFillColor(col)
-    c.roundRect(x, y, fill_w, bar_h, 3, fill=1, stroke=0)
+def rerender_when_translated(pending, fname, generated):
+    """Render again once ``pending`` translations land, and archive as ``fname``. Returns a Future of the PDF."""
+    snap, pdf_lang, city = copy.deepcopy(fd), st.session_state.pdf_language, st.session_state.selected_city
+    cache, user, sched   = st.session_state.translations_cache, st.session_state.draft_id, render_scheduler()
+    remote = remote_render()
+    try:
+        archive = report_archive()   # resolved here, on the script thread
+    except Exception:
+        traceback.print_exc()
+        archive = None               # archive_report then reports failure, the PDF still lands
+    fut = Future()   # no session_state access off-thread
 
+    def run():
+        wait(pending)
+        try:
+            tx = lambda text: translate_text(openai_client, text, "zh", cache)
+            pdf = render_pdf(snap, pdf_lang, city, tx, user, sched, remote)
+            archive_report(archive, pdf.getvalue(), fname, snap, city, pdf_lang, generated)
+            fut.set_result(pdf)
+        except Exception as e:
+            fut.set_exception(e)
 
-def generate_pdf():
-    pdf_lang   = st.session_state.pdf_language
-    city       = st.session_state.selected_city
-    city_zh    = CHINESE_CITIES.get(city, city)
-    china_tz   = pytz.timezone('Asia/Shanghai')
-    now        = datetime.now(china_tz)
-    gen_time   = now.strftime('%Y-%m-%d %H:%M')
-    gen_date   = now.strftime('%Y-%m-%d')
-
-    # ── Helper to translate user-entered free-text ──────────────────────────
-    def tx(text):
-        """Translate user-entered free text for the PDF."""
-        if pdf_lang == "en" or not openai_client:
-            return text
-        return translate_text_api(text, "zh")
-
-    # ── Localisation helpers ─────────────────────────────────────────────────
-    def loc(en_key, zh_val):
-        return zh_val if pdf_lang == "zh" else en_key
-
-    def yn(val):
-        if pdf_lang == "zh":
-            return "是" if val == "Yes" else "否"
-        return val
-
-    def feel(val):
-        map_ = {"Comfortable":"舒适","Somewhat Comfortable":"较舒适","Uncomfortable":"不舒适"}
-        return map_.get(val, val) if pdf_lang == "zh" else val
-
-    # ── Two-pass rendering ───────────────────────────────────────────────────
-    def _build_pdf(buf_out, total_pages_known):
-        """Inner function that actually draws everything onto buf_out."""
-        c = rl_canvas.Canvas(buf_out, pagesize=A4)
-        fn_b = _font(pdf_lang, bold=True)
-        fn_r = _font(pdf_lang)
-
-        # ── helper: new page ───────────────────────────────────────────────
-        page_counter = [1]
-        def new_page():
-            c.showPage()
-            page_counter[0] += 1
-            draw_page_frame(c, page_counter[0], total_pages_known,
-                            pdf_lang, city, city_zh, gen_time)
-            return PAGE_H - HEADER_H - 20
-
-        def maybe_new_page(y, min_space=120):
-            """Start a new page if remaining space is too tight."""
-            if y < FOOTER_H + min_space:
-                return new_page()
-            return y
-
-        # ════════════════════════════════════════════════════════════════════
-        # PAGE 1 – Cover + Basic Information
-        # ════════════════════════════════════════════════════════════════════
-        draw_page_frame(c, 1, total_pages_known, pdf_lang, city, city_zh, gen_time)
-        y = PAGE_H - HEADER_H - 20
-
-        # Cover banner
-        c.setFillColor(C_PRIMARY)
-        c.rect(MARGIN_L, y - 120, CONTENT_W, 120, fill=1, stroke=0)
-        c.setFillColor(C_ACCENT)
-        c.rect(MARGIN_L, y - 120, 8, 120, fill=1, stroke=0)
-        c.setFillColor(C_ACCENT)
-        c.rect(MARGIN_L, y - 6, CONTENT_W, 6, fill=1, stroke=0)
-
-        c.setFillColor(C_WHITE)
-        c.setFont(fn_b, 20)
-        c.drawString(MARGIN_L + 24, y - 40, "GRAND STEP (H.K.) LTD")
-        c.setFont(fn_r, 11)
-        c.setFillColor(colors.HexColor('#aab8ff'))
-        c.drawString(MARGIN_L + 24, y - 60,
-                     "穿着测试评估报告" if pdf_lang == "zh" else "WEAR TEST ASSESSMENT REPORT")
-
-        pill_items = [
-            (loc("Date","日期"),     gen_date),
-            (loc("Location","地点"), f"{city} {city_zh}" if pdf_lang == "zh" else city),
-            (loc("Language","语言"), "中文" if pdf_lang == "zh" else "English"),
-        ]
-        px = MARGIN_L + 24
-        for lbl, val in pill_items:
-            c.setFillColor(colors.HexColor('#0d2244'))
-            pill_w = len(f"{lbl}: {val}") * 5.5 + 16
-            c.roundRect(px, y - 108, pill_w, 16, 4, fill=1, stroke=0)
-            c.setFillColor(colors.HexColor('#aab8ff'))
-            c.setFont(fn_b, 7)
-            c.drawString(px + 8, y - 100, f"{lbl}:")
-            c.setFillColor(C_WHITE)
-            c.setFont(fn_r, 7)
-            c.drawString(px + 8 + len(lbl) * 4.3 + 8, y - 100, val)
-            px += pill_w + 8
-        y -= 136
-
-        # Basic Information
-        y = draw_section_header(c, y, loc("1. BASIC INFORMATION","1. 基本信息"), pdf_lang)
-
-        prep_date     = fd.get('prep_date', now.date())
-        prep_date_str = str(prep_date)
-        desc_text     = tx(fd.get('description','')) or ''
-
-        pairs = [
-            (loc("PO Number","PO编号"),    tx(fd.get('po_number','')) or '—',
-             loc("Brand","品牌"),           tx(fd.get('brand',''))     or '—'),
-            (loc("Factory","工厂"),        tx(fd.get('factory',''))   or '—',
-             loc("Style","款式"),           tx(fd.get('style',''))     or '—'),
-            (loc("Color","颜色"),          tx(fd.get('color',''))     or '—',
-             loc("Date","日期"),            prep_date_str),
-            (loc("Sample Type","样品类型"),tx(fd.get('sample_type','Prototype')),
-             loc("Testers","测试人员"),     ", ".join(fd.get('testers',['—']))),
-            (loc("Fit Sizes","试穿尺码"),  ", ".join(fd.get('fit_sizes',['—'])),
-             "",""),
-        ]
-        y = draw_two_col_kv(c, y, pairs, pdf_lang)
-        y -= 4
-
-        # Full-width description block
-        if desc_text:
-            desc_label = loc("Description","描述")
-            y = draw_description_block(c, y, desc_label, desc_text, pdf_lang)
-        y -= 6
-
-        # Section A
-        y = maybe_new_page(y, 140)
-        y = draw_section_header(c, y, loc("2. BEFORE TRYING ON (TOUCH & FEEL)","2. 试穿前（触摸感觉）"), pdf_lang)
-        rows_a = [
-            (loc("Upper Material Feel","鞋面材料感觉"),  feel(fd.get('upper_feel','Comfortable'))),
-            (loc("Lining Material Feel","内里材料感觉"), feel(fd.get('lining_feel','Comfortable'))),
-            (loc("Sock Cushion Feel","袜垫感觉"),        feel(fd.get('sock_feel','Comfortable'))),
-        ]
-        y = draw_qa_table(c, y, rows_a, pdf_lang)
-
-        # Section B
-        y = maybe_new_page(y, 160)
-        y = draw_section_header(c, y, loc("3. FIT BEFORE WALKING (STANDING)","3. 行走前合脚性（站立）"), pdf_lang)
-        rows_b = [
-            (loc("Is toe length okay?","脚趾长度合适吗？"),             yn(fd.get('toe_length','Yes'))),
-            (loc("Ball of foot at correct place?","脚掌位置正确吗？"),  yn(fd.get('ball_position','Yes'))),
-            (loc("Shoe flex at proper place?","鞋子弯曲位置正确吗？"),  yn(fd.get('shoe_flex','Yes'))),
-            (loc("Feel arch support?","感觉足弓支撑吗？"),              yn(fd.get('arch_support','Yes'))),
-            (loc("Shoe gapping at top line?","鞋口处有空隙吗？"),       yn(fd.get('top_gapping','No'))),
-            (loc("Shoes fit properly?","鞋子合脚吗？"),                 yn(fd.get('fit_properly','Yes'))),
-        ]
-        y = draw_qa_table(c, y, rows_b, pdf_lang)
-
-        # ════════════════════════════════════════════════════════════════════
-        # PAGE 2 – Section C: After Walking
-        # ════════════════════════════════════════════════════════════════════
-        y = new_page()
-        y = draw_section_header(c, y, loc("4. AFTER 8-15 MINUTES WALKING","4. 行走8-15分钟后"), pdf_lang)
-        rows_c = [
-            (loc("Can feel shoe fit?","能感觉到鞋子合脚吗？"),            yn(fd.get('feel_fit','Yes'))),
-            (loc("Interior lining feels good?","内里感觉好吗？"),         yn(fd.get('interior_lining','Yes'))),
-            (loc("Can feel stability?","能感觉到稳定性吗？"),             yn(fd.get('feel_stability','Yes'))),
-            (loc("Shoe slipping?","鞋子滑脚吗？"),                        yn(fd.get('slipping','No'))),
-            (loc("Sole flexibility good?","鞋底柔韧性好吗？"),            yn(fd.get('sole_flexibility','Yes'))),
-            (loc("Enough toe room?","脚趾区域有足够空间吗？"),            yn(fd.get('toe_room','Yes'))),
-            (loc("Any rubbing?","有任何摩擦吗？"),                        yn(fd.get('rubbing','No'))),
-            (loc("Red marks after removing socks?","脱袜后有红色印记吗？"),yn(fd.get('red_marks','No'))),
-        ]
-        y = draw_qa_table(c, y, rows_c, pdf_lang)
-
-        # ════════════════════════════════════════════════════════════════════
-        # PAGE 3+ – Section D: Extended Wear Testing
-        # ════════════════════════════════════════════════════════════════════
-        y = new_page()
-        y = draw_section_header(c, y, loc("5. EXTENDED WEAR TESTING","5. 延长穿着测试"), pdf_lang)
-
-        for period in time_periods:
-            period_lbl = PERIOD_ZH.get(period, period) if pdf_lang == "zh" else period
-            y = maybe_new_page(y, 160)
-
-            # Period sub-header
-            c.setFillColor(C_PRIMARY)
-            c.roundRect(MARGIN_L, y - 16, CONTENT_W, 16, 3, fill=1, stroke=0)
-            c.setFillColor(colors.HexColor('#aab8ff'))
-            c.setFont(fn_b, 8)
-            c.drawString(MARGIN_L + 8, y - 11, period_lbl)
-            y -= 20
-
-            period_data = fd.get('extended_data', {}).get(period, {})
-            rows = [(QUESTION_ZH.get(q,q) if pdf_lang=="zh" else q, yn(period_data.get(q,"No")))
-                    for q in questions_d]
-            y = draw_qa_table(c, y, rows, pdf_lang)
-
-        # ════════════════════════════════════════════════════════════════════
-        # Next page – Section E: Comfort Index + Final Assessment
-        # ════════════════════════════════════════════════════════════════════
-        y = new_page()
-        y = draw_section_header(c, y, loc("6. COMFORT & APPEARANCE INDEX","6. 舒适度与外观指数"), pdf_lang)
-
-        ROW_H = 20
-        cols  = [70, 80, 80, CONTENT_W - 230]
-        hdr_labels = [
-            loc("Day","天"),
-            loc("Comfort (1-5)","舒适 (1-5)"),
-            loc("Appear (1-5)","外观 (1-5)"),
-            loc("Issues Noticed","发现的问题"),
-        ]
-        c.setFillColor(C_ACCENT)
-        c.rect(MARGIN_L, y - 20, CONTENT_W, 20, fill=1, stroke=0)
-        c.setFillColor(C_WHITE); c.setFont(fn_b, 8)
-        cx = MARGIN_L + 6
-        for i, lbl in enumerate(hdr_labels):
-            c.drawString(cx, y - 14, lbl)
-            cx += cols[i]
-        y -= 20
-
-        for idx, day in enumerate(days_to_track):
-            y = maybe_new_page(y, 30)
-            day_lbl = DAY_ZH.get(day, day) if pdf_lang == "zh" else day
-            comfort = fd.get('comfort_scores', {}).get(day, 3)
-            appear  = fd.get('appearance_scores', {}).get(day, 3)
-            issue_raw = tx(fd.get('issues', {}).get(day, ''))
-
-            # Wrap issues text for dynamic row height
-            issues_w    = cols[3] - 10
-            issue_lines = _wrap_text(issue_raw or '—', issues_w, 7, pdf_lang)
-            num_il      = max(1, len(issue_lines))
-            DYN_ROW_H   = max(ROW_H, num_il * 11 + 8)
-
-            shade = (idx % 2 == 0)
-            if shade:
-                c.setFillColor(C_LIGHT)
-                c.rect(MARGIN_L, y - DYN_ROW_H, CONTENT_W, DYN_ROW_H, fill=1, stroke=0)
-            c.setStrokeColor(C_GREY_LINE); c.setLineWidth(0.3)
-            c.line(MARGIN_L, y - DYN_ROW_H, MARGIN_L + CONTENT_W, y - DYN_ROW_H)
-
-            cx = MARGIN_L + 6
-            c.setFillColor(C_PRIMARY); c.setFont(fn_r, 8)
-            c.drawString(cx, y - DYN_ROW_H // 2 - 4, day_lbl)
-            cx += cols[0]
-
-            bar_y = y - DYN_ROW_H // 2 - 4
-            draw_score_bar(c, cx, bar_y, comfort, bar_w=55, bar_h=8)
-            c.setFillColor(score_color(comfort)); c.setFont(fn_b, 7)
-            c.drawString(cx + 58, bar_y, str(comfort))
-            cx += cols[1]
-
-            draw_score_bar(c, cx, bar_y, appear, bar_w=55, bar_h=8)
-            c.setFillColor(score_color(appear)); c.setFont(fn_b, 7)
-            c.drawString(cx + 58, bar_y, str(appear))
-            cx += cols[2]
-
-            # Draw wrapped issue lines
-            c.setFillColor(C_GREY_TEXT); c.setFont(fn_r, 7)
-            ity = y - 5
-            for il in issue_lines:
-                c.drawString(cx, ity, il)
-                ity -= 11
-
-            y -= DYN_ROW_H
-
-        y -= 14
-
-        # Final Assessment
-        y = maybe_new_page(y, 180)
-        y = draw_section_header(c, y, loc("7. FINAL ASSESSMENT","7. 最终评估"), pdf_lang)
-
-        final_pairs = [
-            (loc("Prepared By","准备人"),   tx(fd.get('prepared_by','')) or '—',
-             loc("Date","日期"),             prep_date_str),
-            (loc("Approved By","批准人"),   tx(fd.get('approved_by','')) or '—',
-             loc("Overall Result","总体结果"), tx(fd.get('overall_result','')) or '—'),
-        ]
-        y = draw_two_col_kv(c, y, final_pairs, pdf_lang)
-
-        y -= 30
-        c.setStrokeColor(C_PRIMARY); c.setLineWidth(1)
-        c.line(MARGIN_L, y, MARGIN_L + 180, y)
-        c.line(MARGIN_L + 210, y, MARGIN_L + 390, y)
-        c.setFillColor(C_GREY_TEXT); c.setFont(fn_r, 8)
-        c.drawString(MARGIN_L,       y - 12, loc("Prepared By Signature","准备人签名"))
-        c.drawString(MARGIN_L + 210, y - 12, loc("Approved By Signature","批准人批准"))
-
-        conf = ("本报告为GRAND STEP (H.K.) LTD机密文件，未经授权禁止分发。"
-                if pdf_lang == "zh"
-                else "This report is confidential property of GRAND STEP (H.K.) LTD. Unauthorised distribution is prohibited.")
-        c.setFillColor(C_GREY_TEXT); c.setFont(fn_r, 7.5)
-        c.drawCentredString(PAGE_W / 2, FOOTER_H + 12, conf)
-
-        c.save()
-        return page_counter[0]
-
-    # ── Pass 1: dry-run to count pages ───────────────────────────────────────
-    count_buf = io.BytesIO()
-    actual_total = _build_pdf(count_buf, 99)
-
-    # ── Pass 2: real render with correct page total ───────────────────────────
-    buf = io.BytesIO()
-    _build_pdf(buf, actual_total)
-    buf.seek(0)
-    return buf
+    threading.Thread(target=run, daemon=True).start()
+    return fut
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -1097,6 +511,83 @@ with st.sidebar:
     for line in t('instructions').split('\n'):
         st.write(line)
 
+    with st.expander(f"📥 {t('import_title')}"):
+        xlsx = st.file_uploader(t('import_help'), type=["xlsx"], key="import_file")
+        if xlsx and st.button(t('import_button'), use_container_width=True, key="import_btn"):
+            bar = st.progress(0.0)
+            def on_progress(done, total):
+                bar.progress(min(done / total, 1.0) if total else 0.0, text=f"{done:,} / {total or '?'}")
+            res = import_workbook(xlsx, record_store(), progress=on_progress, source=xlsx.name)
+            st.success(t('import_done').format(**res))
+            if res['skipped']:
+                st.warning(t('import_skipped').format(**res))
+                st.dataframe(pd.DataFrame(res['errors'], columns=["row", "error"]), hide_index=True)
+            if res['unknown_columns']:
+                st.caption(f"{t('import_ignored')}: {', '.join(res['unknown_columns'])}")
+
+    with st.expander(f"🗂️ {t('archive_title')}"):
+        q = st.text_input(t('archive_search'), key="archive_q").strip()
+        if q:
+            hits = {r['id']: r for by in ('po_number', 'style')
+                    for r in report_archive().find(**{by: q}, limit=10)}
+            if not hits:
+                st.caption(t('archive_none'))
+            else:
+                # Only the picked PDF is read from the archive, not every hit on every rerun
+                rows = sorted(hits.values(), key=lambda r: r['generated'], reverse=True)[:10]
+                r = st.selectbox(t('archive_pick'), rows, index=None, key="archive_pick",
+                                 format_func=lambda r: f"📄 {r['generated'].replace('T', ' ')} · {r['city']} · "
+                                                       f"{r['language'] or '—'}")
+                if r is not None:
+                    st.download_button(f"⬇️ {r['fname']}", data=report_archive().get(r['sha256']),
+                                       file_name=r['fname'], mime="application/pdf",
+                                       key=f"archive_{r['id']}", use_container_width=True)
+
+    with st.expander(f"⚖️ {t('compare_title')}"):
+        cmp_style = st.text_input(t('compare_style'), value=fd.get('style', ''), key="compare_style").strip()
+        saved = {f"#{rid} {stype or '—'} · {po or '—'} · {prep or '—'}": rid
+                 for rid, po, stype, prep in (record_store().by_style(cmp_style) if cmp_style else [])}
+        picked = st.multiselect(t('compare_pick'), list(saved), default=list(saved)[:12], key="compare_pick")
+        if st.button(t('compare_button'), use_container_width=True, key="compare_btn"):
+            if len(picked) < 2:
+                st.warning(t('compare_need_two'))
+            else:
+                try:
+                    fds = [record_store().get(saved[p]) for p in picked]
+                    pdf = render_scheduler().submit(
+                        render_comparison, fds, st.session_state.pdf_language, st.session_state.selected_city,
+                        priority=INTERACTIVE, user=st.session_state.draft_id).result()
+                    st.download_button(t('compare_download'), data=pdf,
+                                       file_name=f"WearTest_Compare_{cmp_style}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                                       mime="application/pdf", use_container_width=True, key="compare_dl")
+                except Overloaded:
+                    st.warning(f"⏳ {t('server_busy')}")
+
+    with st.expander(f"💰 {t('usage_title')}"):
+        u = usage_log().summary()
+        if not u['calls']:
+            st.caption(t('usage_none'))
+        else:
+            uc1, uc2 = st.columns(2)
+            uc1.metric(t('usage_reports'), f"{u['reports']:,}")
+            uc2.metric(t('usage_calls'), f"{u['calls']:,}", f"{u['texts_per_call']:.1f} / call", delta_color="off")
+            uc1.metric(t('usage_cost'), f"${u['cost_usd']:.4f}")
+            uc2.metric(t('usage_per_report'), f"${u['cost_per_report_usd'] or 0:.5f}")
+            uc1.metric(t('usage_hit_rate'), f"{(u['cache_hit_rate'] or 0):.0%}")
+            uc2.metric(t('usage_latency'), f"{u['latency_p50_ms'] or 0:,.0f} / {u['latency_p95_ms'] or 0:,.0f} ms")
+            st.caption(f"{t('usage_tokens')}: {u['prompt_tokens']:,} / {u['completion_tokens']:,}")
+            st.markdown(f"**{t('usage_hist')}**")
+            st.bar_chart(pd.DataFrame(u['latency_hist'], columns=["ms", "calls"]).set_index("ms"),
+                         sort=False, height=160)
+            st.markdown(f"**{t('usage_by_length')}**")
+            st.dataframe(pd.DataFrame(u['latency_by_length']), hide_index=True)
+            st.markdown(f"**{t('usage_recent')}**")
+            recent = pd.DataFrame(usage_log().recent_reports(10))
+            if not recent.empty:
+                recent['ts'] = pd.to_datetime(recent['ts'], unit='s').dt.strftime('%m-%d %H:%M')
+                st.dataframe(recent[['ts', 'texts', 'cache_hits', 'calls', 'prompt_tokens',
+                                     'completion_tokens', 'cost_usd', 'slowest_call_ms']], hide_index=True)
+
     with st.expander(f"🔑 {t('api_setup')}"):
         st.code("# Create .env file\nOPENAI_API_KEY=your-api-key-here")
         st.info("Restart after adding key to enable translation.")
@@ -1104,7 +595,7 @@ with st.sidebar:
 # ── Main header ──────────────────────────────────────────────────────────────
 st.markdown(f'<div class="main-header">👟 {t("title")}</div>', unsafe_allow_html=True)
 
-tab1, tab2, tab3 = st.tabs([t('tab_basic'), t('tab_testing'), t('tab_final')])
+tab1, tab2, tab3, tab4 = st.tabs([t('tab_basic'), t('tab_testing'), t('tab_final'), t('tab_preview')])
 
 # ════════════════════════════════════════════════════════════════════════════
 with tab1:
@@ -1118,7 +609,7 @@ with tab1:
         fd['style']      = st.text_input(t('style'),      value=fd.get('style',''),      key="sty")
     with c3:
         fd['brand']      = st.text_input(t('brand'),      value=fd.get('brand',''),      key="brd")
-        sample_opts = ["Prototype","Full Size","Die Cut","Mass Production"]
+        sample_opts = SAMPLE_TYPES
         sample_disp = [t('prototype'),t('full_size'),t('die_cut'),t('mass_production')]
         cur_samp_idx = sample_opts.index(fd.get('sample_type','Prototype')) if fd.get('sample_type','Prototype') in sample_opts else 0
         sel_samp = st.selectbox(t('sample_type'), sample_disp, index=cur_samp_idx, key="samp")
@@ -1129,17 +620,27 @@ with tab1:
     st.markdown(f'<div class="section-header">📏 {t("fit_size_tester")}</div>', unsafe_allow_html=True)
     c1, c2 = st.columns(2)
     with c1:
-        size_opts = ["4/6/37","6/8/39","8/10/41"]
+        size_opts = FIT_SIZES
         fd['fit_sizes'] = st.multiselect(t('fit_sizes'), size_opts, default=fd.get('fit_sizes',['6/8/39']), key="fs")
     with c2:
-        tester_opts = ["Tester A","Tester B","Tester C"]
-        fd['testers'] = st.multiselect(t('testers'), tester_opts, default=fd.get('testers',['Tester A']), key="ts")
+        # Panels name their own testers; the defaults stay as suggestions
+        tester_opts = TESTERS + [n for n in fd.get('testers', []) if n not in TESTERS]
+        fd['testers'] = st.multiselect(t('testers'), tester_opts, default=fd.get('testers',['Tester A']),
+                                       accept_new_options=True, key="ts")
+
+    proto_names = list(PROTOCOLS)
+    proto_disp  = [PROTOCOLS[n]['label_zh' if st.session_state.ui_language == "zh" else 'label'] for n in proto_names]
+    cur_proto   = proto_names.index(fd.get('protocol')) if fd.get('protocol') in proto_names else 0
+    sel_proto   = st.selectbox(t('protocol'), proto_disp, index=cur_proto, key="proto")
+    ensure_protocol_fields(fd, PROTOCOLS[proto_names[proto_disp.index(sel_proto)]])
+
+proto = get_protocol(fd.get('protocol'))
 
 # ════════════════════════════════════════════════════════════════════════════
 with tab2:
     # Section A
     st.markdown(f'<div class="section-header">🤚 {t("before_trying")}</div>', unsafe_allow_html=True)
-    feel_opts     = ["Uncomfortable","Somewhat Comfortable","Comfortable"]
+    feel_opts     = FEEL_OPTIONS
     feel_disp     = [t('uncomfortable'),t('somewhat_comfortable'),t('comfortable')]
     c1, c2, c3   = st.columns(3)
 
@@ -1155,7 +656,7 @@ with tab2:
 
     # Sections B & C
     def yn_radio(label_key, data_key, col):
-        yn_opts = ["No","Yes"]
+        yn_opts = YES_NO
         yn_disp = [t('no'),t('yes')]
         cur = yn_opts.index(fd.get(data_key,'Yes')) if fd.get(data_key,'Yes') in yn_opts else 1
         with col:
@@ -1184,19 +685,53 @@ with tab2:
 # ════════════════════════════════════════════════════════════════════════════
 with tab3:
     st.markdown(f'<div class="section-header">📅 {t("extended_wear")}</div>', unsafe_allow_html=True)
-    for period in time_periods:
-        with st.expander(f"🕐 {period}"):
-            for q in questions_d:
-                yn_opts = ["No","Yes"]
-                yn_disp = [t('no'),t('yes')]
-                cur_val = fd['extended_data'].get(period,{}).get(q,'No')
-                cur_idx = yn_opts.index(cur_val) if cur_val in yn_opts else 0
-                sel = st.radio(q, yn_disp, index=cur_idx, horizontal=True, key=f"ext_{period}_{q}")
-                fd['extended_data'].setdefault(period, {})[q] = yn_opts[yn_disp.index(sel)]
+    if proto['extended_layout'] == "matrix":
+        # One checkbox grid (questions × checkpoints) instead of hundreds of radios
+        grid = pd.DataFrame(
+            {p: [fd['extended_data'].get(p,{}).get(q,'No') == "Yes" for q in proto['questions']]
+             for p in proto['time_periods']},
+            index=proto['questions'])
+        edited = st.data_editor(grid, use_container_width=True, key=f"ext_grid_{proto['name']}")
+        for p in proto['time_periods']:
+            for q in proto['questions']:
+                fd['extended_data'].setdefault(p, {})[q] = "Yes" if edited.at[q, p] else "No"
+    else:
+        for period in proto['time_periods']:
+            with st.expander(f"🕐 {period}"):
+                for q in proto['questions']:
+                    yn_opts = YES_NO
+                    yn_disp = [t('no'),t('yes')]
+                    cur_val = fd['extended_data'].get(period,{}).get(q,'No')
+                    cur_idx = yn_opts.index(cur_val) if cur_val in yn_opts else 0
+                    sel = st.radio(q, yn_disp, index=cur_idx, horizontal=True, key=f"ext_{period}_{q}")
+                    fd['extended_data'].setdefault(period, {})[q] = yn_opts[yn_disp.index(sel)]
 
     st.markdown(f'<div class="section-header">⭐ {t("comfort_appearance")}</div>', unsafe_allow_html=True)
-    for day in days_to_track:
+    days  = proto['days_to_track']
+    panel = len(fd['testers']) > 1
+    if panel:
+        # One score per tester per day (testers × days grids); day scores become the panel means
+        st.caption(t('panel_hint'))
+        day_cols = {d: st.column_config.NumberColumn(d, min_value=1, max_value=5, step=1) for d in days}
+        for kind, label in (("comfort", f"⭐ {t('comfort_level')}"), ("appearance", f"✨ {t('appearance')}")):
+            st.markdown(f"**{label}**")
+            m    = score_matrix(fd, kind, days)
+            grid = pd.DataFrame(m, index=fd['testers'], columns=days).astype("Int64").replace(0, pd.NA)
+            edited = st.data_editor(grid, column_config=day_cols, use_container_width=True,
+                                    key=f"panel_{kind}_{proto['name']}_{hash(tuple(fd['testers']))}")
+            set_scores(fd, kind, edited.fillna(0).to_numpy(dtype=float))
+            stats = panel_stats(score_matrix(fd, kind, days))
+            st.dataframe(pd.DataFrame([stats['day_mean'].round(1), stats['day_min'], stats['day_spread']],
+                                      index=[t('panel_mean'), t('panel_min'), t('panel_spread')], columns=days),
+                         use_container_width=True)
+        sync_day_scores(fd, days)
+    for day in days:
         with st.expander(f"📊 {day}"):
+            if panel:
+                fd['issues'][day] = st.text_area(
+                    f"ℹ️ {t('issues_noticed')}", value=fd['issues'].get(day,''),
+                    height=80, key=f"iss_{day}")
+                continue
             c1, c2, c3 = st.columns(3)
             with c1:
                 fd['comfort_scores'][day] = st.slider(
@@ -1220,6 +755,24 @@ with tab3:
         fd['approved_by']    = st.text_input(t('approved_by'), value=fd.get('approved_by',''), key="app_by")
         fd['overall_result'] = st.text_area(t('overall_result'), value=fd.get('overall_result',''), height=100, key="ores")
 
+# ════════════════════════════════════════════════════════════════════════════
+with tab4:
+    # Live preview: same report blocks as the PDF, no PDF render and no API calls
+    if '_preview_cache' not in st.session_state:
+        st.session_state._preview_cache = PreviewCache()
+    cache = st.session_state.translations_cache
+
+    def cached_tx(text):
+        if st.session_state.pdf_language == "en":
+            return text
+        return cache.get(f"{text}|zh", text)
+
+    if st.session_state.pdf_language == "zh":
+        st.caption(t('preview_cached_tx'))
+    st.markdown(render_preview(fd, st.session_state.pdf_language, st.session_state.selected_city,
+                               tx=cached_tx, cache=st.session_state._preview_cache),
+                unsafe_allow_html=True)
+
 # ── Generate button ──────────────────────────────────────────────────────────
 st.markdown("---")
 _, center_col, _ = st.columns([1, 2, 1])
@@ -1230,7 +783,9 @@ with center_col:
         else:
             with st.spinner(f"⏳ {t('creating_pdf')}"):
                 try:
-                    pdf_buf = generate_pdf()
+                    pdf_buf, pending = generate_pdf()
+                    # A generated report is a finished assessment; regenerating updates the same record
+                    record_store().save_draft(fd, draft_store(), st.session_state.draft_id)
                     st.success(f"✅ {t('generate_success')}")
                     with st.expander(f"ℹ️ {t('pdf_details')}"):
                         mc1, mc2 = st.columns(2)
@@ -1239,16 +794,52 @@ with center_col:
                             st.metric(t('report_language'), "中文" if st.session_state.pdf_language=="zh" else "English")
                         with mc2:
                             st.metric(t('generated'), datetime.now(pytz.timezone('Asia/Shanghai')).strftime('%H:%M:%S'))
-                    fname = f"WearTest_{fd.get('po_number','report')}_{st.session_state.selected_city}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                            st.metric(t('file_size'), f"{pdf_buf.getbuffer().nbytes / 1024:.1f} KB")
+                    generated = datetime.now().replace(microsecond=0)
+                    fname = f"WearTest_{fd.get('po_number','report')}_{st.session_state.selected_city}_{generated.strftime('%Y%m%d_%H%M%S')}.pdf"
+                    if not archive_report(report_archive, pdf_buf.getvalue(), fname, fd,
+                                          st.session_state.selected_city, st.session_state.pdf_language, generated):
+                        st.warning(f"⚠️ {t('archive_failed')}")
                     st.download_button(
                         label=t('download_pdf'),
                         data=pdf_buf, file_name=fname, mime="application/pdf",
                         use_container_width=True
                     )
+                    late_name = fname.replace(".pdf", "_translated.pdf")
+                    st.session_state._late_pdf = (
+                        {"future": rerender_when_translated(pending, late_name, generated), "fname": late_name}
+                        if pending else None)
+                except Overloaded:
+                    st.warning(f"⏳ {t('server_busy')}")
                 except Exception as e:
                     st.error(f"❌ {t('error_generating')}: {str(e)}")
                     with st.expander("Debug"):
-                        import traceback; st.code(traceback.format_exc())
+                        st.code(traceback.format_exc())
+
+    # ── Fully translated re-render, once late translations land ──────────────
+    late = st.session_state.get('_late_pdf')
+    if late:
+        polling = not late['future'].done()
+
+        @st.fragment(run_every=2 if polling else None)
+        def late_pdf():
+            fut = late['future']
+            if polling and fut.done():
+                st.rerun()           # run_every is fixed per full run; rerun the app to stop the timer
+            if not fut.done():
+                st.info(f"⏳ {t('tx_pending')}")
+            elif fut.exception() is not None:
+                st.error(f"❌ {t('error_generating')}: {fut.exception()}")
+            else:
+                st.success(f"✅ {t('tx_ready')}")
+                st.download_button(label=t('download_translated'), data=fut.result().getvalue(),
+                                   file_name=late['fname'],
+                                   mime="application/pdf", use_container_width=True)
+        late_pdf()
+
+# ── Autosave (changed fields only, written off the UI thread) ────────────────
+st.session_state._draft_flat = draft_store().submit(
+    st.session_state.draft_id, fd, st.session_state.get('_draft_flat'))
 
 # ── Footer ────────────────────────────────────────────────────────────────────
 st.markdown(f"""
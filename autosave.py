@@ -0,0 +1,236 @@
+"""
+Draft autosave for in-progress assessments.
+
+Each rerun of the app hands the current ``form_data`` to ``DraftStore.submit``,
+which diffs it against the previous rerun's copy and queues only the
+changed leaves. A single background thread per process debounces those
+diffs and appends them to a WAL-mode SQLite log; every ``compact_every``
+rows a draft is rewritten as one snapshot row. Restoring reads the latest
+snapshot plus the few diffs after it.
+
+The UI thread only flattens ``fd`` (a few hundred leaves) and compares dicts.
+
+A draft also remembers the saved record it produced (``link_record``), so
+regenerating after a refresh or restore updates that record instead of
+adding a second one.
+"""
+from datetime import date, datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+DRAFTS_DB = os.getenv(
+    "WEAR_TEST_DRAFTS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "drafts.db"))
+
+_FLUSH = object()
+
+
+# ─── Flat view of form_data ────────────────────────────────────────────────────
+def flatten(fd, prefix=()):
+    """Nested dicts -> {(key, subkey, ...): leaf}. Lists are copied."""
+    flat = {}
+    for k, v in fd.items():
+        path = prefix + (k,)
+        if isinstance(v, dict) and v:
+            flat.update(flatten(v, path))
+        elif isinstance(v, list):
+            flat[path] = list(v)
+        else:
+            flat[path] = v
+    return flat
+
+
+def unflatten(flat):
+    fd = {}
+    for path, v in flat.items():
+        node = fd
+        for k in path[:-1]:
+            node = node.setdefault(k, {})
+        node[path[-1]] = v
+    return fd
+
+
+def diff(old, new):
+    """(changed leaves, removed paths) between two flat views."""
+    changed = {p: v for p, v in new.items() if p not in old or old[p] != v}
+    removed = [p for p in old if p not in new]
+    return changed, removed
+
+
+def _encode_value(v):
+    if isinstance(v, datetime):
+        return {"$datetime": v.isoformat()}
+    if isinstance(v, date):
+        return {"$date": v.isoformat()}
+    return v
+
+
+def _decode_value(v):
+    if isinstance(v, dict):
+        if "$date" in v:
+            return date.fromisoformat(v["$date"])
+        if "$datetime" in v:
+            return datetime.fromisoformat(v["$datetime"])
+    return v
+
+
+def _encode(changed, removed):
+    return json.dumps({"s": [[list(p), _encode_value(v)] for p, v in changed.items()],
+                       "d": [list(p) for p in removed]}, ensure_ascii=False)
+
+
+def _apply(flat, payload):
+    body = json.loads(payload)
+    for p in body["d"]:
+        flat.pop(tuple(p), None)
+    for p, v in body["s"]:
+        flat[tuple(p)] = _decode_value(v)
+
+
+def new_draft_id():
+    return uuid.uuid4().hex[:16]
+
+
+# ─── Store ─────────────────────────────────────────────────────────────────────
+class DraftStore:
+    """Append-only draft log with a debounced background writer."""
+
+    def __init__(self, path=None, debounce=1.0, compact_every=50):
+        self.path          = path or DRAFTS_DB
+        self.debounce      = debounce
+        self.compact_every = compact_every
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS draft_log (
+                                draft_id TEXT    NOT NULL,
+                                seq      INTEGER NOT NULL,
+                                ts       REAL    NOT NULL,
+                                kind     TEXT    NOT NULL,   -- 'diff' | 'snapshot'
+                                payload  TEXT    NOT NULL,
+                                PRIMARY KEY (draft_id, seq))""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS draft_records (
+                                draft_id  TEXT PRIMARY KEY,
+                                record_id INTEGER NOT NULL,
+                                po_number TEXT NOT NULL,
+                                style     TEXT NOT NULL)""")
+        self._queue  = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="draft-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ── UI-thread side ───────────────────────────────────────────────────────
+    def submit(self, draft_id, fd, last_flat=None):
+        """
+        Queue whatever changed in ``fd`` since ``last_flat`` (the value this
+        returned on the previous call). Returns the new flat view to keep.
+        """
+        flat = flatten(fd)
+        changed, removed = diff(last_flat or {}, flat)
+        if changed or removed:
+            self._queue.put((draft_id, changed, removed, flat))
+        return flat
+
+    def flush(self, timeout=10):
+        """Write everything queued so far, ignoring the debounce window."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def restore(self, draft_id):
+        """Latest saved form_data of a draft, or None."""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT payload FROM draft_log
+                   WHERE draft_id = ? AND seq >= COALESCE(
+                       (SELECT MAX(seq) FROM draft_log WHERE draft_id = ? AND kind = 'snapshot'), 0)
+                   ORDER BY seq""", (draft_id, draft_id)).fetchall()
+        if not rows:
+            return None
+        flat = {}
+        for (payload,) in rows:
+            _apply(flat, payload)
+        return unflatten(flat)
+
+    def discard(self, draft_id):
+        self.flush()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM draft_log WHERE draft_id = ?", (draft_id,))
+            conn.execute("DELETE FROM draft_records WHERE draft_id = ?", (draft_id,))
+
+    def link_record(self, draft_id, record_id, po_number, style):
+        """Remember that ``draft_id`` was saved as ``record_id`` under this PO and style."""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO draft_records VALUES (?, ?, ?, ?)",
+                         (draft_id, record_id, po_number or "", style or ""))
+
+    def linked_record(self, draft_id):
+        """``(record_id, po_number, style)`` last linked to ``draft_id``, or None."""
+        with self._connect() as conn:
+            return conn.execute("SELECT record_id, po_number, style FROM draft_records WHERE draft_id = ?",
+                                (draft_id,)).fetchone()
+
+    # ── writer thread ────────────────────────────────────────────────────────
+    def _run(self):
+        conn    = self._connect()
+        pending = {}   # draft_id -> [changed, removed, latest flat, first queued at]
+        rows    = {}   # draft_id -> (next seq, rows since last snapshot)
+        while True:
+            due = [p[3] + self.debounce for p in pending.values()]
+            try:
+                item = self._queue.get(timeout=max(0.0, min(due) - time.monotonic()) if due else None)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] is _FLUSH:
+                self._write(conn, pending, list(pending), rows)
+                item[1].set()
+                continue
+            if item is not None:
+                draft_id, changed, removed, flat = item
+                p = pending.get(draft_id)
+                if p is None:
+                    pending[draft_id] = [dict(changed), set(removed), flat, time.monotonic()]
+                else:
+                    for path in removed:
+                        p[0].pop(path, None)
+                    p[1].difference_update(changed)
+                    p[1].update(removed)
+                    p[0].update(changed)
+                    p[2] = flat
+            now = time.monotonic()
+            self._write(conn, pending, [d for d, p in pending.items() if p[3] + self.debounce <= now], rows)
+
+    def _write(self, conn, pending, draft_ids, rows):
+        if not draft_ids:
+            return
+        with conn:
+            for draft_id in draft_ids:
+                changed, removed, flat, _ = pending.pop(draft_id)
+                if draft_id not in rows:
+                    seq, snap = conn.execute(
+                        """SELECT COALESCE(MAX(seq), 0),
+                                  COALESCE(MAX(CASE WHEN kind = 'snapshot' THEN seq END), 0)
+                           FROM draft_log WHERE draft_id = ?""", (draft_id,)).fetchone()
+                    rows[draft_id] = (seq + 1, seq - snap)
+                seq, count = rows[draft_id]
+                if count + 1 >= self.compact_every:
+                    # Compaction: one snapshot replaces the whole history
+                    conn.execute("INSERT INTO draft_log VALUES (?, ?, ?, 'snapshot', ?)",
+                                 (draft_id, seq, time.time(), _encode(flat, [])))
+                    conn.execute("DELETE FROM draft_log WHERE draft_id = ? AND seq < ?", (draft_id, seq))
+                    rows[draft_id] = (seq + 1, 0)
+                else:
+                    conn.execute("INSERT INTO draft_log VALUES (?, ?, ?, 'diff', ?)",
+                                 (draft_id, seq, time.time(), _encode(changed, sorted(removed))))
+                    rows[draft_id] = (seq + 1, count + 1)
@@ -0,0 +1,334 @@
+"""
+Side-by-side comparison of several assessments, e.g. the Prototype, SMS
+and Production samples of one style.
+
+``align`` puts N assessments on shared axes, one leading sample axis each:
+
+    fit      (N, fields)               0-2, higher is better; -1 unanswered
+    ext      (N, periods, questions)   1 Yes / 0 No / -1 not in the protocol
+    scores   (N, 2, days)              comfort, appearance; NaN not tracked
+
+Periods, questions and days are the union over the samples' protocols, in
+first-seen order. ``diff`` compares every sample with the first (the
+baseline) in whole-array operations, and ``render_comparison`` draws one
+PDF with the report's own section headers, Q&A, grid and heat-map tables.
+
+    python compare_report.py out.pdf --style ST-1
+    python compare_report.py out.pdf --ids 3 8 12 --lang zh
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+
+from form_schema import CHINESE_CITIES, FEEL_FIELDS, YES_NO, get_protocol
+from pdf_report import (C_GREY_TEXT, CONTENT_TOP, CONTENT_W, FIT_DEFAULTS, FIT_LABELS, FIT_SECTIONS, FOOTER_H,
+                        MARGIN_L, _china_now, _font, _new_canvas, _wrap_text, draw_frame_chrome,
+                        draw_heatmap_table, draw_matrix_table, draw_page_counter, draw_qa_table,
+                        draw_section_header, draw_two_col_kv)
+from records import RecordStore
+from tester_scores import KINDS, day_scores
+
+FIT_FIELDS = sum(FIT_SECTIONS.values(), ())
+FEEL_LEVEL = {"Uncomfortable": 0, "Somewhat Comfortable": 1, "Comfortable": 2}
+FEEL_ZH    = {"Comfortable": "舒适", "Somewhat Comfortable": "较舒适", "Uncomfortable": "不舒适"}
+YN_ZH      = {"Yes": "是", "No": "否"}
+
+
+# ─── Alignment / diffs ─────────────────────────────────────────────────────────
+def _union(lists):
+    return list(dict.fromkeys(v for vals in lists for v in vals))
+
+
+def align(fds):
+    """Shared-axis arrays for ``fds`` (see module docstring)."""
+    protos    = [get_protocol(fd.get('protocol')) for fd in fds]
+    periods   = _union(p['time_periods'] for p in protos)
+    questions = _union(p['questions'] for p in protos)
+    days      = _union(p['days_to_track'] for p in protos)
+    p_at, q_at, d_at = ({v: i for i, v in enumerate(vals)} for vals in (periods, questions, days))
+
+    fit    = np.full((len(fds), len(FIT_FIELDS)), -1, dtype=np.int8)
+    ext    = np.full((len(fds), len(periods), len(questions)), -1, dtype=np.int8)
+    scores = np.full((len(fds), len(KINDS), len(days)), np.nan)
+    for i, (fd, proto) in enumerate(zip(fds, protos)):
+        for j, k in enumerate(FIT_FIELDS):
+            v = fd.get(k)
+            if k in FEEL_FIELDS:
+                fit[i, j] = FEEL_LEVEL.get(v, -1)
+            elif v in YES_NO:
+                fit[i, j] = 2 if v == FIT_DEFAULTS[k] else 0
+        data = fd.get('extended_data') or {}
+        for p in proto['time_periods']:
+            answers = data.get(p) or {}
+            ext[i, p_at[p], [q_at[q] for q in proto['questions']]] = \
+                [answers.get(q, "No") == "Yes" for q in proto['questions']]
+        cols = [d_at[d] for d in proto['days_to_track']]
+        for k, kind in enumerate(KINDS):
+            scores[i, k, cols] = day_scores(fd, kind, proto['days_to_track'])
+    return {"fit": fit, "ext": ext, "scores": scores, "periods": periods, "questions": questions,
+            "days": days, "protocols": protos}
+
+
+def diff(al):
+    """Every sample against sample 0: what got worse, what got better, per-sample totals."""
+    fit, ext, sc = al["fit"], al["ext"], al["scores"]
+    known  = (fit >= 0) & (fit[:1] >= 0)
+    delta  = sc - sc[:1]
+    with np.errstate(invalid="ignore"):
+        score_worse  = delta <= -1
+        score_better = delta >= 1
+    tracked = ~np.isnan(sc)
+    n_days  = tracked.sum(axis=2)
+    out = {
+        "fit_worse":    known & (fit < fit[:1]),
+        "fit_better":   known & (fit > fit[:1]),
+        "ext_new":      (ext == 1) & (ext[:1] == 0),
+        "ext_gone":     (ext == 0) & (ext[:1] == 1),
+        "score_delta":  delta,
+        "score_worse":  score_worse,
+        "score_better": score_better,
+        "issues":       (ext == 1).sum(axis=(1, 2)),
+        "score_mean":   np.divide(np.where(tracked, sc, 0).sum(axis=2), n_days,
+                                  out=np.full(n_days.shape, np.nan), where=n_days > 0),
+    }
+    out["regressions"] = np.stack([out["fit_worse"].sum(axis=1), out["ext_new"].sum(axis=(1, 2)),
+                                   score_worse.sum(axis=(1, 2))], axis=1)
+    return out
+
+
+# ─── Rendering ─────────────────────────────────────────────────────────────────
+def _qa_row_h(q, pdf_lang):
+    return max(1, len(_wrap_text(q, CONTENT_W * 0.72 - 16, 8, pdf_lang))) * 13 + 8
+
+
+def _qa_flow(c, y, rows, pdf_lang, new_page):
+    """``draw_qa_table`` over as many pages as ``rows`` need."""
+    while rows:
+        if y < FOOTER_H + 60:
+            y = new_page()
+        room, k = y - FOOTER_H - 40, 0
+        while k < len(rows) and room >= _qa_row_h(rows[k][0], pdf_lang):
+            room -= _qa_row_h(rows[k][0], pdf_lang)
+            k += 1
+        k = max(1, k)
+        y = draw_qa_table(c, y, rows[:k], pdf_lang)
+        rows = rows[k:]
+        if rows:
+            y = new_page()
+    return y
+
+
+def _none(v):
+    return None if v != v else round(v, 1)
+
+
+def comparison_pages(c, fds, pdf_lang, new_page, al=None, dd=None):
+    """Draw the comparison onto ``c`` starting at the top of a framed page."""
+    al = al or align(fds)
+    dd = dd or diff(al)
+
+    def loc(en, zh):
+        return zh if pdf_lang == "zh" else en
+
+    def answer(k, v):
+        if pdf_lang != "zh":
+            return v
+        return (FEEL_ZH if k in FEEL_FIELDS else YN_ZH).get(v, v)
+
+    protos = al["protocols"]
+    def day_label(d):
+        if pdf_lang == "zh":
+            return next((p['day_zh'][d] for p in protos if d in p['day_zh']), d)
+        return d
+
+    def period_label(p):
+        if pdf_lang == "zh":
+            return next((pr['period_zh'][p] for pr in protos if p in pr['period_zh']), p)
+        return p
+
+    def question_label(q):
+        if pdf_lang == "zh":
+            return next((pr['question_zh'][q] for pr in protos if q in pr['question_zh']), q)
+        return q
+
+    tags = [f"S{i + 1}" for i in range(len(fds))]
+    cols = [f"{t} {fd.get('sample_type') or ''}".strip() for t, fd in zip(tags, fds)]
+    fn_r = _font(pdf_lang)
+    y    = CONTENT_TOP
+
+    # ── 1. Samples ───────────────────────────────────────────────────────────
+    y = draw_section_header(c, y, loc("1. SAMPLES COMPARED", "1. 对比样品"), pdf_lang)
+    desc = [" · ".join(str(v) for v in (fd.get('sample_type'), fd.get('po_number'), fd.get('factory'),
+                                        fd.get('prep_date')) if v) or "—" for fd in fds]
+    pairs = [(tags[i], desc[i], tags[i + 1] if i + 1 < len(fds) else "", desc[i + 1] if i + 1 < len(fds) else "")
+             for i in range(0, len(fds), 2)]
+    y = draw_two_col_kv(c, y, pairs, pdf_lang) - 4
+    style = ", ".join(dict.fromkeys(fd.get('style') or "—" for fd in fds))
+    c.setFillColor(C_GREY_TEXT)
+    c.setFont(fn_r, 7.5)
+    c.drawString(MARGIN_L, y - 4, loc(f"Style {style}; baseline S1. Counts are items worse than S1.",
+                                f"款式 {style}；基准 S1。数字为比 S1 变差的项目数。"))
+    y -= 16
+
+    # ── 2. Summary ───────────────────────────────────────────────────────────
+    y = draw_section_header(c, y, loc("2. SUMMARY VS S1", "2. 与 S1 对比概要"), pdf_lang)
+    reg, mean = dd["regressions"], dd["score_mean"]
+    rows = []
+    for i in range(1, len(fds)):
+        c_m, a_m = (f"{v:.1f}" if v == v else "—" for v in mean[i])
+        rows.append((loc(f"{cols[i]}: fit {reg[i, 0]}, wear issues {reg[i, 1]} new, scores {reg[i, 2]} lower; "
+                         f"mean comfort {c_m}, appearance {a_m}",
+                         f"{cols[i]}：合脚 {reg[i, 0]}，新增磨损问题 {reg[i, 1]}，评分下降 {reg[i, 2]}；"
+                         f"平均舒适 {c_m}，外观 {a_m}"),
+                     loc(f"{reg[i].sum()} worse", f"{reg[i].sum()} 项变差")))
+    y = _qa_flow(c, y, rows, pdf_lang, new_page) if rows else y
+
+    # ── 3. Fit ───────────────────────────────────────────────────────────────
+    if y < FOOTER_H + 200:
+        y = new_page()
+    y = draw_section_header(c, y, loc("3. TOUCH & FIT", "3. 触感与合脚性"), pdf_lang)
+    cells = tuple(tuple(answer(k, fd.get(k) or "—") for fd in fds) for k in FIT_FIELDS)
+    y = draw_matrix_table(c, y, tuple(loc(*FIT_LABELS[k]) for k in FIT_FIELDS), tuple(cols), cells,
+                          pdf_lang, new_page, corner_label=loc("Question", "问题"))
+
+    # ── 4. Extended wear: only checkpoints where some sample reported a problem ──
+    if y < FOOTER_H + 120:
+        y = new_page()
+    y = draw_section_header(c, y, loc("4. EXTENDED WEAR (ISSUES REPORTED)", "4. 延长穿着（已报告问题）"), pdf_lang)
+    hit = np.argwhere((al["ext"] == 1).any(axis=0))
+    if len(hit):
+        yn = {1: loc("Yes", "是"), 0: loc("No", "否"), -1: "—"}
+        labels = tuple(f"{period_label(al['periods'][p])} · {question_label(al['questions'][q])}"
+                       for p, q in hit)
+        grid = al["ext"][:, hit[:, 0], hit[:, 1]].T
+        y = draw_matrix_table(c, y, labels, tuple(cols), tuple(tuple(yn[v] for v in row) for row in grid.tolist()),
+                              pdf_lang, new_page, corner_label=loc("Checkpoint", "检查点"))
+    else:
+        c.setFillColor(C_GREY_TEXT)
+        c.setFont(fn_r, 8)
+        c.drawString(MARGIN_L + 8, y - 8, loc("No sample reported an extended-wear issue.", "所有样品均未报告延长穿着问题。"))
+        y -= 20
+
+    # ── 5. Daily scores: samples × days heat map ─────────────────────────────
+    if y < FOOTER_H + 200:
+        y = new_page()
+    y = draw_section_header(c, y, loc("5. DAILY SCORES", "5. 每日评分"), pdf_lang)
+    sc = al["scores"]
+    inter = np.stack([sc[:, 0], sc[:, 1]], axis=-1).reshape(len(fds), -1)
+    with np.errstate(invalid="ignore"):
+        tracked = ~np.isnan(sc)
+        best  = np.where(tracked.any(axis=0), np.where(tracked, sc, -np.inf).max(axis=0), np.nan)
+        worst = np.where(tracked.any(axis=0), np.where(tracked, sc, np.inf).min(axis=0), np.nan)
+    m_tracked = ~np.isnan(mean)
+    m_best  = np.where(m_tracked.any(axis=0), np.where(m_tracked, mean, -np.inf).max(axis=0), np.nan)
+    m_worst = np.where(m_tracked.any(axis=0), np.where(m_tracked, mean, np.inf).min(axis=0), np.nan)
+
+    def flat(day_pair, mean_pair):
+        return tuple(_none(v) for v in np.concatenate(
+            [np.stack(day_pair, axis=-1).reshape(-1), np.asarray(mean_pair)]).tolist())
+
+    heat_rows = [(cols[i], "tester", tuple(_none(v) for v in np.concatenate([inter[i], mean[i]]).tolist()))
+                 for i in range(len(fds))]
+    heat_rows += [(loc("Best", "最高"), "score", flat((best[0], best[1]), m_best)),
+                  (loc("Worst", "最低"), "score", flat((worst[0], worst[1]), m_worst)),
+                  (loc("Spread (max-min)", "极差"), "spread",
+                   flat((best[0] - worst[0], best[1] - worst[1]), m_best - m_worst))]
+    y = draw_heatmap_table(c, y, (loc("Sample", "样品"), loc("Mean", "均值"), (loc("C", "舒"), loc("A", "外")),
+                                  loc("Each day: C = comfort, A = appearance (1-5); blank = not tracked",
+                                      "每天：舒 = 舒适度，外 = 外观 (1-5)；空白 = 未跟踪")),
+                           tuple(day_label(d) for d in al["days"]), tuple(heat_rows), pdf_lang, new_page)
+
+    # ── 6. Everything that got worse than the baseline ──────────────────────
+    rows = []
+    for i, j in np.argwhere(dd["fit_worse"]).tolist():
+        k = FIT_FIELDS[j]
+        rows.append((f"{cols[i]} · {loc(*FIT_LABELS[k])}  ({answer(k, fds[0].get(k))} → {answer(k, fds[i].get(k))})",
+                     answer(k, fds[i].get(k))))
+    for i, p, q in np.argwhere(dd["ext_new"]).tolist():
+        rows.append((f"{cols[i]} · {period_label(al['periods'][p])} · {question_label(al['questions'][q])}",
+                     loc("New issue", "新问题")))
+    kind_lbl = (loc("comfort", "舒适"), loc("appearance", "外观"))
+    for i, k, d in np.argwhere(dd["score_worse"]).tolist():
+        rows.append((f"{cols[i]} · {day_label(al['days'][d])} {kind_lbl[k]}: "
+                     f"{sc[0, k, d]:.0f} → {sc[i, k, d]:.0f}", f"{dd['score_delta'][i, k, d]:+.0f}"))
+    if y < FOOTER_H + 100:
+        y = new_page()
+    y = draw_section_header(c, y, loc("6. REGRESSIONS VS S1", "6. 相对 S1 的退步项"), pdf_lang)
+    if rows:
+        y = _qa_flow(c, y, rows, pdf_lang, new_page)
+    else:
+        c.setFillColor(C_GREY_TEXT)
+        c.setFont(fn_r, 8)
+        c.drawString(MARGIN_L + 8, y - 8, loc("Nothing is worse than S1.", "没有比 S1 更差的项目。"))
+        y -= 20
+    return y
+
+
+def render_comparison(fds, pdf_lang="en", city="Shanghai", now=None, profile="compact"):
+    """
+    One PDF comparing ``fds`` (first = baseline). Single pass: page
+    numbers are forms filled in at the end. Returns a BytesIO at 0.
+    """
+    if len(fds) < 2:
+        raise ValueError("a comparison needs at least two assessments")
+    now      = now or _china_now()
+    city_zh  = CHINESE_CITIES.get(city, city)
+    gen_time = now.strftime('%Y-%m-%d %H:%M')
+
+    buf = io.BytesIO()
+    c   = _new_canvas(buf, profile)
+    c.setTitle("Wear Test Comparison" if pdf_lang != "zh" else "穿着测试对比")
+    c.beginForm("chrome")
+    draw_frame_chrome(c, pdf_lang, city, city_zh, gen_time)
+    c.endForm()
+
+    page = [1]
+    def frame():
+        c.doForm("chrome")
+        c.doForm(f"pg{page[0]}")
+
+    def new_page():
+        c.showPage()
+        page[0] += 1
+        frame()
+        return CONTENT_TOP
+
+    frame()
+    comparison_pages(c, fds, pdf_lang, new_page)
+    for n in range(1, page[0] + 1):
+        c.beginForm(f"pg{n}")
+        draw_page_counter(c, n, page[0], pdf_lang)
+        c.endForm()
+    c.save()
+    buf.seek(0)
+    return buf
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare saved assessments side by side in one PDF.")
+    ap.add_argument("out", help="output PDF path")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--style", help="every saved record of this style, oldest first")
+    src.add_argument("--ids", type=int, nargs="+", help="record ids, baseline first")
+    ap.add_argument("--lang", default="en", choices=["en", "zh"])
+    ap.add_argument("--city", default="Shanghai")
+    ap.add_argument("--db", help="records database (default: WEAR_TEST_RECORDS_DB)")
+    args = ap.parse_args(argv)
+
+    store = RecordStore(args.db)
+    ids   = args.ids or [r[0] for r in store.by_style(args.style)]
+    fds   = [store.get(i) for i in ids]
+    if None in fds:
+        ap.error(f"no record {ids[fds.index(None)]}")
+    t0  = time.perf_counter()
+    pdf = render_comparison(fds, args.lang, args.city).getvalue()
+    with open(args.out, "wb") as f:
+        f.write(pdf)
+    print(f"{len(fds)} samples, {len(pdf):,} bytes in {(time.perf_counter() - t0) * 1000:.0f} ms -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Compact binary encoding of ``form_data``.
+
+A form as the app and the importer build it packs into a few hundred
+bytes, most of which is the free text:
+
+    header           magic, schema version, protocol name, protocol layout crc
+    enums            sample_type index, the three feel ratings (2 bits each)
+    yes/no fields    one bit each (``YES_NO_FIELDS`` order)
+    fit_sizes/testers  bitmasks over ``FIT_SIZES`` / ``TESTERS``
+    prep_date        proleptic ordinal, uint32
+    scores           comfort then appearance, one uint8 per ``days_to_track`` entry
+    extended grid    one bit per (period, question), periods major
+    text             text fields then per-day issues, UTF-8, NUL separated
+    extras           JSON for anything that does not fit the above
+
+Anything off the fast path -- a value outside its vocabulary, a missing
+or additional key, a score that is not an int 1-5, text containing NUL --
+travels whole in ``extras`` and wins on decode, so ``decode(encode(fd))
+== fd`` for any JSON-able form. Decoding needs the same protocol layout
+as encoding; a changed protocol is reported, not guessed at.
+
+    python form_codec.py --bench 2000
+"""
+from array import array
+from datetime import date
+import argparse
+import hashlib
+import json
+import pickle
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from form_schema import (SAMPLE_TYPES, FEEL_OPTIONS, FIT_SIZES, TESTERS, TEXT_FIELDS,
+                         FEEL_FIELDS, YES_NO_FIELDS, get_protocol)
+from records import dumps, loads
+
+MAGIC   = b"WF"
+VERSION = 1
+
+# Key order of default_form_data(), which decode() reproduces
+FIELD_ORDER = ('protocol', 'po_number', 'factory', 'color', 'style', 'brand', 'sample_type',
+               'description', 'fit_sizes', 'testers') + FEEL_FIELDS + YES_NO_FIELDS + (
+               'prepared_by', 'prep_date', 'approved_by', 'overall_result',
+               'extended_data', 'comfort_scores', 'appearance_scores', 'issues')
+
+_HEAD  = struct.Struct("<2sBH")        # magic, version, protocol name length
+_FIXED = struct.Struct("<IBBIBBII")    # layout crc, sample_type, feels, yes/no bits,
+                                       # fit_sizes, testers, prep_date, text length
+_NONE  = 255
+_KNOWN = frozenset(FIELD_ORDER)
+_YN    = {"0": "No", "1": "Yes"}
+_BIT   = {"No": "0", "Yes": "1"}
+_ENUMS = {'sample_type': {v: i for i, v in enumerate(SAMPLE_TYPES)},
+          'feel':        {v: i for i, v in enumerate(FEEL_OPTIONS)}}
+
+
+def _layout(proto):
+    days, periods, questions = proto['days_to_track'], proto['time_periods'], proto['questions']
+    crc = zlib.crc32(json.dumps([days, periods, questions]).encode())
+    return crc, days, periods, questions
+
+
+_LAYOUTS = {}
+
+
+def _layout_of(proto):
+    # Protocols are module-level constants; key on identity so lookups stay O(1)
+    key = id(proto)
+    if key not in _LAYOUTS:
+        _LAYOUTS[key] = (proto, _layout(proto))
+    return _LAYOUTS[key][1]
+
+
+def _mask(values, vocab):
+    """Bitmask of ``values`` over ``vocab``, or None unless it lists them in vocab order."""
+    if not isinstance(values, list) or not all(v in vocab for v in values):
+        return None
+    bits = sum(1 << vocab.index(v) for v in set(values))
+    return bits if _unmask(bits, vocab) == values else None
+
+
+def _unmask(bits, vocab):
+    return [v for i, v in enumerate(vocab) if bits >> i & 1]
+
+
+def _text_ok(v):
+    return isinstance(v, str) and "\x00" not in v
+
+
+def _grid(ext, periods, questions):
+    """Yes bits of a complete Yes/No extended-wear grid, or None."""
+    if not isinstance(ext, dict) or len(ext) != len(periods):
+        return None
+    cells = []
+    try:
+        for p in periods:
+            answers = ext[p]
+            if list(answers) == questions:           # the usual case: keys in protocol order
+                cells.extend(answers.values())
+            elif len(answers) == len(questions):
+                cells.extend(map(answers.__getitem__, questions))
+            else:
+                return None
+        # "Yes","No",... -> "10..." reversed so cell 0 lands in bit 0
+        return int("".join(map(_BIT.__getitem__, cells))[::-1] or "0", 2)
+    except (KeyError, TypeError):
+        return None
+
+
+def _scores(vals, days):
+    """Scores for ``days`` if ``vals`` holds exactly those days with ints 1-5, else None."""
+    if not isinstance(vals, dict) or len(vals) != len(days):
+        return None
+    row = list(map(vals.get, days))
+    if set(map(type, row)) != {int} or min(row) < 1 or max(row) > 5:
+        return None
+    return row
+
+
+# ─── Encode ────────────────────────────────────────────────────────────────────
+def encode(fd):
+    """``form_data`` -> bytes."""
+    proto = get_protocol(fd.get('protocol'))
+    crc, days, periods, questions = _layout_of(proto)
+    extras  = {} if _KNOWN.issuperset(fd) else {k: v for k, v in fd.items() if k not in _KNOWN}
+    missing = [] if _KNOWN.issubset(fd) else [k for k in FIELD_ORDER if k not in fd]
+
+    name = fd.get('protocol', "")
+    if not isinstance(name, str):
+        extras['protocol'], name = name, ""
+    name = name.encode()
+
+    sample = fd.get('sample_type')
+    sample = _ENUMS['sample_type'].get(sample, _NONE) if isinstance(sample, str) else _NONE
+    if sample == _NONE and 'sample_type' in fd:
+        extras['sample_type'] = fd['sample_type']
+
+    feels = 0
+    for i, k in enumerate(FEEL_FIELDS):
+        v = _ENUMS['feel'].get(fd.get(k), 3) if isinstance(fd.get(k), str) else 3
+        if v == 3 and k in fd:
+            extras[k] = fd[k]
+        feels |= v << 2 * i
+
+    yes = 0
+    for i, k in enumerate(YES_NO_FIELDS):
+        v = fd.get(k)
+        if v == "Yes":
+            yes |= 1 << i
+        elif v != "No" and k in fd:
+            extras[k] = v
+
+    masks = []
+    for k, vocab in (('fit_sizes', FIT_SIZES), ('testers', TESTERS)):
+        m = _mask(fd.get(k), vocab)
+        if m is None:
+            m = 0
+            if k in fd:
+                extras[k] = fd[k]
+        masks.append(m)
+
+    prep = fd.get('prep_date')
+    if type(prep) is date:
+        prep = prep.toordinal()
+    else:
+        if 'prep_date' in fd:
+            extras['prep_date'] = prep
+        prep = 0
+
+    scores = array('B')
+    for k in ('comfort_scores', 'appearance_scores'):
+        row = _scores(fd.get(k), days)
+        if row is None:
+            row = [0] * len(days)
+            if k in fd:
+                extras[k] = fd[k]
+        scores.extend(row)
+
+    grid = _grid(fd.get('extended_data'), periods, questions)
+    if grid is None:
+        grid = 0
+        if 'extended_data' in fd:
+            extras['extended_data'] = fd['extended_data']
+
+    texts = list(map(fd.get, TEXT_FIELDS))
+    if set(map(type, texts)) != {str} or any("\x00" in v for v in texts):
+        for i, k in enumerate(TEXT_FIELDS):
+            if not _text_ok(texts[i]):
+                if k in fd:
+                    extras[k] = texts[i]
+                texts[i] = ""
+    issues = fd.get('issues')
+    row = list(map(issues.get, days)) if isinstance(issues, dict) and len(issues) == len(days) else None
+    if row is None or set(map(type, row)) != {str} or any("\x00" in v for v in row):
+        row = [""] * len(days)
+        if 'issues' in fd:
+            extras['issues'] = issues
+    texts += row
+    text = "\x00".join(texts).encode()
+
+    tail = dumps({"set": extras, "missing": missing}).encode() if extras or missing else b""
+    return b"".join((
+        _HEAD.pack(MAGIC, VERSION, len(name)), name,
+        _FIXED.pack(crc, sample, feels, yes, masks[0], masks[1], prep, len(text)),
+        scores.tobytes(), grid.to_bytes((len(periods) * len(questions) + 7) // 8, "little"),
+        text, tail))
+
+
+# ─── Decode ────────────────────────────────────────────────────────────────────
+def _header(blob):
+    magic, version, n = _HEAD.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not an encoded form")
+    if version != VERSION:
+        raise ValueError(f"unsupported form encoding version {version}")
+    name  = blob[_HEAD.size:_HEAD.size + n].decode()
+    proto = get_protocol(name)
+    crc, days, periods, questions = _layout_of(proto)
+    fixed = _FIXED.unpack_from(blob, _HEAD.size + n)
+    if fixed[0] != crc:
+        raise ValueError(f"protocol {name or 'standard'!r} has changed since this form was encoded")
+    return name, days, periods, questions, fixed, _HEAD.size + n + _FIXED.size
+
+
+def decode(blob):
+    """bytes from ``encode`` -> ``form_data``."""
+    name, days, periods, questions, fixed, pos = _header(blob)
+    _, sample, feels, yes, fit, testers, prep, text_len = fixed
+    n = len(days)
+    scores = blob[pos:pos + 2 * n]
+    pos   += 2 * n
+    cells  = len(periods) * len(questions)
+    grid   = int.from_bytes(blob[pos:pos + (cells + 7) // 8], "little")
+    pos   += (cells + 7) // 8
+    texts  = blob[pos:pos + text_len].decode().split("\x00")
+    tail   = blob[pos + text_len:]
+
+    text  = dict(zip(TEXT_FIELDS, texts))
+    bits  = map(_YN.__getitem__, format(grid, f"0{cells}b")[::-1] if cells else "")
+    ext   = {p: dict(zip(questions, bits)) for p in periods}   # zip takes just len(questions) each
+
+    fd = {'protocol': name}
+    for k in FIELD_ORDER[1:6]:
+        fd[k] = text[k]
+    fd['sample_type'] = SAMPLE_TYPES[sample] if sample != _NONE else None
+    fd['description'] = text['description']
+    fd['fit_sizes']   = _unmask(fit, FIT_SIZES)
+    fd['testers']     = _unmask(testers, TESTERS)
+    for i, k in enumerate(FEEL_FIELDS):
+        v = feels >> 2 * i & 3
+        fd[k] = FEEL_OPTIONS[v] if v < 3 else None
+    for i, k in enumerate(YES_NO_FIELDS):
+        fd[k] = "Yes" if yes >> i & 1 else "No"
+    fd['prepared_by']       = text['prepared_by']
+    fd['prep_date']         = date.fromordinal(prep) if prep else None
+    fd['approved_by']       = text['approved_by']
+    fd['overall_result']    = text['overall_result']
+    fd['extended_data']     = ext
+    fd['comfort_scores']    = dict(zip(days, scores[:n]))
+    fd['appearance_scores'] = dict(zip(days, scores[n:]))
+    fd['issues']            = dict(zip(days, texts[len(TEXT_FIELDS):]))
+    if tail:
+        extra = loads(tail)
+        fd.update(extra["set"])
+        for k in extra["missing"]:
+            del fd[k]
+    return fd
+
+
+def score_vectors(blob):
+    """``(days, comfort, appearance)`` straight from the bytes, as zero-copy uint8 arrays."""
+    _, days, _, _, _, pos = _header(blob)
+    scores = np.frombuffer(blob, np.uint8, 2 * len(days), pos)
+    return days, scores[:len(days)], scores[len(days):]
+
+
+def digest(fd):
+    """Stable content hash of a form, for cache keys."""
+    return hashlib.blake2b(encode(fd), digest_size=16).hexdigest()
+
+
+# ─── Benchmark ─────────────────────────────────────────────────────────────────
+def _bench(n, protocol, repeat=5):
+    import random
+    from loadtest import random_form_data
+    rng = random.Random(0)
+    fds = [random_form_data(rng, protocol) for _ in range(n)]
+    codecs = {
+        "json":   (lambda fd: dumps(fd).encode(), loads),
+        "pickle": (pickle.dumps, pickle.loads),
+        "binary": (encode, decode),
+    }
+    print(f"{n:,} random {protocol} forms", file=sys.stderr)
+    for label, (enc, dec) in codecs.items():
+        t_enc = t_dec = float("inf")
+        for _ in range(repeat):             # best of, to keep other load out of it
+            t0 = time.perf_counter()
+            blobs = [enc(fd) for fd in fds]
+            t1 = time.perf_counter()
+            back = [dec(b) for b in blobs]
+            t_enc, t_dec = min(t_enc, t1 - t0), min(t_dec, time.perf_counter() - t1)
+        assert back == fds, f"{label} round-trip mismatch"
+        size  = sum(map(len, blobs)) / n
+        zsize = sum(len(zlib.compress(b)) for b in blobs) / n
+        print(f"  {label:<7} {size:7.0f} B  (zlib {zsize:5.0f} B)  "
+              f"encode {t_enc / n * 1e6:6.1f} us  decode {t_dec / n * 1e6:6.1f} us", file=sys.stderr)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Binary form_data encoding.")
+    ap.add_argument("--bench", type=int, metavar="N", help="compare with JSON and pickle on N random forms")
+    ap.add_argument("--protocol", default="standard")
+    args = ap.parse_args(argv)
+    if args.bench:
+        _bench(args.bench, args.protocol)
+    else:
+        ap.print_help()
+
+
+if __name__ == "__main__":
+    main()
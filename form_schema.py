@@ -0,0 +1,173 @@
+"""
+Shared wear-test vocabulary: cities, test protocols (tracking periods,
+days and questions) and the shape of a blank ``form_data`` record.
+
+Kept free of Streamlit so the PDF renderer and offline tools can use it.
+"""
+from datetime import datetime
+import json
+import os
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+CHINESE_CITIES = {
+    "Guangzhou":"广州","Shenzhen":"深圳","Dongguan":"东莞","Foshan":"佛山",
+    "Zhongshan":"中山","Huizhou":"惠州","Zhuhai":"珠海","Jiangmen":"江门",
+    "Zhaoqing":"肇庆","Shanghai":"上海","Beijing":"北京","Suzhou":"苏州",
+    "Hangzhou":"杭州","Ningbo":"宁波","Wenzhou":"温州","Wuhan":"武汉",
+    "Chengdu":"成都","Chongqing":"重庆","Tianjin":"天津","Nanjing":"南京",
+    "Xi'an":"西安","Qingdao":"青岛","Dalian":"大连","Shenyang":"沈阳",
+    "Changsha":"长沙","Zhengzhou":"郑州","Jinan":"济南","Harbin":"哈尔滨",
+    "Changchun":"长春","Taiyuan":"太原","Shijiazhuang":"石家庄","Lanzhou":"兰州",
+    "Xiamen":"厦门","Fuzhou":"福州","Nanning":"南宁","Kunming":"昆明",
+    "Guiyang":"贵阳","Haikou":"海口","Ürümqi":"乌鲁木齐","Lhasa":"拉萨",
+}
+
+time_periods  = ["1 Hour","1 Day","1 Week","2 Weeks","3 Weeks","4 Weeks"]
+days_to_track = ["Day 1","Day 2","Day 3","Day 4","Day 5","Day 6","Day 7",
+                 "2 Weeks","3 Weeks","4 Weeks","5 Weeks"]
+questions_d   = [
+    "Does shoe feel unstable when walking?",
+    "Any upper broken or damage?",
+    "Any sole gapping?",
+    "Does lining color come off?",
+    "Any appearance changes?",
+    "Any piece rubbing feet?",
+    "Is bottom severely worn?"
+]
+
+# Fixed answer vocabularies and the form fields that use them
+SAMPLE_TYPES = ["Prototype","Full Size","Die Cut","Mass Production"]
+FEEL_OPTIONS = ["Uncomfortable","Somewhat Comfortable","Comfortable"]
+YES_NO       = ["No","Yes"]
+FIT_SIZES    = ["4/6/37","6/8/39","8/10/41"]
+TESTERS      = ["Tester A","Tester B","Tester C"]
+
+TEXT_FIELDS   = ('po_number','factory','color','style','brand','description',
+                 'prepared_by','approved_by','overall_result')
+FEEL_FIELDS   = ('upper_feel','lining_feel','sock_feel')
+YES_NO_FIELDS = ('toe_length','ball_position','shoe_flex','arch_support','top_gapping',
+                 'fit_properly','feel_fit','interior_lining','feel_stability','slipping',
+                 'sole_flexibility','toe_room','rubbing','red_marks')
+
+PERIOD_ZH = {
+    "1 Hour":"1小时","1 Day":"1天","1 Week":"1周",
+    "2 Weeks":"2周","3 Weeks":"3周","4 Weeks":"4周",
+}
+QUESTION_ZH = {
+    "Does shoe feel unstable when walking?":  "行走时鞋子感觉不稳定吗？",
+    "Any upper broken or damage?":            "鞋面有任何破损吗？",
+    "Any sole gapping?":                       "鞋底有脱胶吗？",
+    "Does lining color come off?":            "内里颜色有脱色吗？",
+    "Any appearance changes?":                "外观有任何变化吗？",
+    "Any piece rubbing feet?":                "有任何部件摩擦脚吗？",
+    "Is bottom severely worn?":               "底部严重磨损了吗？",
+}
+DAY_ZH = {
+    "Day 1":"第1天","Day 2":"第2天","Day 3":"第3天","Day 4":"第4天",
+    "Day 5":"第5天","Day 6":"第6天","Day 7":"第7天",
+    "2 Weeks":"2周","3 Weeks":"3周","4 Weeks":"4周","5 Weeks":"5周",
+}
+
+# ─── Test protocols ────────────────────────────────────────────────────────────
+# The standard protocol is built in; more are loaded from protocols.json next
+# to this file, or from the file named by WEAR_TEST_PROTOCOLS. A protocol
+# entry there may override "standard" too.
+PROTOCOLS_PATH = os.getenv(
+    "WEAR_TEST_PROTOCOLS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "protocols.json"))
+
+STANDARD_PROTOCOL = {
+    "name":            "standard",
+    "label":           "Standard Wear Test",
+    "label_zh":        "标准穿着测试",
+    "time_periods":    time_periods,
+    "days_to_track":   days_to_track,
+    "questions":       questions_d,
+    "period_zh":       PERIOD_ZH,
+    "day_zh":          DAY_ZH,
+    "question_zh":     QUESTION_ZH,
+    "extended_layout": "tables",
+}
+
+
+def _normalise_protocol(name, raw):
+    """Fill defaults and check a protocol read from config."""
+    for key in ("time_periods", "days_to_track", "questions"):
+        vals = raw.get(key)
+        if not vals or not all(isinstance(v, str) and v for v in vals):
+            raise ValueError(f"protocol {name!r}: {key} must be a non-empty list of strings")
+        if len(set(vals)) != len(vals):
+            raise ValueError(f"protocol {name!r}: {key} has duplicate entries")
+    layout = raw.get("extended_layout", "matrix")
+    if layout not in ("tables", "matrix"):
+        raise ValueError(f"protocol {name!r}: extended_layout must be 'tables' or 'matrix'")
+    return {
+        "name":            name,
+        "label":           raw.get("label", name),
+        "label_zh":        raw.get("label_zh", raw.get("label", name)),
+        "time_periods":    list(raw["time_periods"]),
+        "days_to_track":   list(raw["days_to_track"]),
+        "questions":       list(raw["questions"]),
+        "period_zh":       dict(raw.get("period_zh", {})),
+        "day_zh":          dict(raw.get("day_zh", {})),
+        "question_zh":     dict(raw.get("question_zh", {})),
+        "extended_layout": layout,
+    }
+
+
+def load_protocols(path=None):
+    """Built-in standard protocol plus everything defined in the config file."""
+    path = path or PROTOCOLS_PATH
+    protocols = {"standard": STANDARD_PROTOCOL}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for name, raw in json.load(f).items():
+                protocols[name] = _normalise_protocol(name, raw)
+    return protocols
+
+
+PROTOCOLS = load_protocols()
+
+
+def get_protocol(name=None):
+    """Look up a protocol by name; unknown or missing names get the standard one."""
+    return PROTOCOLS.get(name or "standard", PROTOCOLS["standard"])
+
+
+def ensure_protocol_fields(fd, protocol):
+    """Add any per-period / per-day entries the protocol needs to ``fd``."""
+    fd['protocol'] = protocol['name']
+    ext = fd.setdefault('extended_data', {})
+    for p in protocol['time_periods']:
+        period = ext.setdefault(p, {})
+        for q in protocol['questions']:
+            period.setdefault(q, "No")
+    for key, blank in (('comfort_scores', 3), ('appearance_scores', 3), ('issues', "")):
+        scores = fd.setdefault(key, {})
+        for d in protocol['days_to_track']:
+            scores.setdefault(d, blank)
+    return fd
+
+
+def default_form_data(protocol="standard"):
+    """A blank assessment, as the app starts a new session with."""
+    proto = get_protocol(protocol)
+    periods, days, questions = proto['time_periods'], proto['days_to_track'], proto['questions']
+    return {
+        'protocol':proto['name'],
+        'po_number':'','factory':'','color':'','style':'','brand':'',
+        'sample_type':'Prototype','description':'',
+        'fit_sizes':['6/8/39'],'testers':['Tester A'],
+        'upper_feel':'Comfortable','lining_feel':'Comfortable','sock_feel':'Comfortable',
+        'toe_length':'Yes','ball_position':'Yes','shoe_flex':'Yes',
+        'arch_support':'Yes','top_gapping':'No','fit_properly':'Yes',
+        'feel_fit':'Yes','interior_lining':'Yes','feel_stability':'Yes',
+        'slipping':'No','sole_flexibility':'Yes','toe_room':'Yes',
+        'rubbing':'No','red_marks':'No',
+        'prepared_by':'','prep_date':datetime.now().date(),
+        'approved_by':'','overall_result':'',
+        'extended_data':{p:{q:"No" for q in questions} for p in periods},
+        'comfort_scores':{d:3 for d in days},
+        'appearance_scores':{d:3 for d in days},
+        'issues':{d:"" for d in days},
+    }
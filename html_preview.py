@@ -0,0 +1,218 @@
+"""
+Live HTML preview of a wear-test report.
+
+Renders ``pdf_report.report_blocks`` -- the same sections, localised labels
+(``loc``/``yn``/``feel``) and answers as the PDF -- as lightweight HTML.
+Long text is broken with the PDF's own ``_wrap_text`` at the PDF's column
+widths, and everything is sized in PDF points × ``SCALE``, so lines break
+where they will in print. Page breaks the report always makes show as
+dividers.
+
+``PreviewCache`` keeps each block's HTML between reruns; only blocks whose
+content changed are rendered again.
+"""
+from html import escape
+
+from pdf_report import (CONTENT_W, C_PRIMARY, C_ACCENT, C_ACCENT2, C_LIGHT, C_GREY_TEXT,
+                        C_GREY_LINE, C_SOFT_BLUE, C_PILL, _answer_color, _china_now, _heat_text,
+                        _identity, _wrap_text, heat_color, report_blocks, score_color)
+
+SCALE = 1.35   # CSS px per PDF point
+
+
+def _css(color):
+    return "#" + color.hexval()[2:]
+
+
+def _px(pt):
+    return f"{pt * SCALE:.1f}px"
+
+
+def _lines(text, width, size, pdf_lang):
+    return "<br>".join(escape(l) for l in _wrap_text(str(text), width, size, pdf_lang)) or "&nbsp;"
+
+
+STYLE = f"""<style>
+.wt-preview {{ width:{_px(CONTENT_W)}; max-width:100%; font-family:Helvetica,Arial,'Noto Sans SC',sans-serif;
+               color:{_css(C_PRIMARY)}; font-size:{_px(8)}; line-height:1.35; }}
+.wt-preview * {{ box-sizing:border-box; }}
+.wt-cover {{ background:{_css(C_PRIMARY)}; border-left:{_px(8)} solid {_css(C_ACCENT)};
+             border-top:{_px(6)} solid {_css(C_ACCENT)}; padding:{_px(18)} {_px(16)}; margin-bottom:{_px(16)}; }}
+.wt-cover h1 {{ color:#fff; font-size:{_px(20)}; margin:0; padding:0; }}
+.wt-cover .sub {{ color:{_css(C_SOFT_BLUE)}; font-size:{_px(11)}; margin:{_px(6)} 0 {_px(14)}; }}
+.wt-pill {{ display:inline-block; background:{_css(C_PILL)}; color:#fff; border-radius:{_px(4)};
+            padding:{_px(2)} {_px(8)}; margin-right:{_px(8)}; font-size:{_px(7)}; }}
+.wt-pill b {{ color:{_css(C_SOFT_BLUE)}; }}
+.wt-section {{ background:{_css(C_ACCENT2)}; color:#fff; font-weight:bold; font-size:{_px(10)};
+               border-radius:{_px(4)}; padding:{_px(5)} {_px(10)}; margin:0 0 {_px(8)}; }}
+.wt-period {{ background:{_css(C_PRIMARY)}; color:{_css(C_SOFT_BLUE)}; font-weight:bold; border-radius:{_px(3)};
+              padding:{_px(2)} {_px(8)}; margin-bottom:{_px(4)}; }}
+.wt-preview table {{ width:100%; border-collapse:collapse; margin-bottom:{_px(6)}; }}
+.wt-preview td, .wt-preview th {{ border-bottom:0.5px solid {_css(C_GREY_LINE)}; padding:{_px(4)} {_px(6)};
+                                  vertical-align:middle; text-align:left; white-space:nowrap; }}
+.wt-preview th {{ background:{_css(C_ACCENT)}; color:#fff; font-size:{_px(8)}; }}
+.wt-preview tr.shade td {{ background:{_css(C_LIGHT)}; }}
+.wt-preview td.k {{ color:{_css(C_ACCENT2)}; font-weight:bold; }}
+.wt-badge {{ display:inline-block; min-width:{_px(58)}; text-align:center; color:#fff; font-weight:bold;
+             border-radius:{_px(3)}; font-size:{_px(7.5)}; padding:{_px(1)} {_px(4)}; }}
+.wt-matrix .wt-badge {{ min-width:{_px(24)}; font-size:{_px(6.5)}; padding:0 {_px(2)}; }}
+.wt-desc {{ background:{_css(C_LIGHT)}; border:0.5px solid {_css(C_GREY_LINE)}; margin-bottom:{_px(6)}; }}
+.wt-desc .lbl {{ background:{_css(C_ACCENT2)}; color:#fff; font-weight:bold; font-size:{_px(8)};
+                 padding:{_px(3)} {_px(8)}; }}
+.wt-desc .txt {{ padding:{_px(8)} {_px(10)}; white-space:nowrap; }}
+.wt-bar {{ display:inline-block; width:{_px(55)}; height:{_px(8)}; background:{_css(C_GREY_LINE)};
+           border-radius:{_px(3)}; vertical-align:middle; margin-right:{_px(3)}; }}
+.wt-bar span {{ display:block; height:100%; border-radius:{_px(3)}; }}
+.wt-heat td {{ padding:0 {_px(1)}; text-align:center; font-size:{_px(6)}; font-weight:bold; color:#fff;
+               border:1px solid #fff; }}
+.wt-heat td.k {{ text-align:left; color:{_css(C_PRIMARY)}; font-weight:normal; }}
+.wt-heat tr.sum td {{ font-weight:bold; }}
+.wt-heat tr.tester + tr.sum td {{ border-top:1.5px solid {_css(C_PRIMARY)}; }}
+.wt-issue {{ color:{_css(C_GREY_TEXT)}; font-size:{_px(7)}; }}
+.wt-page {{ border-top:1px dashed {_css(C_GREY_LINE)}; margin:{_px(14)} 0; text-align:center;
+            color:{_css(C_GREY_TEXT)}; font-size:{_px(7)}; }}
+.wt-sign {{ display:flex; gap:{_px(30)}; margin-top:{_px(30)}; color:{_css(C_GREY_TEXT)}; }}
+.wt-sign div {{ width:{_px(180)}; border-top:1px solid {_css(C_PRIMARY)}; padding-top:{_px(3)}; }}
+.wt-conf {{ text-align:center; color:{_css(C_GREY_TEXT)}; font-size:{_px(7.5)}; margin-top:{_px(20)}; }}
+</style>"""
+
+
+# ─── Blocks ────────────────────────────────────────────────────────────────────
+def _badge(answer):
+    return f'<span class="wt-badge" style="background:{_css(_answer_color(answer))}">{escape(answer[:16])}</span>'
+
+
+def _bar(score):
+    return (f'<span class="wt-bar"><span style="width:{score / 5:.0%};background:{score_color(score)}">'
+            f'</span></span><b style="color:{score_color(score)}">{score}</b>')
+
+
+def _cover(pdf_lang, company, subtitle, pills):
+    pills = "".join(f'<span class="wt-pill"><b>{escape(l)}:</b> {escape(v)}</span>' for l, v in pills)
+    return f'<div class="wt-cover"><h1>{escape(company)}</h1><div class="sub">{escape(subtitle)}</div>{pills}</div>'
+
+
+def _kv(pdf_lang, pairs):
+    val_w = (CONTENT_W - 10) / 2 * 0.62 - 12
+    rows = "".join(
+        f'<tr class="{"shade" if i % 2 == 0 else ""}">'
+        f'<td class="k">{escape(l1)}</td><td>{_lines(v1, val_w, 8, pdf_lang)}</td>'
+        f'<td class="k">{escape(l2)}</td><td>{_lines(v2, val_w, 8, pdf_lang) if l2 else ""}</td></tr>'
+        for i, (l1, v1, l2, v2) in enumerate(pairs))
+    return f"<table>{rows}</table>"
+
+
+def _desc(pdf_lang, label, text):
+    return (f'<div class="wt-desc"><div class="lbl">{escape(label)}</div>'
+            f'<div class="txt">{_lines(text, CONTENT_W - 20, 8, pdf_lang)}</div></div>')
+
+
+def _qa(pdf_lang, rows):
+    q_lbl, a_lbl = ("问题", "回答") if pdf_lang == "zh" else ("Question", "Response")
+    body = "".join(
+        f'<tr class="{"shade" if i % 2 == 0 else ""}"><td>{_lines(q, CONTENT_W * 0.72 - 16, 8, pdf_lang)}</td>'
+        f'<td style="text-align:right">{_badge(a)}</td></tr>'
+        for i, (q, a) in enumerate(rows))
+    return f'<table><tr><th>{q_lbl}</th><th style="text-align:right">{a_lbl}</th></tr>{body}</table>'
+
+
+def _matrix(pdf_lang, row_labels, col_labels, cells):
+    corner = "问题" if pdf_lang == "zh" else "Question"
+    head = "".join(f'<th style="text-align:center;font-size:{_px(6.5)}">{escape(c)}</th>' for c in col_labels)
+    body = "".join(
+        f'<tr class="{"shade" if i % 2 == 0 else ""}"><td>{_lines(lbl, CONTENT_W * 0.36 - 12, 7, pdf_lang)}</td>'
+        + "".join(f'<td style="text-align:center;padding:{_px(2)}">'
+                  f'<span class="wt-badge" style="background:{_css(_answer_color(a))}">{escape(a[:4])}</span></td>'
+                  for a in cells[i]) + "</tr>"
+        for i, lbl in enumerate(row_labels))
+    return (f'<div style="overflow-x:auto"><table class="wt-matrix"><tr><th>{corner}</th>{head}</tr>'
+            f'{body}</table></div>')
+
+
+def _heatmap(pdf_lang, labels, col_labels, rows):
+    corner, mean_lbl, (c_lbl, a_lbl), legend = labels
+    head = "".join(f'<th colspan="2" style="text-align:center">{escape(c)}</th>'
+                   for c in list(col_labels) + [mean_lbl])
+    sub  = "".join(f'<th style="text-align:center;font-size:{_px(5.5)}">{escape(c_lbl)}</th>'
+                   f'<th style="text-align:center;font-size:{_px(5.5)}">{escape(a_lbl)}</th>'
+                   for _ in range(len(col_labels) + 1))
+
+    def cell(kind, v):
+        if kind == "spread" and v is not None:
+            return f'<td style="color:{_css(C_PRIMARY)}">{_heat_text(v)}</td>'
+        if not v:
+            return f'<td style="background:{_css(C_LIGHT)}"></td>'
+        return f'<td style="background:{heat_color(v)}">{_heat_text(v)}</td>'
+
+    body = "".join(
+        f'<tr class="{"tester" if kind == "tester" else "sum"}"><td class="k">{escape(label)}</td>'
+        + "".join(cell(kind, v) for v in vals) + "</tr>"
+        for label, kind, vals in rows)
+    return (f'<div class="wt-issue">{escape(legend)}</div><div style="overflow-x:auto">'
+            f'<table class="wt-heat"><tr><th rowspan="2">{escape(corner)}</th>{head}</tr><tr>{sub}</tr>'
+            f'{body}</table></div>')
+
+
+def _scores(pdf_lang, hdr_labels, days):
+    head = "".join(f"<th>{escape(h)}</th>" for h in hdr_labels)
+    body = "".join(
+        f'<tr class="{"shade" if i % 2 == 0 else ""}"><td>{escape(day)}</td><td>{_bar(c)}</td><td>{_bar(a)}</td>'
+        f'<td class="wt-issue">{_lines(issue or "—", CONTENT_W - 240, 7, pdf_lang)}</td></tr>'
+        for i, (day, c, a, issue) in enumerate(days))
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+
+def _signoff(pdf_lang, sig_prep, sig_appr, conf):
+    return (f'<div class="wt-sign"><div>{escape(sig_prep)}</div><div>{escape(sig_appr)}</div></div>'
+            f'<div class="wt-conf">{escape(conf)}</div>')
+
+
+_RENDER = {
+    "cover":   _cover,
+    "section": lambda pdf_lang, label: f'<div class="wt-section">{escape(label)}</div>',
+    "period":  lambda pdf_lang, label: f'<div class="wt-period">{escape(label)}</div>',
+    "kv":      _kv,
+    "desc":    _desc,
+    "qa":      _qa,
+    "matrix":  _matrix,
+    "scores":  _scores,
+    "heatmap": _heatmap,
+    "signoff": _signoff,
+    "gap":     lambda pdf_lang, h: f'<div style="height:{_px(h)}"></div>',
+    "break":   lambda pdf_lang, min_space: ('<div class="wt-page">— page break —</div>'
+                                            if min_space is None else ""),
+}
+
+
+def render_block(block, pdf_lang):
+    kind, *args = block
+    return _RENDER[kind](pdf_lang, *args)
+
+
+class PreviewCache:
+    """Per-block HTML memo, so a rerun only renders what changed."""
+
+    def __init__(self):
+        self._html = {}
+        self.hits = self.misses = 0
+
+    def render(self, blocks, pdf_lang):
+        fresh, parts = {}, []
+        for block in blocks:
+            key  = (pdf_lang, block)
+            html = self._html.get(key)
+            if html is None:
+                html = render_block(block, pdf_lang)
+                self.misses += 1
+            else:
+                self.hits += 1
+            fresh[key] = html
+            parts.append(html)
+        self._html = fresh   # drop blocks that no longer appear
+        return STYLE + '<div class="wt-preview">' + "".join(parts) + "</div>"
+
+
+def render_preview(fd, pdf_lang="en", city="Shanghai", now=None, tx=None, cache=None):
+    """HTML for the whole report. ``tx`` defaults to leaving text untranslated."""
+    blocks = report_blocks(fd, pdf_lang, city, now or _china_now(), tx or _identity)
+    return (cache or PreviewCache()).render(blocks, pdf_lang)
@@ -0,0 +1,409 @@
+"""
+Offline load test: how many simultaneous testers can one server carry?
+
+Simulates N concurrent sessions that fill in an assessment and press
+"Generate PDF", against a local stub of the OpenAI API with configurable
+latency, and reports per concurrency level:
+
+  p50/p95/p99 latency, throughput, CPU cores used, peak RSS,
+  and the serialisation points -- render time inflation under the GIL,
+  translation wait on the shared OpenAI client, session_state size.
+
+Two drivers:
+
+  headless  sessions are threads in this process, sharing one OpenAI client
+            and the GIL exactly like sessions of one Streamlit server
+  app       each session runs app.py through streamlit.testing (AppTest);
+            AppTest is not thread-safe, so sessions run in worker processes
+
+    python loadtest.py --levels 1,2,4,8 --latency 0.4 --lang zh
+    python loadtest.py --levels 4,8 --same-form     # everyone reporting on one PO
+    python loadtest.py --lang en --batch            # testers during a month-end batch
+    python loadtest.py --lang en --batch --batch-unscheduled
+
+With --batch, bulk renders run continuously underneath the sessions. By
+default both go through scheduler.Scheduler (sessions as INTERACTIVE, the
+batch as BATCH); --batch-unscheduled runs the batch on plain threads next
+to the sessions' own renders, as the app did before the scheduler.
+    python loadtest.py --mode app --levels 1,2 --sessions-per-worker 2
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from form_schema import CHINESE_CITIES, default_form_data
+from pdf_report import render_report
+import translation
+from scheduler import BATCH, INTERACTIVE, RENDER_WORKERS, Overloaded, Scheduler
+from translation import translate_text
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_WORDS = ("heel toe sole upper lining rubbing wear crease scuff stitch seam "
+          "gap glue comfortable tight loose soft stiff narrow wide arch").split()
+
+
+# ─── Stub OpenAI backend ───────────────────────────────────────────────────────
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        srv  = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        text = body.get("messages", [{}])[-1].get("content", "")
+        with srv.lock:
+            srv.calls += 1
+            srv.in_flight += 1
+            srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+        if (body.get("response_format") or {}).get("type") == "json_object":   # batched strings
+            content = json.dumps({"t": [f"译:{x}" for x in json.loads(text)]}, ensure_ascii=False)
+        else:
+            content = f"译:{text}"
+        usage = {"prompt_tokens": len(text) // 4 + 20, "completion_tokens": len(text) // 2 + 1}
+        try:
+            time.sleep(max(0.0, srv.latency + srv.per_token * usage["completion_tokens"]
+                                + random.uniform(-srv.jitter, srv.jitter)))
+            out = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion",
+                "created": int(time.time()), "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": dict(usage, total_tokens=sum(usage.values())),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_openai(latency=0.3, jitter=0.05, per_token=0.0):
+    """Serve /v1/chat/completions on localhost in a daemon thread. Latency grows ``per_token`` s per output token."""
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    srv.daemon_threads = True
+    srv.latency, srv.jitter, srv.per_token = latency, jitter, per_token
+    srv.lock = threading.Lock()
+    srv.calls = srv.in_flight = srv.max_in_flight = 0
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}/v1"
+
+
+# ─── Simulated tester input ────────────────────────────────────────────────────
+def _sentence(rng, lo, hi):
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(lo, hi))).capitalize() + "."
+
+
+def random_form_data(rng, protocol="standard"):
+    fd = default_form_data(protocol)
+    fd.update(
+        po_number=f"PO{rng.randint(10000, 99999)}", brand=rng.choice(["Acme", "Northwind", "Contoso"]),
+        factory=rng.choice(["Factory A", "Factory B"]), style=f"ST-{rng.randint(100, 999)}",
+        color=rng.choice(["Black", "White", "Navy"]), description=_sentence(rng, 20, 120),
+        prepared_by="QA Team", approved_by="Manager", overall_result=_sentence(rng, 3, 12),
+    )
+    for day in fd['comfort_scores']:
+        fd['comfort_scores'][day]    = rng.randint(1, 5)
+        fd['appearance_scores'][day] = rng.randint(1, 5)
+        fd['issues'][day] = _sentence(rng, 2, 15) if rng.random() < 0.4 else ""
+    for period in fd['extended_data'].values():
+        for q in period:
+            period[q] = rng.choice(["Yes", "No"])
+    return fd
+
+
+# ─── Session drivers ───────────────────────────────────────────────────────────
+def _headless_session(client, seed, lang, city, protocol, sched=None):
+    """One tester on the shared server: translate + two-pass render."""
+    rng   = random.Random(seed)
+    fd    = random_form_data(rng, protocol)
+    cache = {}
+    wait  = [0.0]
+
+    def tx(text):
+        if lang == "en":
+            return text
+        t0 = time.perf_counter()
+        try:
+            return translate_text(client, text, "zh", cache)
+        finally:
+            wait[0] += time.perf_counter() - t0
+
+    t0  = time.perf_counter()
+    if sched:
+        buf = sched.submit(render_report, fd, lang, city, tx, None, "compact",
+                           priority=INTERACTIVE, user=f"tester-{seed}", block=True).result()
+    else:
+        buf = render_report(fd, lang, city, tx=tx, profile="compact")
+    total = time.perf_counter() - t0
+    return {"latency": total, "tx_wait": wait[0], "render": total - wait[0],
+            "state_bytes": len(pickle.dumps((fd, cache))), "pdf_bytes": buf.getbuffer().nbytes}
+
+
+def _app_session(seed, lang, city, protocol):
+    """One tester driving app.py through Streamlit's testing API."""
+    # AppTest runs app.py as __main__ and leaves it in sys.modules; the next task
+    # this worker unpickles names __main__._app_session, so put ours back
+    main = sys.modules["__main__"]
+    try:
+        return _drive_app(seed, lang, city, protocol)
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _drive_app(seed, lang, city, protocol):
+    from streamlit.testing.v1 import AppTest
+    rng = random.Random(seed)
+    fd  = random_form_data(rng, protocol)
+    cpu0 = time.process_time()
+    at = AppTest.from_file(os.path.join(HERE, "app.py"), default_timeout=300).run()
+    at.selectbox(key="pdf_lang_select").set_value("English" if lang == "en" else "中文 (Mandarin)")
+    at.selectbox(key="city_select").set_value(city)
+    for key, field in (("po", "po_number"), ("fac", "factory"), ("col", "color"),
+                       ("sty", "style"), ("brd", "brand")):
+        at.text_input(key=key).set_value(fd[field])
+    at.text_area(key="desc").set_value(fd['description'])
+    for day, issue in fd['issues'].items():
+        if issue:
+            at.text_area(key=f"iss_{day}").set_value(issue)
+    at.run()
+    t0 = time.perf_counter()
+    at.button[0].click().run()
+    latency = time.perf_counter() - t0
+    if at.exception or at.error:
+        raise RuntimeError(f"app session failed: {[e.value for e in at.exception] or [e.value for e in at.error]}")
+    state = {k: at.session_state[k] for k in ("form_data", "translations_cache")}
+    return {"latency": latency, "tx_wait": None, "render": None,
+            "state_bytes": len(pickle.dumps(state)), "cpu": time.process_time() - cpu0,
+            "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+class _BatchLoad(threading.Thread):
+    """Bulk English renders, non-stop until ``stop()``, through ``sched`` or on bare threads."""
+    def __init__(self, sched, threads, protocol, seed):
+        super().__init__(daemon=True)
+        rng = random.Random(seed)
+        self.forms   = [random_form_data(rng, protocol) for _ in range(50)]
+        self.sched, self.threads = sched, threads
+        self.done, self._stop_ev = 0, threading.Event()
+        self._lock = threading.Lock()
+
+    def _render(self, fd):
+        render_report(fd, "en", "Shanghai", profile="compact")
+        with self._lock:
+            self.done += 1
+
+    def _loop(self):
+        for i in itertools.count():
+            if self._stop_ev.is_set():
+                return
+            self._render(self.forms[i % len(self.forms)])
+
+    def run(self):
+        if self.sched is None:
+            workers = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            return
+        for i in itertools.count():
+            if self._stop_ev.is_set():
+                return
+            try:   # blocks while the batch queue is full: backpressure on the producer
+                self.sched.submit(self._render, self.forms[i % len(self.forms)],
+                                  priority=BATCH, user="month-end", timeout=0.5)
+            except Overloaded:
+                pass
+
+    def stop(self):
+        self._stop_ev.set()
+
+
+# ─── Measurement helpers ───────────────────────────────────────────────────────
+class _RssSampler(threading.Thread):
+    """Peak resident set size of this process while a level runs."""
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval, self.peak, self._done = interval, 0, threading.Event()
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, self._rss())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, self._rss())
+        return self.peak / 2**20
+
+
+def _pct(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_level(mode, workers, sessions, lang, city, protocol, stub, client, seed, same_form=False,
+              sched=None, batch=None):
+    calls0 = stub.calls
+    batch0 = batch.done if batch else 0
+    saved0 = translation.stats()["coalesced"]
+    stub.max_in_flight = 0
+    sampler = _RssSampler()
+    sampler.start()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    seeds = [seed] * sessions if same_form else [seed + i for i in range(sessions)]
+    if mode == "headless":
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(lambda s: _headless_session(client, s, lang, city, protocol, sched),
+                                    seeds))
+    else:
+        # spawn, not fork: a forked child inherits the translation and render
+        # schedulers without their worker threads, and its jobs never run
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_app_session, seeds, [lang] * sessions,
+                                    [city] * sessions, [protocol] * sessions))
+    wall = time.perf_counter() - t0
+    cpu  = time.process_time() - cpu0
+    peak = sampler.stop()
+    if mode == "app":
+        cpu += sum(r["cpu"] for r in results)
+        peak = max(r["maxrss_mb"] for r in results)   # per worker process
+
+    lat = [r["latency"] * 1000 for r in results]
+    row = {
+        "workers": workers, "sessions": sessions,
+        "p50_ms": _pct(lat, 50), "p95_ms": _pct(lat, 95), "p99_ms": _pct(lat, 99),
+        "throughput_rps": sessions / wall, "cpu_cores": cpu / wall, "peak_rss_mb": peak,
+        "api_calls": stub.calls - calls0, "api_max_in_flight": stub.max_in_flight,
+        "api_saved": translation.stats()["coalesced"] - saved0,   # this process only
+        "state_kb": statistics.mean(r["state_bytes"] for r in results) / 1024,
+    }
+    if mode == "headless":
+        row["render_ms"]  = statistics.mean(r["render"] for r in results) * 1000
+        row["tx_wait_ms"] = statistics.mean(r["tx_wait"] for r in results) * 1000
+    if batch:
+        row["batch_rps"] = (batch.done - batch0) / wall
+    return row
+
+
+def _print_table(rows, mode):
+    cols = ["workers", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "cpu_cores",
+            "peak_rss_mb", "api_calls", "api_max_in_flight", "state_kb"]
+    if mode == "headless":
+        cols += ["api_saved", "render_ms", "render_x", "tx_wait_ms"]
+    if "batch_rps" in rows[0]:
+        cols += ["batch_rps"]
+    print("  ".join(f"{c:>13}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{r[c]:>13.1f}" if isinstance(r[c], float) else f"{r[c]:>13}" for c in cols))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--mode", choices=["headless", "app"], default="headless")
+    ap.add_argument("--levels", default="1,2,4,8", help="comma-separated concurrency levels")
+    ap.add_argument("--sessions-per-worker", type=int, default=4)
+    ap.add_argument("--latency", type=float, default=0.3, help="stub OpenAI latency in seconds")
+    ap.add_argument("--jitter", type=float, default=0.05)
+    ap.add_argument("--latency-per-token", type=float, default=0.0,
+                    help="stub latency added per completion token, in seconds")
+    ap.add_argument("--lang", choices=["en", "zh"], default="zh")
+    ap.add_argument("--city", default="Shanghai", choices=list(CHINESE_CITIES))
+    ap.add_argument("--protocol", default="standard")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--same-form", action="store_true",
+                    help="every session submits the same form (identical texts to translate)")
+    ap.add_argument("--batch", action="store_true", help="keep bulk renders running under the sessions")
+    ap.add_argument("--batch-unscheduled", action="store_true",
+                    help="run the batch on bare threads instead of through the scheduler")
+    ap.add_argument("--render-workers", type=int, default=RENDER_WORKERS)
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args(argv)
+    if args.batch and args.mode != "headless":
+        ap.error("--batch needs --mode headless")
+
+    stub, base_url = start_stub_openai(args.latency, args.jitter, args.latency_per_token)
+    # The app builds its client from the environment; point it at the stub
+    os.environ["OPENAI_API_KEY"]  = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    # ...and keep everything a Generate writes (drafts, records and rollups, archive,
+    # usage log, queued PDFs, profiles) out of the real data/ directory
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    for var, name in (("WEAR_TEST_DRAFTS_DB", "drafts.db"), ("WEAR_TEST_RECORDS_DB", "records.db"),
+                      ("WEAR_TEST_ARCHIVE_DB", "archive.db"), ("WEAR_TEST_TX_USAGE_DB", "translation_usage.db"),
+                      ("WEAR_TEST_PDF_STORE", "pdfs"), ("WEAR_TEST_PROFILE_DIR", "profiles")):
+        os.environ.setdefault(var, os.path.join(tmp, name))
+    from openai import OpenAI
+    client = OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+
+    sched = batch = None
+    if args.batch:
+        if not args.batch_unscheduled:
+            sched = Scheduler(args.render_workers, depth=(64, 256, 2 * args.render_workers),
+                              per_user=(2, 16, None), max_wait=(None, None, None), name="render")
+        batch = _BatchLoad(sched, args.render_workers, args.protocol, args.seed + 10_000)
+        batch.start()
+        time.sleep(1.0)   # let the batch reach steady state
+
+    rows = []
+    for n in (int(x) for x in args.levels.split(",")):
+        row = run_level(args.mode, n, n * args.sessions_per_worker, args.lang, args.city,
+                        args.protocol, stub, client, args.seed, args.same_form, sched, batch)
+        if args.mode == "headless":
+            row["render_x"] = row["render_ms"] / rows[0]["render_ms"] if rows else 1.0
+        rows.append(row)
+        print(f"level {n}: p95 {row['p95_ms']:.0f} ms, {row['throughput_rps']:.2f} reports/s",
+              file=sys.stderr)
+
+    print(f"\nmode={args.mode} lang={args.lang} stub latency={args.latency}s "
+          f"cpus={os.cpu_count()}\n")
+    _print_table(rows, args.mode)
+    if args.mode == "headless":
+        print("\nrender_x: mean render time relative to the first level -- growth with "
+              "cpu_cores pinned near 1.0 means renders are serialised on the GIL.\n"
+              "api_max_in_flight below the concurrency level means requests queue on the "
+              "shared OpenAI client.\napi_saved: translations served by joining an identical call "
+              "already in flight.\nstate_kb: form_data + translation cache each session keeps.")
+    if sched:
+        print("\nscheduler (queue wait ms):")
+        for cls, m in sched.metrics().items():
+            if m["submitted"]:
+                print(f"  {cls:<12} done {m['completed']:>6}  rejected {m['rejected']:>4}  "
+                      f"wait p50 {m['wait_p50_ms']:.1f}  p95 {m['wait_p95_ms']:.1f}  max {m['wait_max_ms']:.1f}")
+    if batch:
+        batch.stop()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "levels": rows,
+                       "scheduler": sched.metrics() if sched else None}, f, indent=2)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Archive of every generated PDF, deduplicated by content.
+
+A PDF is stored once under its SHA-256. Its bytes are split at PDF object
+boundaries (``N 0 obj``): each object body becomes a chunk keyed by its
+own hash and stored zlib-compressed, and the PDF keeps only a manifest of
+(object header, chunk hash) pairs. Revisions of a report share every
+object that did not change -- fonts, the page chrome, untouched pages --
+so storage grows with what changed, not with the number of revisions.
+Object numbers stay in the manifest, so a shifted number does not break
+sharing.
+
+Each archived download gets an index row: PO number, city, generation
+time, style and language, passed in by the app. The CLI's ``put`` reads the
+first three back from the app's file name
+(``WearTest_<PO>_<city>_<YYYYmmdd_HHMMSS>.pdf``).
+
+    python pdf_archive.py put WearTest_PO1_Shanghai_20240501_101500.pdf --style ST-1 --lang en
+    python pdf_archive.py find --po PO1
+    python pdf_archive.py get <sha256> -o report.pdf
+"""
+from datetime import datetime
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+
+ARCHIVE_DB = os.getenv(
+    "WEAR_TEST_ARCHIVE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "archive.db"))
+
+FNAME_RE = re.compile(r"^WearTest_(?P<po>.*)_(?P<city>[^_]+)_(?P<ts>\d{8}_\d{6})(?:_translated)?\.pdf$")
+INDEX_FIELDS = ('po_number', 'style', 'city', 'language', 'generated')
+
+_OBJ   = re.compile(rb"(?m)^\d+ \d+ obj")
+_ENTRY = struct.Struct("<H")       # manifest: header length, header, 16-byte chunk hash
+
+
+def parse_fname(fname):
+    """``{"po_number", "city", "generated"}`` from an app download name; ValueError otherwise."""
+    m = FNAME_RE.match(os.path.basename(fname))
+    if not m:
+        raise ValueError(f"not a WearTest report file name: {fname!r}")
+    return {"po_number": m["po"], "city": m["city"],
+            "generated": datetime.strptime(m["ts"], "%Y%m%d_%H%M%S").isoformat()}
+
+
+def split_pdf(pdf):
+    """``[(header, body)]`` with ``b"".join(h + b) == pdf``; one body per PDF object."""
+    starts = list(_OBJ.finditer(pdf))
+    if not starts:
+        return [(b"", pdf)]
+    parts = [(b"", pdf[:starts[0].start()])]
+    for m, nxt in zip(starts, starts[1:]):
+        parts.append((m.group(), pdf[m.end():nxt.start()]))
+    last = starts[-1]
+    end  = pdf.find(b"endobj", last.end())
+    end  = len(pdf) if end < 0 else end + len(b"endobj")
+    parts.append((last.group(), pdf[last.end():end]))
+    parts.append((b"", pdf[end:]))       # xref table and trailer: differ in every file
+    return parts
+
+
+def _key(body):
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+# ─── Archive ───────────────────────────────────────────────────────────────────
+class Archive:
+    """Chunk store, PDF manifests and the report index in one SQLite file."""
+
+    def __init__(self, path=None):
+        self.path = path or ARCHIVE_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                                hash   BLOB PRIMARY KEY,
+                                data   BLOB NOT NULL,
+                                size   INTEGER NOT NULL,
+                                zipped INTEGER NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS pdfs (
+                                sha256   TEXT PRIMARY KEY,
+                                size     INTEGER NOT NULL,
+                                manifest BLOB NOT NULL)""")
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS reports (
+                                 id       INTEGER PRIMARY KEY,
+                                 sha256   TEXT NOT NULL REFERENCES pdfs,
+                                 fname    TEXT NOT NULL,
+                                 {', '.join(f'{k} TEXT' for k in INDEX_FIELDS)},
+                                 archived REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_po ON reports (po_number, generated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_style ON reports (style, generated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_city ON reports (city, generated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_generated ON reports (generated)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def put(self, pdf, fname, po_number, city, generated, style="", language=""):
+        """
+        Archive ``pdf`` (bytes) downloaded as ``fname``. Index fields come
+        from the caller, not the name: a PO may hold any character, "/"
+        included. ``generated`` is a datetime or ISO string. Returns the SHA-256.
+        """
+        sha  = hashlib.sha256(pdf).hexdigest()
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM pdfs WHERE sha256 = ?", (sha,)).fetchone() is None:
+                parts = [(h, b, _key(b)) for h, b in split_pdf(pdf)]
+                keys  = list({k for _, _, k in parts})
+                have  = {r[0] for r in conn.execute(
+                    f"SELECT hash FROM chunks WHERE hash IN ({', '.join('?' * len(keys))})", keys)}
+                new = {}
+                for _, body, k in parts:
+                    if k not in have and k not in new:
+                        packed = zlib.compress(body, 6)
+                        zipped = len(packed) < len(body)
+                        new[k] = (k, packed if zipped else body, len(body), int(zipped))
+                conn.executemany("INSERT OR IGNORE INTO chunks VALUES (?, ?, ?, ?)", new.values())
+                manifest = b"".join(_ENTRY.pack(len(h)) + h + k for h, _, k in parts)
+                conn.execute("INSERT OR IGNORE INTO pdfs VALUES (?, ?, ?)", (sha, len(pdf), manifest))
+            conn.execute(f"INSERT INTO reports (sha256, fname, {', '.join(INDEX_FIELDS)}, archived) "
+                         f"VALUES (?, ?, {', '.join('?' * len(INDEX_FIELDS))}, ?)",
+                         (sha, fname, po_number or "", style or "", city or "", language or "",
+                          generated.isoformat() if isinstance(generated, datetime) else generated, time.time()))
+        return sha
+
+    def get(self, sha):
+        """The archived PDF's bytes; KeyError if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT manifest FROM pdfs WHERE sha256 = ?", (sha,)).fetchone()
+            if row is None:
+                raise KeyError(f"no archived PDF {sha}")
+            manifest, parts, pos = row[0], [], 0
+            while pos < len(manifest):
+                (n,) = _ENTRY.unpack_from(manifest, pos)
+                pos += _ENTRY.size
+                parts.append((manifest[pos:pos + n], manifest[pos + n:pos + n + 16]))
+                pos += n + 16
+            keys   = list({k for _, k in parts})
+            chunks = {k: zlib.decompress(d) if z else d for k, d, z in conn.execute(
+                f"SELECT hash, data, zipped FROM chunks WHERE hash IN ({', '.join('?' * len(keys))})", keys)}
+        return b"".join(h + chunks[k] for h, k in parts)
+
+    def find(self, po_number=None, style=None, city=None, language=None,
+             since=None, until=None, limit=50):
+        """Index rows matching every given field, newest first. ``since``/``until`` are ISO times."""
+        where, args = [], []
+        for col, val in (('po_number', po_number), ('style', style), ('city', city), ('language', language)):
+            if val:
+                where.append(f"{col} = ?")
+                args.append(val)
+        if since:
+            where.append("generated >= ?")
+            args.append(since)
+        if until:
+            where.append("generated < ?")
+            args.append(until)
+        sql = (f"SELECT r.id, r.sha256, r.fname, {', '.join('r.' + k for k in INDEX_FIELDS)}, p.size "
+               f"FROM reports r JOIN pdfs p ON p.sha256 = r.sha256"
+               f"{' WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY r.generated DESC, r.id DESC LIMIT ?")
+        cols = ('id', 'sha256', 'fname') + INDEX_FIELDS + ('size',)
+        with self._connect() as conn:
+            return [dict(zip(cols, r)) for r in conn.execute(sql, args + [limit])]
+
+    def stats(self):
+        """Report / PDF / chunk counts, and bytes as rendered versus as stored."""
+        with self._connect() as conn:
+            reports, = conn.execute("SELECT COUNT(*) FROM reports").fetchone()
+            pdfs, raw, manifests = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(manifest)), 0) FROM pdfs").fetchone()
+            chunks, stored = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()
+        return {"reports": reports, "pdfs": pdfs, "chunks": chunks,
+                "raw_bytes": raw, "stored_bytes": stored + manifests}
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap  = argparse.ArgumentParser(description="Deduplicated archive of generated reports.")
+    ap.add_argument("--db", help="archive path (default: WEAR_TEST_ARCHIVE_DB or data/archive.db)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("put", help="archive PDF files named by the app's convention")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--style", default="")
+    p.add_argument("--lang", default="")
+    f = sub.add_parser("find", help="list archived reports")
+    for k in ('po', 'style', 'city', 'lang', 'since', 'until'):
+        f.add_argument(f"--{k}")
+    f.add_argument("--limit", type=int, default=50)
+    g = sub.add_parser("get", help="write an archived PDF")
+    g.add_argument("sha256")
+    g.add_argument("-o", "--out", required=True)
+    sub.add_parser("stats", help="storage totals")
+    args = ap.parse_args(argv)
+
+    arc = Archive(args.db)
+    if args.cmd == "put":
+        for path in args.files:
+            with open(path, "rb") as fh:
+                meta = parse_fname(path)
+                print(arc.put(fh.read(), os.path.basename(path), meta["po_number"], meta["city"],
+                              meta["generated"], args.style, args.lang), os.path.basename(path))
+    elif args.cmd == "find":
+        for r in arc.find(args.po, args.style, args.city, args.lang, args.since, args.until, args.limit):
+            print(f"{r['generated']}  {r['po_number']:<14} {r['style']:<12} {r['city']:<10} "
+                  f"{r['language']:<3} {r['size']:>8,} B  {r['sha256'][:16]}  {r['fname']}")
+    elif args.cmd == "get":
+        t0  = time.perf_counter()
+        pdf = arc.get(args.sha256)
+        with open(args.out, "wb") as fh:
+            fh.write(pdf)
+        print(f"{len(pdf):,} bytes in {(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
+    else:
+        s = arc.stats()
+        ratio = s["raw_bytes"] / s["stored_bytes"] if s["stored_bytes"] else 0
+        print(f"{s['reports']:,} reports, {s['pdfs']:,} distinct PDFs, {s['chunks']:,} chunks; "
+              f"{s['raw_bytes']:,} B rendered -> {s['stored_bytes']:,} B stored ({ratio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
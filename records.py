@@ -0,0 +1,167 @@
+"""
+Saved wear-test records.
+
+Finished assessments live in one SQLite table: the full ``form_data`` as
+JSON plus a few columns pulled out of it for lookups (PO, brand, factory,
+style, sample type, protocol, date). Dates inside ``form_data`` are stored
+as tagged JSON values and come back as ``date`` objects.
+
+Every insert and edit also updates the aggregate rollups (see rollups.py)
+in the same transaction.
+"""
+from datetime import date, datetime
+import json
+import os
+import sqlite3
+import time
+
+import rollups
+
+RECORDS_DB = os.getenv(
+    "WEAR_TEST_RECORDS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "records.db"))
+
+INDEX_FIELDS = ('po_number', 'brand', 'factory', 'style', 'sample_type', 'protocol')
+
+
+# ─── form_data <-> JSON ────────────────────────────────────────────────────────
+def _default(v):
+    if isinstance(v, datetime):
+        return {"$datetime": v.isoformat()}
+    if isinstance(v, date):
+        return {"$date": v.isoformat()}
+    raise TypeError(f"{type(v).__name__} is not JSON serialisable")
+
+
+def _hook(d):
+    if len(d) == 1:
+        if "$date" in d:
+            return date.fromisoformat(d["$date"])
+        if "$datetime" in d:
+            return datetime.fromisoformat(d["$datetime"])
+    return d
+
+
+def dumps(fd):
+    return json.dumps(fd, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(s):
+    return json.loads(s, object_hook=_hook)
+
+
+def _row(fd, source):
+    prep = fd.get('prep_date')
+    return tuple(str(fd.get(k) or '') for k in INDEX_FIELDS) + (
+        prep.isoformat() if isinstance(prep, date) else None, source, time.time(), dumps(fd))
+
+
+# ─── Store ─────────────────────────────────────────────────────────────────────
+class RecordStore:
+    """SQLite table of assessments, one row each."""
+
+    _COLUMNS = INDEX_FIELDS + ('prep_date', 'source', 'created', 'form_data')
+
+    def __init__(self, path=None):
+        self.path = path or RECORDS_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS records (
+                                 id          INTEGER PRIMARY KEY,
+                                 {', '.join(f'{k} TEXT' for k in INDEX_FIELDS)},
+                                 prep_date   TEXT,
+                                 source      TEXT,
+                                 created     REAL NOT NULL,
+                                 form_data   TEXT NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_po ON records (po_number)")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_brand ON records (brand, prep_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_style ON records (style, prep_date)")
+            backfill = rollups.ensure_tables(conn) and conn.execute("SELECT 1 FROM records LIMIT 1").fetchone()
+        if backfill:
+            rollups.rebuild(self)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def insert_many(self, fds, source=None):
+        """Insert a batch of assessments in a single transaction. Returns the count."""
+        rows, acc = [], {}
+        for fd in fds:
+            rows.append(_row(fd, source))
+            rollups.add(acc, fd, rows[-1][-2])
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT INTO records ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})", rows)
+            rollups.apply(conn, acc)
+        return len(rows)
+
+    def save(self, fd, record_id=None, source="app"):
+        """Insert ``fd``, or overwrite record ``record_id``. Returns the record id."""
+        row = _row(fd, source)
+        with self._connect() as conn:
+            if record_id is None:
+                cur = conn.execute(
+                    f"INSERT INTO records ({', '.join(self._COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self._COLUMNS))})", row)
+                rollups.apply(conn, rollups.add({}, fd, row[-2]))
+                return cur.lastrowid
+            old = conn.execute("SELECT created, form_data FROM records WHERE id = ?", (record_id,)).fetchone()
+            if old is None:
+                raise KeyError(f"no record {record_id}")
+            conn.execute(
+                f"UPDATE records SET {', '.join(f'{k} = ?' for k in self._COLUMNS if k != 'created')} "
+                "WHERE id = ?", row[:-2] + row[-1:] + (record_id,))
+            # Swap the old contribution for the new one; month keys off the original creation time
+            acc = rollups.add({}, loads(old[1]), old[0], sign=-1)
+            rollups.apply(conn, rollups.add(acc, fd, old[0]))
+            return record_id
+
+    def get(self, record_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT form_data FROM records WHERE id = ?", (record_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def save_draft(self, fd, drafts, draft_id, source="app"):
+        """
+        Save the assessment draft ``draft_id`` (of DraftStore ``drafts``)
+        generated. Regenerating updates the record linked to the draft --
+        the link lives in the draft log, so it survives a refresh or restore.
+        A changed PO or style is a different assessment: it gets a new
+        record and the earlier one is left as it was. Returns the record id.
+        """
+        key  = (str(fd.get('po_number') or ''), str(fd.get('style') or ''))
+        link = drafts.linked_record(draft_id)
+        record_id = link[0] if link and tuple(link[1:]) == key else None
+        try:
+            record_id = self.save(fd, record_id, source)
+        except KeyError:     # linked record no longer exists
+            record_id = self.save(fd, None, source)
+        drafts.link_record(draft_id, record_id, *key)
+        return record_id
+
+    def by_style(self, style, limit=200):
+        """``[(id, po_number, sample_type, prep_date)]`` for one style, oldest first."""
+        with self._connect() as conn:
+            return conn.execute("SELECT id, po_number, sample_type, prep_date FROM records WHERE style = ? "
+                                "ORDER BY prep_date, id LIMIT ?", (style, limit)).fetchall()
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def iter_records(self, batch=500):
+        """Yield ``(id, form_data)`` in id order, ``batch`` rows per query."""
+        last = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute("SELECT id, form_data FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last, batch)).fetchall()
+            if not rows:
+                return
+            for rid, payload in rows:
+                yield rid, loads(payload)
+            last = rows[-1][0]
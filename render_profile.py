@@ -0,0 +1,378 @@
+"""
+Sampling profiles of slow report generations, and replay of their input.
+
+Opt-in: with WEAR_TEST_PROFILE_MS set, every ``generate_pdf`` runs under
+``capture``. A background thread samples the Python stacks of the request
+thread and the render worker every WEAR_TEST_PROFILE_INTERVAL_MS (5 ms).
+When the whole generation took longer than the threshold, three files go
+to WEAR_TEST_PROFILE_DIR (default data/profiles):
+
+    <stamp>.folded            collapsed stacks, one "a;b;c count" line each
+                              (flamegraph.pl, speedscope, inferno)
+    <stamp>.speedscope.json   one sampled profile per thread, for speedscope.app
+    <stamp>.json              scrubbed snapshot: form_data, language, city,
+                              the translations the render used, phase timings
+
+Faster generations are sampled and thrown away. Scrubbing replaces every
+letter, digit and CJK character of free text with one of the same class.
+Each word maps the same way everywhere in one capture, with a random key
+that is not stored. Lengths, word breaks, scripts and repeated strings
+survive, so wrapping, translation batching and page count are reproduced.
+Names, PO numbers and wording are not kept. Option answers (Yes/No, feel,
+fit sizes, sample type, protocol) and dates stay as they were.
+
+Renders sent to remote workers (WEAR_TEST_RENDER_QUEUE) show up as waiting;
+replay them locally to see inside.
+
+    python render_profile.py list
+    python render_profile.py replay data/profiles/20240501_101500_8312ms_3fa2c1.json --repeat 5 --profile
+"""
+from collections import Counter
+from datetime import datetime
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import secrets
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+from form_schema import FEEL_OPTIONS, FIT_SIZES, SAMPLE_TYPES, YES_NO
+from pdf_report import render_report, report_texts
+import records
+
+PROFILE_MS  = float(os.getenv("WEAR_TEST_PROFILE_MS", "0") or 0)        # 0: profiling off
+PROFILE_DIR = os.getenv(
+    "WEAR_TEST_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"))
+INTERVAL_MS = float(os.getenv("WEAR_TEST_PROFILE_INTERVAL_MS", "5"))
+MAX_SAMPLES = 200_000          # per capture; ~15 minutes of two threads at 5 ms
+
+_KEEP_VALUES = frozenset(FEEL_OPTIONS) | frozenset(YES_NO) | frozenset(FIT_SIZES) | frozenset(SAMPLE_TYPES)
+_KEEP_FIELDS = frozenset(('protocol',))
+_WORD        = re.compile(r"[A-Za-z0-9\u4e00-\u9fff]+")
+_LOWER, _UPPER, _DIGITS = "abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "0123456789"
+_CJK = ("的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定"
+        "行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然"
+        "前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系")
+
+
+# ─── Sampling ──────────────────────────────────────────────────────────────────
+def _label(code):
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Samples the stacks of registered threads every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, interval=INTERVAL_MS / 1000):
+        self.interval = interval
+        self.samples  = []          # (thread id, stack tuple root first)
+        self.names    = {}          # thread id -> thread name
+        self._threads = set()
+        self._stacks  = {}          # interned stack tuples
+        self._stop    = threading.Event()
+        self._thread  = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def add_thread(self, ident=None):
+        ident = ident or threading.get_ident()
+        self.names.setdefault(ident, threading.current_thread().name)
+        self._threads.add(ident)
+        return ident
+
+    def remove_thread(self, ident):
+        self._threads.discard(ident)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and len(self.samples) < MAX_SAMPLES:
+            frames = sys._current_frames()
+            for ident in list(self._threads):
+                f = frames.get(ident)
+                stack = []
+                while f is not None:
+                    stack.append(f.f_code)
+                    f = f.f_back
+                if stack:
+                    key = tuple(reversed(stack))
+                    self.samples.append((ident, self._stacks.setdefault(key, key)))
+
+    # ── Output ───────────────────────────────────────────────────────────────
+    def collapsed(self):
+        """Brendan Gregg's folded format: ``thread;frame;frame count`` per distinct stack."""
+        counts = Counter(self.samples)
+        return "".join(f"{self.names.get(t, t)};{';'.join(_label(c).replace(';', ':') for c in s)} {n}\n"
+                       for (t, s), n in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+    def speedscope(self, name="generate_pdf"):
+        """speedscope file-format dict: shared frames, one sampled profile per thread, in sample order."""
+        index, frames, profiles = {}, [], []
+        ms = self.interval * 1000
+        for ident in dict.fromkeys(t for t, _ in self.samples):
+            rows = []
+            for t, s in self.samples:
+                if t != ident:
+                    continue
+                row = []
+                for c in s:
+                    if c not in index:
+                        index[c] = len(frames)
+                        frames.append({"name": getattr(c, 'co_qualname', c.co_name),
+                                       "file": c.co_filename, "line": c.co_firstlineno})
+                    row.append(index[c])
+                rows.append(row)
+            profiles.append({"type": "sampled", "name": self.names.get(ident, str(ident)), "unit": "milliseconds",
+                             "startValue": 0, "endValue": len(rows) * ms,
+                             "samples": rows, "weights": [ms] * len(rows)})
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": name,
+                "exporter": "render_profile.py", "activeProfileIndex": 0,
+                "shared": {"frames": frames}, "profiles": profiles}
+
+    def top(self, n=15):
+        """``[(frame, self samples, total samples)]`` for the ``n`` frames with most self time."""
+        own, total = Counter(), Counter()
+        for _, s in self.samples:
+            own[s[-1]] += 1
+            for c in set(s):
+                total[c] += 1
+        return [(_label(c), k, total[c]) for c, k in own.most_common(n)]
+
+
+# ─── Scrubbing ─────────────────────────────────────────────────────────────────
+def _alphabet(ch):
+    """Characters ``ch`` may be replaced with: same class."""
+    return (_LOWER if "a" <= ch <= "z" else _UPPER if "A" <= ch <= "Z" else
+            _DIGITS if ch.isascii() else _CJK)
+
+
+def _scrubber(key):
+    memo, used = {}, set()
+
+    def word(m):
+        w = m.group()
+        if w not in memo:
+            # One-to-one, so distinct names stay distinct (they key per-tester scores)
+            rng = random.Random(hashlib.blake2b(w.encode(), key=key, digest_size=16).digest())
+            for _ in range(100):
+                out = "".join(rng.choice(_alphabet(ch)) for ch in w)
+                if out not in used:
+                    break
+            else:
+                # Short words can fill most of their shape (26 capital letters): take the first free one.
+                # Only more than 300 distinct one-character CJK words run out and are kept as they are.
+                out = next((c for c in map("".join, itertools.product(*map(_alphabet, w))) if c not in used), w)
+            memo[w] = out
+            used.add(out)
+        return memo[w]
+    return lambda text: _WORD.sub(word, text)
+
+
+def scrub(fd, key=None):
+    """
+    Copy of ``fd`` with free text replaced shape for shape (see module
+    docstring), plus the text function used, so strings derived from the
+    form (translations) can be scrubbed the same way.
+    """
+    words = _scrubber(key or secrets.token_bytes(16))
+
+    def text(v):
+        return v if v in _KEEP_VALUES else words(v)
+
+    def walk(v, field=None, names=False):
+        if isinstance(v, str):
+            return v if field in _KEEP_FIELDS else text(v)
+        if isinstance(v, dict):
+            # Tester names key the per-tester scores; every other key is structure
+            return {(text(k) if names else k): walk(x, k if field is None else field, field == 'tester_scores')
+                    for k, x in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [walk(x, field) for x in v]
+        return v
+    return walk(fd), text
+
+
+# ─── Capture ───────────────────────────────────────────────────────────────────
+class Capture:
+    """Profile of one generation; written out on exit if it ran past ``threshold_ms``."""
+
+    def __init__(self, fd, pdf_lang, city, threshold_ms=None, out_dir=None):
+        self.fd, self.pdf_lang, self.city = fd, pdf_lang, city
+        self.threshold_ms = PROFILE_MS if threshold_ms is None else threshold_ms
+        self.out_dir = out_dir or PROFILE_DIR
+        self.tx, self.pending, self.paths = None, (), None
+        self.phases  = {}
+        self.sampler = Sampler()
+
+    def __enter__(self):
+        self.now = datetime.now()
+        self._t0 = time.perf_counter()
+        self._main = self.sampler.add_thread()
+        self.sampler.start()
+        return self
+
+    def mark(self, phase):
+        """Record the time since the start under ``phase``."""
+        self.phases[phase] = round((time.perf_counter() - self._t0) * 1000, 1)
+
+    def wrap(self, fn):
+        """``fn`` with its executing thread sampled while it runs (for scheduler / pool workers)."""
+        def run(*args, **kwargs):
+            ident = self.sampler.add_thread()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if ident != self._main:
+                    self.sampler.remove_thread(ident)
+        return run
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (time.perf_counter() - self._t0) * 1000
+        self.sampler.stop()
+        if exc_type is None and self.elapsed_ms >= self.threshold_ms:
+            self.paths = self.write()
+        return False
+
+    def write(self):
+        """Write the profile and scrubbed snapshot. Returns the snapshot path."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, f"{self.now:%Y%m%d_%H%M%S}_{self.elapsed_ms:.0f}ms_{uuid.uuid4().hex[:6]}")
+        form, text = scrub(self.fd)
+        translations = {}
+        if self.tx is not None:
+            translations = {text(s): text(self.tx(s)) if text(s) != s else self.tx(s)
+                            for s in report_texts(self.fd, self.pdf_lang, self.city)}
+        snapshot = {"version": 1, "captured": self.now, "elapsed_ms": round(self.elapsed_ms, 1),
+                    "threshold_ms": self.threshold_ms, "phases": self.phases, "samples": len(self.sampler.samples),
+                    "interval_ms": self.sampler.interval * 1000, "pdf_lang": self.pdf_lang, "city": self.city,
+                    "pending_translations": len(self.pending), "translations": translations, "form_data": form}
+        with open(stem + ".folded", "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+        with open(stem + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(self.sampler.speedscope(), f, separators=(",", ":"))
+        with open(stem + ".json", "w", encoding="utf-8") as f:
+            f.write(records.dumps(snapshot))
+        return stem + ".json"
+
+
+class _Off:
+    """Stand-in when profiling is off: no sampling, nothing written."""
+    tx, pending, paths, phases = None, (), None, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mark(self, phase):
+        pass
+
+    def wrap(self, fn):
+        return fn
+
+
+def capture(fd, pdf_lang, city):
+    """A ``Capture`` when WEAR_TEST_PROFILE_MS is set, else a no-op with the same interface."""
+    return Capture(fd, pdf_lang, city) if PROFILE_MS > 0 else _Off()
+
+
+# ─── Replay ────────────────────────────────────────────────────────────────────
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return records.loads(f.read())
+
+
+def replay(snapshot, repeat=1, sampler=None, profile="compact"):
+    """
+    Render a snapshot ``repeat`` times on this thread through the headless
+    renderer, with the translations it was captured with. Returns
+    ``(pdf BytesIO, [ms per render], untranslated strings)``.
+    """
+    fd, lang, city = snapshot["form_data"], snapshot["pdf_lang"], snapshot["city"]
+    translations = snapshot.get("translations") or {}
+    missing = set()
+
+    def tx(s):
+        if s not in translations:
+            missing.add(s)
+        return translations.get(s, s)
+    tx = tx if lang == "zh" else None
+    if sampler:
+        sampler.add_thread()
+        sampler.start()
+    times = []
+    try:
+        for _ in range(repeat):
+            t0  = time.perf_counter()
+            pdf = render_report(fd, lang, city, tx, snapshot.get("captured"), profile)
+            times.append((time.perf_counter() - t0) * 1000)
+    finally:
+        if sampler:
+            sampler.stop()
+    return pdf, times, missing
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap  = argparse.ArgumentParser(description="Profiles of slow report generations.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ls  = sub.add_parser("list", help="captured snapshots, slowest first")
+    ls.add_argument("--dir", default=PROFILE_DIR)
+    rp  = sub.add_parser("replay", help="render a captured snapshot again")
+    rp.add_argument("snapshot")
+    rp.add_argument("--repeat", type=int, default=3)
+    rp.add_argument("--profile", action="store_true",
+                    help="sample the replay; writes <snapshot>.replay.folded / .replay.speedscope.json")
+    rp.add_argument("-o", "--out", help="also write the PDF")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        rows = []
+        for name in os.listdir(args.dir) if os.path.isdir(args.dir) else ():
+            if name.endswith(".json") and not name.endswith(".speedscope.json"):
+                s = load(os.path.join(args.dir, name))
+                fd = s["form_data"]
+                rows.append((s["elapsed_ms"], name, s["pdf_lang"], len(fd.get('testers') or ()),
+                             len(fd.get('description') or ''), s.get("phases", {})))
+        for ms, name, lang, testers, desc, phases in sorted(rows, reverse=True):
+            print(f"{ms:>9,.0f} ms  {lang}  {testers:>3} testers  {desc:>6,} desc chars  "
+                  f"{' '.join(f'{k}={v:,.0f}' for k, v in phases.items()):<24} {name}")
+        return
+
+    snap    = load(args.snapshot)
+    sampler = Sampler() if args.profile else None
+    pdf, times, missing = replay(snap, args.repeat, sampler)
+    print(f"captured {snap['elapsed_ms']:,.0f} ms ({', '.join(f'{k} {v:,.0f}' for k, v in snap.get('phases', {}).items())}); "
+          f"replay render p50 {statistics.median(times):,.0f} ms, min {min(times):,.0f} ms over {len(times)}, "
+          f"{pdf.getbuffer().nbytes:,} bytes")
+    if missing:
+        print(f"{len(missing)} strings had no captured translation and rendered as is", file=sys.stderr)
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(pdf.getvalue())
+    if sampler:
+        stem = args.snapshot[:-len(".json")] + ".replay"
+        with open(stem + ".folded", "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+        with open(stem + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(sampler.speedscope("replay"), f, separators=(",", ":"))
+        print(f"\n{'self':>6} {'total':>6}  frame   ({len(sampler.samples)} samples)")
+        for label, own, total in sampler.top():
+            print(f"{own:>6} {total:>6}  {label}")
+
+
+if __name__ == "__main__":
+    main()
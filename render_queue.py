@@ -0,0 +1,369 @@
+"""
+Render PDFs on worker processes through a work queue.
+
+The app (or any client) puts a render job on a broker and waits for the
+PDF; stateless workers, on this machine or any other that can reach the
+broker and the PDF store, claim jobs, render and write the PDF to shared
+storage:
+
+    client --submit--> broker --claim--> worker --put--> store --get--> client
+
+A job carries everything a render needs -- the form in ``form_codec``'s
+binary encoding, language, city, generation time and the translations
+the client resolved -- so workers need no session state or API key.
+
+``Broker`` is the interface a queue backend implements; ``SQLiteBroker``
+is the local / test backend (one file, safe across processes). Claims are
+leases: a job whose worker dies is handed out again once its lease runs
+out, up to ``MAX_ATTEMPTS`` times. ``FileStore`` is shared storage on a
+(local or network) filesystem. The client deletes a PDF once it has read
+it; workers purge jobs finished more than ``JOB_TTL`` seconds ago.
+
+    python render_queue.py worker                       # one worker, runs until stopped
+    python render_queue.py purge --ttl 3600
+    python render_queue.py bench --workers 1,2,4 --jobs 200
+"""
+from datetime import datetime
+import abc
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+import form_codec
+from pdf_report import render_report, report_texts
+from scheduler import BATCH, INTERACTIVE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUEUE_URL = os.getenv("WEAR_TEST_RENDER_QUEUE")            # unset: the app renders in-process
+PDF_STORE = os.getenv("WEAR_TEST_PDF_STORE", os.path.join(HERE, "data", "pdfs"))
+
+MAX_ATTEMPTS = 3
+JOB_TTL      = float(os.getenv("WEAR_TEST_RENDER_JOB_TTL", "3600"))   # seconds a finished job is kept
+PURGE_EVERY  = 60.0
+
+
+# ─── Brokers ───────────────────────────────────────────────────────────────────
+class Broker(abc.ABC):
+    """
+    What a queue backend provides. ``params`` is a dict, ``form`` bytes.
+    ``complete`` and ``fail`` only apply while ``worker`` still holds the
+    job's lease, so a worker that lost it cannot overwrite the outcome.
+    """
+
+    @abc.abstractmethod
+    def put(self, job_id, params, form, priority=INTERACTIVE):
+        ...
+
+    @abc.abstractmethod
+    def claim(self, worker, lease=60.0):
+        """Lease the next job: ``(job_id, params, form)``, or None if nothing is ready."""
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker, result_key):
+        """Mark the job done; False if ``worker`` no longer holds it."""
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker, error):
+        """Mark the job failed; False if ``worker`` no longer holds it."""
+
+    @abc.abstractmethod
+    def status(self, job_id):
+        """``{"state": queued|running|done|failed, "result": key, "error": str}`` or None."""
+
+    @abc.abstractmethod
+    def counts(self):
+        """``{state: number of jobs}``"""
+
+    @abc.abstractmethod
+    def purge(self, before):
+        """Delete jobs finished before ``before`` (epoch seconds); returns their result keys."""
+
+
+class SQLiteBroker(Broker):
+    """Job table in one SQLite file; claims are single UPDATE ... RETURNING statements."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                id          TEXT PRIMARY KEY,
+                                priority    INTEGER NOT NULL,
+                                state       TEXT NOT NULL,
+                                params      TEXT NOT NULL,
+                                form        BLOB NOT NULL,
+                                attempts    INTEGER NOT NULL DEFAULT 0,
+                                worker      TEXT,
+                                lease_until REAL,
+                                result      TEXT,
+                                error       TEXT,
+                                created     REAL NOT NULL,
+                                finished    REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def put(self, job_id, params, form, priority=INTERACTIVE):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, priority, state, params, form, created) "
+                         "VALUES (?, ?, 'queued', ?, ?, ?)",
+                         (job_id, priority, json.dumps(params, ensure_ascii=False), form, time.time()))
+
+    def claim(self, worker, lease=60.0):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""UPDATE jobs SET state = 'failed', error = 'worker lost too many times', finished = ?
+                            WHERE state = 'running' AND lease_until < ? AND attempts >= ?""",
+                         (now, now, MAX_ATTEMPTS))
+            row = conn.execute(
+                """UPDATE jobs SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1
+                   WHERE id = (SELECT id FROM jobs
+                               WHERE state = 'queued' OR (state = 'running' AND lease_until < ?)
+                               ORDER BY priority, created LIMIT 1)
+                   RETURNING id, params, form""", (worker, now + lease, now)).fetchone()
+        return (row[0], json.loads(row[1]), row[2]) if row else None
+
+    def complete(self, job_id, worker, result_key):
+        with self._connect() as conn:
+            return conn.execute("UPDATE jobs SET state = 'done', result = ?, finished = ?, form = x'' "
+                                "WHERE id = ? AND worker = ? AND state = 'running'",
+                                (result_key, time.time(), job_id, worker)).rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        with self._connect() as conn:
+            return conn.execute("UPDATE jobs SET state = 'failed', error = ?, finished = ? "
+                                "WHERE id = ? AND worker = ? AND state = 'running'",
+                                (error, time.time(), job_id, worker)).rowcount == 1
+
+    def status(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT state, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(("state", "result", "error"), row)) if row else None
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def purge(self, before):
+        with self._connect() as conn:
+            rows = conn.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') AND finished < ? "
+                                "RETURNING result", (before,)).fetchall()
+        return [r[0] for r in rows if r[0]]
+
+
+BROKERS = {"sqlite": SQLiteBroker}
+
+
+def open_broker(url):
+    """``sqlite:PATH`` (or a bare path) -> broker. Other schemes register in ``BROKERS``."""
+    scheme, sep, rest = url.partition(":")
+    if sep and scheme in BROKERS:
+        return BROKERS[scheme](rest[2:] if rest.startswith("//") else rest)
+    return SQLiteBroker(url)
+
+
+# ─── Shared storage ────────────────────────────────────────────────────────────
+class FileStore:
+    """PDFs as files under ``root``; any directory every worker and client can see."""
+
+    def __init__(self, root=None):
+        self.root = root or PDF_STORE
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, key, data):
+        path = os.path.join(self.root, key)
+        tmp  = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)           # readers never see half a file
+        return key
+
+    def get(self, key):
+        with open(os.path.join(self.root, key), "rb") as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+
+# ─── Client side ───────────────────────────────────────────────────────────────
+def submit(broker, fd, pdf_lang="en", city="Shanghai", tx=None, now=None,
+           profile="compact", priority=INTERACTIVE):
+    """Queue a render of ``fd``; ``tx`` is applied here, so workers get plain strings. Returns the job id."""
+    translations = {t: tx(t) for t in report_texts(fd, pdf_lang, city)} if tx else {}
+    params = {"pdf_lang": pdf_lang, "city": city, "profile": profile,
+              "now": now.isoformat() if now else None, "translations": translations}
+    job_id = uuid.uuid4().hex
+    broker.put(job_id, params, form_codec.encode(fd), priority)
+    return job_id
+
+
+def result(broker, store, job_id, timeout=60.0, poll=0.05):
+    """Wait for ``job_id`` and return its PDF as a BytesIO positioned at 0; the stored copy is deleted."""
+    end = time.monotonic() + timeout
+    while True:
+        st = broker.status(job_id)
+        if st is None:
+            raise KeyError(f"no render job {job_id}")
+        if st["state"] == "done":
+            pdf = store.get(st["result"])
+            store.delete(st["result"])          # the job row itself goes at the next purge
+            return io.BytesIO(pdf)
+        if st["state"] == "failed":
+            raise RuntimeError(f"render job failed: {st['error']}")
+        if time.monotonic() >= end:
+            raise TimeoutError(f"render job {job_id} still {st['state']} after {timeout:.0f}s")
+        time.sleep(poll)
+
+
+def remote_renderer(broker, store, timeout=60.0, priority=INTERACTIVE):
+    """A callable with ``render_report``'s signature that renders on the workers instead."""
+    def render(fd, pdf_lang="en", city="Shanghai", tx=None, now=None, profile="compact"):
+        job_id = submit(broker, fd, pdf_lang, city, tx, now, profile, priority)
+        return result(broker, store, job_id, timeout)
+    return render
+
+
+# ─── Worker ────────────────────────────────────────────────────────────────────
+def run_job(params, form):
+    """Render one job's PDF bytes."""
+    fd    = form_codec.decode(form)
+    tr    = params["translations"]
+    now   = datetime.fromisoformat(params["now"]) if params["now"] else None
+    return render_report(fd, params["pdf_lang"], params["city"], tx=lambda t: tr.get(t, t),
+                         now=now, profile=params["profile"]).getvalue()
+
+
+def purge(broker, store, ttl=JOB_TTL):
+    """Delete jobs finished over ``ttl`` seconds ago and any PDF of theirs no client collected."""
+    keys = broker.purge(time.time() - ttl)
+    for key in keys:
+        store.delete(key)
+    return len(keys)
+
+
+def run_worker(broker, store, name=None, lease=60.0, drain=False, simulate_ms=None):
+    """
+    Claim and render jobs until stopped (or, with ``drain``, until the queue
+    is empty). ``simulate_ms`` replaces rendering with a fixed sleep, to
+    measure the queue alone. Purges old jobs every ``PURGE_EVERY`` seconds.
+    Returns the number of jobs handled.
+    """
+    name, done, idle = name or f"{socket.gethostname()}:{os.getpid()}", 0, 0.05
+    next_purge = time.monotonic()
+    while True:
+        if time.monotonic() >= next_purge:
+            purge(broker, store)
+            next_purge = time.monotonic() + PURGE_EVERY
+        job = broker.claim(name, lease)
+        if job is None:
+            if drain:
+                return done
+            time.sleep(idle)
+            idle = min(idle * 2, 1.0)          # back off while the queue is empty
+            continue
+        idle = 0.05
+        job_id, params, form = job
+        try:
+            if simulate_ms is not None:
+                time.sleep(simulate_ms / 1000)
+                pdf = b"%PDF-simulated"
+            else:
+                pdf = run_job(params, form)
+            # One file per attempt: a worker whose lease ran out removes only its own copy
+            key = store.put(f"{job_id}-{uuid.uuid4().hex[:8]}.pdf", pdf)
+            if not broker.complete(job_id, name, key):
+                store.delete(key)
+        except Exception as e:
+            broker.fail(job_id, name, f"{type(e).__name__}: {e}")
+        done += 1
+
+
+# ─── Local scale-out benchmark ─────────────────────────────────────────────────
+def _bench_worker(db, root, simulate_ms):
+    run_worker(SQLiteBroker(db), FileStore(root), drain=True, simulate_ms=simulate_ms)
+
+
+def drain(broker, store, workers, simulate_ms=None):
+    """Empty ``broker``'s queue with ``workers`` local processes; returns the wall time in seconds."""
+    t0    = time.perf_counter()
+    procs = [multiprocessing.Process(target=_bench_worker, args=(broker.path, store.root, simulate_ms))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return time.perf_counter() - t0
+
+
+def bench(levels, jobs, simulate_ms=None, protocol="standard"):
+    """Render ``jobs`` reports with each number of worker processes in ``levels``."""
+    import random
+    from loadtest import random_form_data
+    rng   = random.Random(0)
+    forms = [random_form_data(rng, protocol) for _ in range(min(jobs, 50))]
+    rows  = []
+    for n in levels:
+        tmp    = tempfile.mkdtemp(prefix="render-bench-")
+        broker = SQLiteBroker(os.path.join(tmp, "queue.db"))
+        store  = FileStore(os.path.join(tmp, "pdfs"))
+        for i in range(jobs):
+            submit(broker, forms[i % len(forms)], priority=BATCH)
+        wall   = drain(broker, store, n, simulate_ms)
+        counts = broker.counts()
+        rows.append({"workers": n, "jobs": counts.get("done", 0), "failed": counts.get("failed", 0),
+                     "seconds": wall, "jobs_per_s": counts.get("done", 0) / wall})
+        rows[-1]["speedup"] = rows[-1]["jobs_per_s"] / rows[0]["jobs_per_s"]
+        print(f"  {n:>3} workers  {rows[-1]['jobs']:>5} jobs  {wall:6.2f}s  "
+              f"{rows[-1]['jobs_per_s']:7.1f} jobs/s  x{rows[-1]['speedup']:.2f}", file=sys.stderr)
+    return rows
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap  = argparse.ArgumentParser(description="Render workers and queue tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="claim and render jobs until stopped")
+    w.add_argument("--queue", default=QUEUE_URL or os.path.join(HERE, "data", "queue.db"),
+                   help="broker URL (default: WEAR_TEST_RENDER_QUEUE or data/queue.db)")
+    w.add_argument("--store", default=PDF_STORE, help="PDF directory (default: WEAR_TEST_PDF_STORE)")
+    w.add_argument("--lease", type=float, default=60.0)
+    w.add_argument("--drain", action="store_true", help="exit once the queue is empty")
+    g = sub.add_parser("purge", help="delete finished jobs and uncollected PDFs")
+    g.add_argument("--queue", default=QUEUE_URL or os.path.join(HERE, "data", "queue.db"))
+    g.add_argument("--store", default=PDF_STORE)
+    g.add_argument("--ttl", type=float, default=JOB_TTL, help="age in seconds (default: WEAR_TEST_RENDER_JOB_TTL)")
+    b = sub.add_parser("bench", help="throughput with 1..N local worker processes")
+    b.add_argument("--workers", default="1,2,4")
+    b.add_argument("--jobs", type=int, default=200)
+    b.add_argument("--simulate-ms", type=float, help="fixed job time instead of rendering")
+    b.add_argument("--protocol", default="standard")
+    args = ap.parse_args(argv)
+    if args.cmd == "worker":
+        n = run_worker(open_broker(args.queue), FileStore(args.store), lease=args.lease, drain=args.drain)
+        print(f"rendered {n} jobs", file=sys.stderr)
+    elif args.cmd == "purge":
+        print(f"purged {purge(open_broker(args.queue), FileStore(args.store), args.ttl)} jobs", file=sys.stderr)
+    else:
+        print(f"cpus={os.cpu_count()}", file=sys.stderr)
+        bench([int(x) for x in args.workers.split(",")], args.jobs, args.simulate_ms, args.protocol)
+
+
+if __name__ == "__main__":
+    main()
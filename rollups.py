@@ -0,0 +1,217 @@
+"""
+Aggregate rollups of saved assessments.
+
+Three tables keyed by brand / factory / style / sample_type / month hold
+running totals, so dashboard questions ("mean Day 7 comfort for factory
+X") read a handful of group rows instead of every record:
+
+    rollup_counts    assessments per group
+    rollup_scores    per metric (comfort | appearance) and day: n, sum and
+                     a 1-5 histogram
+    rollup_answers   per extended-wear period and question: n and Yes count
+
+``RecordStore`` applies each record's contribution in the same transaction
+that writes the record (and subtracts the old one on edit), so the totals
+never drift from the table. ``rebuild`` recomputes them from scratch.
+"""
+from datetime import date
+import argparse
+import time
+
+from form_schema import PROTOCOLS, get_protocol
+
+DIMENSIONS = ('brand', 'factory', 'style', 'sample_type', 'month')
+METRICS    = {'comfort': 'comfort_scores', 'appearance': 'appearance_scores'}
+
+_DIMS = ", ".join(DIMENSIONS)
+_TABLES = {
+    "rollup_counts":  f"""CREATE TABLE rollup_counts (
+                              {', '.join(f'{d} TEXT NOT NULL' for d in DIMENSIONS)},
+                              n INTEGER NOT NULL,
+                              PRIMARY KEY ({_DIMS}))""",
+    "rollup_scores":  f"""CREATE TABLE rollup_scores (
+                              {', '.join(f'{d} TEXT NOT NULL' for d in DIMENSIONS)},
+                              metric TEXT NOT NULL, day TEXT NOT NULL,
+                              n INTEGER NOT NULL, total INTEGER NOT NULL,
+                              h1 INTEGER NOT NULL, h2 INTEGER NOT NULL, h3 INTEGER NOT NULL,
+                              h4 INTEGER NOT NULL, h5 INTEGER NOT NULL,
+                              PRIMARY KEY ({_DIMS}, metric, day))""",
+    "rollup_answers": f"""CREATE TABLE rollup_answers (
+                              {', '.join(f'{d} TEXT NOT NULL' for d in DIMENSIONS)},
+                              period TEXT NOT NULL, question TEXT NOT NULL,
+                              n INTEGER NOT NULL, yes INTEGER NOT NULL,
+                              PRIMARY KEY ({_DIMS}, period, question))""",
+}
+_COUNTERS = {"rollup_counts": ("n",),
+             "rollup_scores": ("n", "total", "h1", "h2", "h3", "h4", "h5"),
+             "rollup_answers": ("n", "yes")}
+_EXTRA    = {"rollup_counts": (), "rollup_scores": ("metric", "day"),
+             "rollup_answers": ("period", "question")}
+
+
+def ensure_tables(conn):
+    """Create missing rollup tables. True if any had to be created."""
+    have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    missing = [t for t in _TABLES if t not in have]
+    for t in missing:
+        conn.execute(_TABLES[t])
+    # brand leads the primary keys; factory and style lookups get their own
+    for d in ('factory', 'style'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS rollup_scores_{d} ON rollup_scores ({d}, metric, day)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS rollup_answers_{d} ON rollup_answers ({d})")
+    return bool(missing)
+
+
+# ─── Per-record contribution ───────────────────────────────────────────────────
+def record_month(fd, created):
+    prep = fd.get('prep_date')
+    # UTC, as parquet_export derives it
+    return prep.strftime("%Y-%m") if isinstance(prep, date) else time.strftime("%Y-%m", time.gmtime(created))
+
+
+def add(acc, fd, created, sign=1):
+    """Add (or with sign=-1, remove) one record's contribution to ``acc``."""
+    key   = tuple(str(fd.get(d) or '') for d in DIMENSIONS[:-1]) + (record_month(fd, created),)
+    proto = get_protocol(fd.get('protocol'))
+    counts, scores, answers = acc.setdefault("rollup_counts", {}), \
+        acc.setdefault("rollup_scores", {}), acc.setdefault("rollup_answers", {})
+    counts[key] = [counts.get(key, [0])[0] + sign]
+    for metric, field in METRICS.items():
+        vals = fd.get(field, {})
+        for day in proto['days_to_track']:
+            v = vals.get(day)
+            if not isinstance(v, int) or not 1 <= v <= 5:
+                continue
+            row = scores.setdefault(key + (metric, day), [0] * 7)
+            row[0] += sign
+            row[1] += sign * v
+            row[1 + v] += sign
+    ext = fd.get('extended_data', {})
+    for period in proto['time_periods']:
+        given = ext.get(period, {})
+        for q in proto['questions']:
+            if q in given:
+                row = answers.setdefault(key + (period, q), [0, 0])
+                row[0] += sign
+                row[1] += sign * (given[q] == "Yes")
+    return acc
+
+
+def apply(conn, acc):
+    """Upsert an accumulated delta into the rollup tables (caller owns the transaction)."""
+    for table, rows in acc.items():
+        cols, ctrs = DIMENSIONS + _EXTRA[table], _COUNTERS[table]
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(cols + ctrs)}) "
+            f"VALUES ({', '.join('?' * (len(cols) + len(ctrs)))}) "
+            f"ON CONFLICT DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in ctrs)}",
+            [k + tuple(v) for k, v in rows.items() if any(v)])
+    for table in _TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE n = 0")
+
+
+def rebuild(store, batch=2000):
+    """Recompute every rollup from the record table."""
+    from records import loads
+    with store._connect() as conn:
+        ensure_tables(conn)
+        for t in _TABLES:
+            conn.execute(f"DELETE FROM {t}")
+        last = 0
+        while rows := conn.execute(
+                "SELECT id, created, form_data FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                (last, batch)).fetchall():
+            acc = {}
+            for _, created, payload in rows:
+                add(acc, loads(payload), created)
+            apply(conn, acc)
+            last = rows[-1][0]
+
+
+# ─── Queries ───────────────────────────────────────────────────────────────────
+def _where(filters):
+    bad = set(filters) - set(DIMENSIONS)
+    if bad:
+        raise ValueError(f"unknown rollup dimension(s): {', '.join(sorted(bad))}")
+    clause = " AND ".join(f"{d} = ?" for d in filters)
+    return (f" WHERE {clause}" if clause else ""), list(filters.values())
+
+
+def assessment_count(store, **filters):
+    where, args = _where(filters)
+    with store._connect() as conn:
+        return conn.execute(f"SELECT COALESCE(SUM(n), 0) FROM rollup_counts{where}", args).fetchone()[0]
+
+
+def score_summary(store, metric="comfort", **filters):
+    """
+    ``{day: {"n", "mean", "hist": [count of 1s .. 5s]}}`` for ``metric`` over
+    every group matching ``filters`` (e.g. ``factory="X", month="2024-05"``).
+    """
+    where, args = _where(filters)
+    where = (where + " AND" if where else " WHERE") + " metric = ?"
+    with store._connect() as conn:
+        rows = conn.execute(
+            f"""SELECT day, SUM(n), SUM(total), SUM(h1), SUM(h2), SUM(h3), SUM(h4), SUM(h5)
+                FROM rollup_scores{where} GROUP BY day""", args + [metric]).fetchall()
+    order = {}
+    for p in PROTOCOLS.values():
+        for i, d in enumerate(p['days_to_track']):
+            order.setdefault(d, i)
+    rows.sort(key=lambda r: (order.get(r[0], len(order)), r[0]))
+    return {day: {"n": n, "mean": total / n if n else None, "hist": list(h)}
+            for day, n, total, *h in rows}
+
+
+def yes_counts(store, **filters):
+    """``{(period, question): (yes, n)}`` over every group matching ``filters``."""
+    where, args = _where(filters)
+    with store._connect() as conn:
+        rows = conn.execute(f"""SELECT period, question, SUM(yes), SUM(n)
+                                FROM rollup_answers{where} GROUP BY period, question""", args).fetchall()
+    return {(p, q): (yes, n) for p, q, yes, n in rows}
+
+
+def breakdown(store, by="factory", metric="comfort", day="Day 7", **filters):
+    """``[(value of by, n, mean)]`` for one metric/day, best mean first."""
+    if by not in DIMENSIONS:
+        raise ValueError(f"unknown rollup dimension: {by}")
+    where, args = _where(filters)
+    where = (where + " AND" if where else " WHERE") + " metric = ? AND day = ?"
+    with store._connect() as conn:
+        return conn.execute(
+            f"""SELECT {by}, SUM(n), CAST(SUM(total) AS REAL) / SUM(n) AS mean
+                FROM rollup_scores{where} GROUP BY {by} HAVING SUM(n) > 0 ORDER BY mean DESC""",
+            args + [metric, day]).fetchall()
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    from records import RecordStore
+    ap = argparse.ArgumentParser(description="Query or rebuild the assessment rollups.")
+    ap.add_argument("--db", help="record store path (default: WEAR_TEST_RECORDS_DB or data/records.db)")
+    ap.add_argument("--rebuild", action="store_true", help="recompute all rollups from the records")
+    ap.add_argument("--metric", choices=list(METRICS), default="comfort")
+    ap.add_argument("--by", choices=DIMENSIONS, help="break one day's mean down by this dimension")
+    ap.add_argument("--day", default="Day 7")
+    for d in DIMENSIONS:
+        ap.add_argument(f"--{d.replace('_', '-')}", dest=d, help=f"filter on {d}")
+    args = ap.parse_args(argv)
+    store   = RecordStore(args.db)
+    filters = {d: getattr(args, d) for d in DIMENSIONS if getattr(args, d) is not None}
+    if args.rebuild:
+        t0 = time.perf_counter()
+        rebuild(store)
+        print(f"rebuilt rollups in {time.perf_counter() - t0:.1f}s")
+    print(f"{assessment_count(store, **filters):,} assessments")
+    if args.by:
+        for value, n, mean in breakdown(store, args.by, args.metric, args.day, **filters):
+            print(f"  {value or '(blank)':<30} n={n:<8,} mean={mean:.2f}")
+        return
+    for day, s in score_summary(store, args.metric, **filters).items():
+        mean = f"{s['mean']:.2f}" if s['mean'] is not None else "-"
+        print(f"  {day:<10} n={s['n']:<8,} mean={mean}  hist={s['hist']}")
+
+
+if __name__ == "__main__":
+    main()
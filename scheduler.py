@@ -0,0 +1,191 @@
+"""
+Priority scheduler for render and translation work.
+
+Jobs come in three classes, always served in this order:
+
+    INTERACTIVE   a tester pressed Generate and is watching a spinner
+    API           programmatic callers
+    BATCH         bulk / month-end renders
+
+Within a class, users take turns (round robin over each user's queue), so
+one user's thousand-report batch does not hold up another user's ten.
+
+Each class has a bounded queue and a per-user cap. ``submit`` either
+blocks until there is room (backpressure, the default for BATCH) or
+raises ``Overloaded`` straight away (admission control, the default for
+the others). A job is also refused when the work already queued ahead of
+it would keep it waiting longer than the class's ``max_wait``.
+
+A running job cannot be pre-empted, so BATCH is limited to
+``batch_slots`` workers at a time and only starts once no interactive or
+API job has been queued or running for ``batch_idle`` seconds; an
+interactive job waits for at most the batch jobs already started.
+Steady interactive traffic therefore holds the batch back entirely.
+
+``metrics()`` reports, per class: queue depth, running, submitted,
+rejected and completed counts, and queue-wait p50/p95/max over the
+recent jobs.
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import os
+import threading
+import time
+
+INTERACTIVE, API, BATCH = 0, 1, 2
+CLASSES = ("interactive", "api", "batch")
+
+RENDER_WORKERS = int(os.getenv("WEAR_TEST_RENDER_WORKERS", "4"))
+
+
+class Overloaded(RuntimeError):
+    """The scheduler refused a job; retry later."""
+
+
+def _pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round((len(values) - 1) * p / 100)))]
+
+
+class Scheduler:
+    """Worker threads fed from per-class, per-user queues."""
+
+    def __init__(self, workers=RENDER_WORKERS, depth=(32, 256, 10_000), per_user=(2, 16, None),
+                 max_wait=(30.0, 120.0, None), batch_slots=1, batch_idle=0.25, name="sched"):
+        self.workers, self.depth, self.per_user = workers, depth, per_user
+        self.max_wait, self.batch_slots = max_wait, max(1, min(batch_slots, workers))
+        self.batch_idle = batch_idle
+        self._last_fg = 0.0                                 # last time interactive/API work was seen
+        self._queues  = [OrderedDict() for _ in CLASSES]   # user -> deque of jobs
+        self._size    = [0] * len(CLASSES)
+        self._running = [0] * len(CLASSES)
+        self._cond    = threading.Condition()
+        self._closed  = False
+        self._waits   = [deque(maxlen=2000) for _ in CLASSES]
+        self._service = [deque(maxlen=200) for _ in CLASSES]
+        self._counts  = [{"submitted": 0, "rejected": 0, "completed": 0, "failed": 0} for _ in CLASSES]
+        self._threads = [threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for th in self._threads:
+            th.start()
+
+    # ─── Submission ────────────────────────────────────────────────────────────
+    def _refusal(self, cls, user):
+        """Why a job of ``cls`` from ``user`` can't be queued right now, or None."""
+        if self._size[cls] >= self.depth[cls]:
+            return f"{CLASSES[cls]} queue is full ({self.depth[cls]})"
+        cap, mine = self.per_user[cls], self._queues[cls].get(user)
+        if cap is not None and mine is not None and len(mine) >= cap:
+            return f"{CLASSES[cls]} limit of {cap} queued jobs per user reached"
+        limit = self.max_wait[cls]
+        if limit is not None:
+            # Work queued ahead, each class at its own recent service time
+            ahead = sum(self._size[c] * sum(s) / len(s) for c, s in enumerate(self._service[:cls + 1]) if s)
+            if ahead / self.workers > limit:
+                return f"{CLASSES[cls]} backlog would exceed {limit:.0f}s"
+        return None
+
+    def submit(self, fn, *args, priority=INTERACTIVE, user="", block=None, timeout=None):
+        """
+        Queue ``fn(*args)``; returns a Future. ``block`` (default: True for
+        BATCH only) waits up to ``timeout`` for room instead of raising
+        ``Overloaded``.
+        """
+        block = priority == BATCH if block is None else block
+        fut   = Future()
+        with self._cond:
+            end = None if timeout is None else time.monotonic() + timeout
+            while True:
+                if self._closed:
+                    raise RuntimeError("scheduler is shut down")
+                why = self._refusal(priority, user)
+                if why is None:
+                    break
+                left = None if end is None else end - time.monotonic()
+                if not block or (left is not None and left <= 0):
+                    self._counts[priority]["rejected"] += 1
+                    raise Overloaded(why)
+                self._cond.wait(left)
+            self._queues[priority].setdefault(user, deque()).append((fn, args, fut, time.monotonic()))
+            self._size[priority] += 1
+            self._counts[priority]["submitted"] += 1
+            if priority != BATCH:
+                self._last_fg = time.monotonic()
+            self._cond.notify_all()
+        return fut
+
+    # ─── Workers ───────────────────────────────────────────────────────────────
+    def _take(self):
+        """Next job by class, then user round robin; None if nothing may start."""
+        for cls, users in enumerate(self._queues):
+            if not users:
+                continue
+            # earlier classes are empty here; batch also waits out their running jobs
+            if cls == BATCH and (self._running[BATCH] >= self.batch_slots
+                                 or self._running[INTERACTIVE] or self._running[API]
+                                 or time.monotonic() - self._last_fg < self.batch_idle):
+                return None
+            user, jobs = next(iter(users.items()))
+            job = jobs.popleft()
+            if jobs:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            self._size[cls] -= 1
+            self._running[cls] += 1
+            return cls, job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while (picked := self._take()) is None:
+                    if self._closed and not any(self._size):
+                        return
+                    # queued batch work may become startable when the idle window passes
+                    self._cond.wait(self.batch_idle if self._size[BATCH] else None)
+                self._cond.notify_all()          # room freed for blocked submitters
+            cls, (fn, args, fut, queued) = picked
+            start = time.monotonic()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(fn(*args))
+                    outcome = "completed"
+                except BaseException as e:
+                    fut.set_exception(e)
+                    outcome = "failed"
+            else:
+                outcome = "failed"
+            with self._cond:
+                self._running[cls] -= 1
+                if cls != BATCH:
+                    self._last_fg = time.monotonic()
+                self._waits[cls].append(start - queued)
+                self._service[cls].append(time.monotonic() - start)
+                self._counts[cls][outcome] += 1
+                self._cond.notify_all()
+
+    # ─── Metrics / lifecycle ───────────────────────────────────────────────────
+    def metrics(self):
+        """Per-class counters and queue-wait percentiles (ms) over recent jobs."""
+        with self._cond:
+            out = {}
+            for cls, label in enumerate(CLASSES):
+                waits = [w * 1000 for w in self._waits[cls]]
+                runs  = self._service[cls]
+                out[label] = dict(self._counts[cls], depth=self._size[cls], running=self._running[cls],
+                                  wait_p50_ms=_pct(waits, 50), wait_p95_ms=_pct(waits, 95),
+                                  wait_max_ms=max(waits) if waits else None,
+                                  run_mean_ms=sum(runs) / len(runs) * 1000 if runs else None)
+            return out
+
+    def shutdown(self, wait=True):
+        """Stop taking jobs; queued jobs still run."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for th in self._threads:
+                th.join()
@@ -0,0 +1,95 @@
+"""
+Per-tester comfort and appearance scores for multi-person panels.
+
+``form_data['tester_scores']`` holds one list per tester and kind, one
+entry per protocol day, 0 where the tester has not scored that day:
+
+    {"comfort":    {"Tester A": [4, 3, 0, ...], "Tester B": [...]},
+     "appearance": {...}}
+
+``score_matrix`` turns that into a dense (tester × day) uint8 array in
+``fd['testers']`` order, and ``panel_stats`` reduces it along both axes
+with whole-array numpy operations -- no per-cell Python. The per-day panel
+means are what the single-value ``comfort_scores``/``appearance_scores``
+fields carry once ``sync_day_scores`` has run, so records, spreadsheets
+and everything else reading those fields see the panel result.
+"""
+import numpy as np
+
+KINDS      = ("comfort", "appearance")
+DAY_FIELDS = {"comfort": "comfort_scores", "appearance": "appearance_scores"}
+MAX_SCORE  = 5
+
+
+def is_panel(fd):
+    """True when more than one tester is listed and at least one of them has scores."""
+    testers = fd.get('testers') or ()
+    scores  = fd.get('tester_scores') or {}
+    return len(testers) > 1 and any(any(rows.get(name) or ()) for rows in scores.values() for name in testers)
+
+
+def score_matrix(fd, kind, days):
+    """(len(testers), len(days)) uint8 array; 0 = not scored."""
+    testers = fd.get('testers') or []
+    rows    = ((fd.get('tester_scores') or {}).get(kind)) or {}
+    m = np.zeros((len(testers), len(days)), dtype=np.uint8)
+    for i, name in enumerate(testers):
+        row = rows.get(name)
+        if row:
+            row = row[:len(days)]
+            m[i, :len(row)] = np.clip(np.asarray(row, dtype=np.int64), 0, MAX_SCORE)
+    return m
+
+
+def set_scores(fd, kind, matrix):
+    """Store ``matrix`` (tester × day, 0 = not scored) back into ``fd``, one fresh list per tester."""
+    m    = np.clip(np.nan_to_num(np.asarray(matrix, dtype=np.float64)), 0, MAX_SCORE).round().astype(np.uint8)
+    rows = fd.setdefault('tester_scores', {}).setdefault(kind, {})
+    for name, row in zip(fd.get('testers') or [], m.tolist()):
+        rows[name] = row
+
+
+def panel_stats(m):
+    """
+    Reductions of a score matrix, gaps ignored:
+
+        day_mean, day_min, day_max, day_spread, day_n   shape (days,)
+        tester_mean                                     shape (testers,)
+        mean                                            scalar
+
+    Means are NaN and min/max/spread 0 where nothing was scored.
+    """
+    m      = np.asarray(m, dtype=np.uint8)
+    scored = m > 0
+    day_n  = scored.sum(axis=0)
+    t_n    = scored.sum(axis=1)
+    day_max = m.max(axis=0, initial=0)
+    day_min = np.where(scored, m, MAX_SCORE + 1).min(axis=0, initial=MAX_SCORE + 1)
+    day_min = np.where(day_n > 0, day_min, 0)
+    total   = scored.sum()
+    return {
+        "day_mean":    np.divide(m.sum(axis=0), day_n, out=np.full(day_n.shape, np.nan), where=day_n > 0),
+        "day_min":     day_min,
+        "day_max":     day_max,
+        "day_spread":  day_max - day_min,
+        "day_n":       day_n,
+        "tester_mean": np.divide(m.sum(axis=1), t_n, out=np.full(t_n.shape, np.nan), where=t_n > 0),
+        "mean":        float(m.sum() / total) if total else float("nan"),
+    }
+
+
+def day_scores(fd, kind, days):
+    """Per-day single values: panel means rounded half up where scored, else the form's own value."""
+    own = fd.get(DAY_FIELDS[kind], {})
+    if not is_panel(fd):
+        return [own.get(d, 3) for d in days]
+    mean = panel_stats(score_matrix(fd, kind, days))["day_mean"]
+    return [int(np.floor(v + 0.5)) if v == v else own.get(d, 3) for d, v in zip(days, mean.tolist())]
+
+
+def sync_day_scores(fd, days):
+    """Write the panel's per-day means into ``comfort_scores``/``appearance_scores``."""
+    if is_panel(fd):
+        for kind in KINDS:
+            fd.setdefault(DAY_FIELDS[kind], {}).update(zip(days, day_scores(fd, kind, days)))
+    return fd
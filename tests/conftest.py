@@ -0,0 +1,23 @@
+"""
+Shared fixtures. Modules live flat at the repository root; every store
+is pointed into the test's tmp_path, never data/.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest import random_form_data  # noqa: E402
+
+
+@pytest.fixture
+def forms():
+    """``forms(n, seed=1, protocol="standard")`` -> n random filled-in assessments."""
+    def make(n, seed=1, protocol="standard"):
+        rng = random.Random(seed)
+        return [random_form_data(rng, protocol) for _ in range(n)]
+    return make
@@ -0,0 +1,73 @@
+import copy
+import random
+from datetime import date
+
+import pytest
+
+from autosave import DraftStore, diff, flatten, new_draft_id, unflatten
+
+
+def _rows(store, draft_id):
+    with store._connect() as conn:
+        return conn.execute("SELECT kind FROM draft_log WHERE draft_id = ? ORDER BY seq",
+                            (draft_id,)).fetchall()
+
+
+def _edit(fd, rng, i):
+    day = rng.choice(list(fd['comfort_scores']))
+    fd['comfort_scores'][day] = rng.randint(1, 5)
+    fd['issues'][day] = f"edit {i}"
+    fd['testers'] = rng.sample(fd['testers'] or ["A"], k=1)
+    if i % 7 == 0:
+        fd.pop('color', None)
+    elif i % 7 == 1:
+        fd['color'] = f"colour {i}"
+
+
+def test_flatten_and_diff(forms):
+    fd = forms(1)[0]
+    fd['prep_date'] = date(2024, 5, 1)
+    flat = flatten(fd)
+    assert unflatten(flat) == fd
+    new = copy.deepcopy(fd)
+    day = next(iter(new['issues']))
+    new['issues'][day] = "new issue"
+    del new['color']
+    changed, removed = diff(flat, flatten(new))
+    assert changed == {('issues', day): "new issue"}
+    assert removed == [('color',)]
+
+
+def test_submits_within_the_debounce_window_write_one_row(tmp_path, forms):
+    store, draft_id = DraftStore(str(tmp_path / "d.db"), debounce=60), new_draft_id()
+    fd, flat, rng = forms(1)[0], None, random.Random(0)
+    for i in range(10):
+        _edit(fd, rng, i)
+        flat = store.submit(draft_id, fd, flat)
+    assert store.restore(draft_id) == fd                        # restore flushes
+    assert len(_rows(store, draft_id)) == 1
+
+
+@pytest.mark.parametrize("compact_every", [3, 50])
+def test_restore_after_many_edits_and_compaction(tmp_path, forms, compact_every):
+    path, draft_id = str(tmp_path / "d.db"), new_draft_id()
+    store = DraftStore(path, debounce=0, compact_every=compact_every)
+    fd, flat, rng = forms(1)[0], None, random.Random(1)
+    fd['prep_date'] = date(2024, 5, 1)
+    for i in range(40):
+        _edit(fd, rng, i)
+        flat = store.submit(draft_id, fd, flat)
+        store.flush()
+    rows = _rows(store, draft_id)
+    assert len(rows) < compact_every
+    assert ("snapshot",) in rows if compact_every <= 40 else ("snapshot",) not in rows
+    assert DraftStore(path).restore(draft_id) == fd             # a fresh process sees the same draft
+    assert DraftStore(path).restore(new_draft_id()) is None
+
+
+def test_discard(tmp_path, forms):
+    store, draft_id = DraftStore(str(tmp_path / "d.db"), debounce=0), new_draft_id()
+    store.submit(draft_id, forms(1)[0])
+    store.link_record(draft_id, 7, "PO1", "ST1")
+    store.discard(draft_id)
+    assert store.restore(draft_id) is None and store.linked_record(draft_id) is None
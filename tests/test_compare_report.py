@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from compare_report import FEEL_LEVEL, FIT_FIELDS, align, diff, render_comparison
+from pdf_report import FIT_DEFAULTS
+from tester_scores import KINDS, day_scores
+
+
+@pytest.fixture
+def mixed(forms):
+    """Baseline on the standard protocol, then long-term and standard samples."""
+    a, c = forms(2, seed=21)
+    b, = forms(1, seed=22, protocol="long_term")
+    return [a, b, c]
+
+
+def _fit(fd, k):
+    v = fd.get(k)
+    if v in FEEL_LEVEL:
+        return FEEL_LEVEL[v]
+    return -1 if v not in ("Yes", "No") else 2 if v == FIT_DEFAULTS[k] else 0
+
+
+def test_align_puts_mixed_protocols_on_shared_axes(mixed):
+    from form_schema import get_protocol
+    al = align(mixed)
+    assert al["periods"][:6] == get_protocol("standard")["time_periods"]
+    assert set(al["days"]) == {d for fd in mixed for d in get_protocol(fd["protocol"])["days_to_track"]}
+    for i, fd in enumerate(mixed):
+        proto = get_protocol(fd["protocol"])
+        assert al["fit"][i].tolist() == [_fit(fd, k) for k in FIT_FIELDS]
+        for pi, p in enumerate(al["periods"]):
+            for qi, q in enumerate(al["questions"]):
+                want = (fd["extended_data"][p].get(q) == "Yes"
+                        if p in proto["time_periods"] and q in proto["questions"] else -1)
+                assert al["ext"][i, pi, qi] == want
+        for k, kind in enumerate(KINDS):
+            own = dict(zip(proto["days_to_track"], day_scores(fd, kind, proto["days_to_track"])))
+            for di, d in enumerate(al["days"]):
+                v = al["scores"][i, k, di]
+                assert (v == own[d]) if d in own else math.isnan(v)
+
+
+def test_diff_against_the_baseline(mixed):
+    al = align(mixed)
+    dd = diff(al)
+    fit, ext, sc = al["fit"], al["ext"], al["scores"]
+    assert not dd["fit_worse"][0].any() and not dd["ext_new"][0].any()
+    for i in range(len(mixed)):
+        for j in range(fit.shape[1]):
+            both = fit[i, j] >= 0 and fit[0, j] >= 0
+            assert dd["fit_worse"][i, j] == (both and fit[i, j] < fit[0, j])
+            assert dd["fit_better"][i, j] == (both and fit[i, j] > fit[0, j])
+        assert dd["ext_new"][i].sum() == ((ext[i] == 1) & (ext[0] == 0)).sum()
+        assert dd["ext_gone"][i].sum() == ((ext[i] == 0) & (ext[0] == 1)).sum()
+        assert dd["issues"][i] == (ext[i] == 1).sum()
+        cells = [(k, d) for k in range(sc.shape[1]) for d in range(sc.shape[2])]
+        worse = sum(1 for k, d in cells if sc[i, k, d] - sc[0, k, d] <= -1)
+        assert dd["score_worse"][i].sum() == worse
+        assert dd["regressions"][i].tolist() == [dd["fit_worse"][i].sum(), dd["ext_new"][i].sum(), worse]
+        assert dd["score_mean"][i].tolist() == pytest.approx([np.mean(row[~np.isnan(row)]) for row in sc[i]])
+    # Long-term days the baseline never tracked compare as neither worse nor better
+    only_b = [d for d, day in enumerate(al["days"]) if day.startswith("Week")]
+    assert not dd["score_worse"][1][:, only_b].any() and not dd["score_better"][1][:, only_b].any()
+
+
+@pytest.mark.parametrize("lang", ["en", "zh"])
+def test_render_comparison(mixed, lang):
+    pdf = render_comparison(mixed, lang).getvalue()
+    assert pdf.startswith(b"%PDF") and b"/Type /Page" in pdf
+    with pytest.raises(ValueError):
+        render_comparison(mixed[:1], lang)
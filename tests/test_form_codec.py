@@ -0,0 +1,66 @@
+import copy
+from datetime import date
+
+import numpy as np
+import pytest
+
+import form_codec
+import form_schema
+from form_schema import default_form_data
+
+
+@pytest.mark.parametrize("protocol", ["standard", "long_term"])
+def test_round_trip(forms, protocol):
+    for fd in forms(30, seed=3, protocol=protocol) + [default_form_data(protocol)]:
+        blob = form_codec.encode(fd)
+        out  = form_codec.decode(blob)
+        assert out == fd and list(out) == list(fd)
+
+
+@pytest.mark.parametrize("edit", [
+    lambda fd: fd['comfort_scores'].update({next(iter(fd['comfort_scores'])): 6}),
+    lambda fd: fd['appearance_scores'].update({next(iter(fd['appearance_scores'])): "3"}),
+    lambda fd: fd['comfort_scores'].popitem(),
+    lambda fd: fd.update(sample_type="Salesman Sample"),
+    lambda fd: fd.update(fit_sizes=list(reversed(form_schema.FIT_SIZES[:2]))),
+    lambda fd: fd.update(description="line\x00break"),
+    lambda fd: fd.update(prep_date=None),
+    lambda fd: fd.update(extra_field={"nested": [1, 2]}),
+    lambda fd: fd.pop('approved_by'),
+    lambda fd: next(iter(fd['extended_data'].values())).popitem(),
+    lambda fd: fd['issues'].update({next(iter(fd['issues'])): "seam\x00split"}),
+], ids=["score-range", "score-type", "missing-day", "enum", "mask-order", "nul-text",
+        "no-date", "extra-key", "missing-key", "partial-grid", "nul-issue"])
+def test_off_fast_path_values_survive(forms, edit):
+    fd = forms(1, seed=5)[0]
+    edit(fd)
+    assert form_codec.decode(form_codec.encode(fd)) == fd
+
+
+def test_score_vectors_and_digest(forms):
+    a, b = forms(2, seed=7)
+    days, comfort, appearance = form_codec.score_vectors(form_codec.encode(a))
+    assert list(days) == list(a['comfort_scores'])
+    assert np.array_equal(comfort, list(a['comfort_scores'].values()))
+    assert np.array_equal(appearance, list(a['appearance_scores'].values()))
+    assert form_codec.digest(a) == form_codec.digest(copy.deepcopy(a)) != form_codec.digest(b)
+
+
+def test_rejects_foreign_and_stale_blobs(forms, monkeypatch):
+    fd   = forms(1)[0]
+    blob = form_codec.encode(fd)
+    with pytest.raises(ValueError, match="not an encoded form"):
+        form_codec.decode(b"XX" + blob[2:])
+    with pytest.raises(ValueError, match="version"):
+        form_codec.decode(blob[:2] + bytes([form_codec.VERSION + 1]) + blob[3:])
+    changed = copy.deepcopy(form_schema.PROTOCOLS)
+    changed["standard"]["days_to_track"] = changed["standard"]["days_to_track"][:-1]
+    monkeypatch.setattr(form_schema, "PROTOCOLS", changed)
+    with pytest.raises(ValueError, match="has changed"):
+        form_codec.decode(blob)
+
+
+def test_prep_date_is_a_date(forms):
+    fd = forms(1)[0]
+    fd['prep_date'] = date(2024, 2, 29)
+    assert form_codec.decode(form_codec.encode(fd))['prep_date'] == date(2024, 2, 29)
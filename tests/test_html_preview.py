@@ -0,0 +1,67 @@
+import re
+from datetime import datetime
+from html import unescape
+
+import pytest
+
+import pdf_report
+from html_preview import PreviewCache, render_preview
+
+NOW = datetime(2024, 1, 1)
+CHROME = re.compile(r"GRAND STEP \(H\.K\.\) LTD|WEAR TEST ASSESSMENT REPORT|Location: .*|Generated: .*|Page \d+ of \d+")
+
+
+def tx(text):
+    return f"[{text}]"
+
+
+def _pdf_lines(fd, monkeypatch):
+    """Text lines drawn on the PDF's pages (en, Helvetica), without the page frame or cover title."""
+    monkeypatch.setitem(pdf_report.OUTPUT_PROFILES, "uncompressed",
+                        {"compress": False, "invariant": True, "dedupe": False})
+    pdf = pdf_report.render_report(fd, "en", tx=tx, now=NOW, profile="uncompressed").getvalue()
+    lines = [re.sub(rb"\\(.)", rb"\1", s).decode("latin-1")
+             for body in re.findall(rb"stream\r?\n(.*?)endstream", pdf, re.S)
+             for s in re.findall(rb"\(((?:\\.|[^\\)])*)\)\s*Tj", body)]
+    return [l for l in lines if not CHROME.fullmatch(l)]
+
+
+def _html_lines(html):
+    body = html[html.index('<div class="wt-preview">'):]
+    lines = [unescape(t).strip() for t in re.split(r"<[^>]+>", body)]
+    return [l for l in lines if l and l != "— page break —" and not CHROME.fullmatch(l)]
+
+
+@pytest.mark.parametrize("protocol", ["standard", "long_term"])
+def test_preview_shows_what_the_pdf_prints(forms, monkeypatch, protocol):
+    fd = forms(1, seed=13, protocol=protocol)[0]
+    pdf, html = _pdf_lines(fd, monkeypatch), _html_lines(render_preview(fd, "en", now=NOW, tx=tx))
+    shown = " ".join(" ".join(html).split())
+    for text in filter(None, pdf_report.report_texts(fd)):
+        assert " ".join(tx(text).split()) in shown                     # every translated value, in full
+    if protocol == "standard":
+        assert sorted(pdf) == sorted(html)                             # same lines, wrapped the same way
+    else:
+        # the PDF bands the wide matrix (row labels repeated, headers wrapped); same words all the same
+        assert {w for l in pdf for w in l.split()} == {w for l in html for w in l.split()}
+
+
+def test_chinese_preview_uses_the_report_labels(forms):
+    fd = forms(1, seed=14, protocol="long_term")[0]
+    html = unescape(render_preview(fd, "zh", now=NOW, tx=tx))
+    for kind, *args in pdf_report.report_blocks(fd, "zh", "Shanghai", NOW, tx):
+        if kind in ("section", "period"):
+            assert args[0] in html
+        elif kind == "matrix":
+            assert all(label in html for label in args[0] + args[1])
+    assert "行走8-15分钟后" in html and "Before trying on" not in html
+
+
+def test_cache_rerenders_only_changed_blocks(forms):
+    fd, cache = forms(1, seed=15)[0], PreviewCache()
+    first = render_preview(fd, "en", now=NOW, cache=cache)
+    misses = cache.misses
+    assert render_preview(fd, "en", now=NOW, cache=cache) == first and cache.misses == misses
+    fd["description"] = "new upper material"
+    assert "new upper material" in render_preview(fd, "en", now=NOW, cache=cache)
+    assert cache.misses == misses + 1
@@ -0,0 +1,94 @@
+import glob
+import os
+
+import pytest
+
+import parquet_export
+from parquet_export import export, open_dataset
+from records import RecordStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RecordStore(str(tmp_path / "records.db"))
+
+
+def _ids(out):
+    return sorted(open_dataset(out).to_table(columns=["record_id"])["record_id"].to_pylist())
+
+
+def _files(out):
+    return sorted(glob.glob(os.path.join(out, "**", "*"), recursive=True) +
+                  glob.glob(os.path.join(out, "**", ".*"), recursive=True))
+
+
+def test_incremental_export_of_mixed_protocols(tmp_path, store, forms):
+    out = str(tmp_path / "ds")
+    store.insert_many(forms(30, seed=1) + forms(10, seed=2, protocol="long_term"))
+    first = export(out, store.path, chunk=7)
+    assert first["rows"] == 40 and _ids(out) == list(range(1, 41))
+
+    store.insert_many(forms(5, seed=3, protocol="long_term") + forms(5, seed=4))
+    second = export(out, store.path)
+    assert (second["rows"], second["last_id"]) == (10, 50)
+    assert _ids(out) == list(range(1, 51))
+    assert export(out, store.path)["rows"] == 0
+
+    table = open_dataset(out).to_table().to_pylist()
+    by_id = {r["record_id"]: r for r in table}
+    for rid in (1, 35, 45):
+        fd, row = store.get(rid), by_id[rid]
+        assert row["protocol"] == fd["protocol"] and row["po_number"] == fd["po_number"]
+        assert row["comfort"] == list(fd["comfort_scores"].values())
+        assert row["periods"] == list(fd["extended_data"])
+
+
+def test_exports_within_one_second_keep_every_part(tmp_path, store, forms):
+    out = str(tmp_path / "ds")
+    for fd in forms(3, seed=5):
+        store.save(fd)
+        export(out, store.path)
+    assert _ids(out) == [1, 2, 3]
+    assert parquet_export._read_state(out)["exported"] == 3
+
+
+def test_failed_run_removes_only_its_own_files(tmp_path, store, forms, monkeypatch):
+    out = str(tmp_path / "ds")
+    store.insert_many(forms(6, seed=6))
+    export(out, store.path)
+    before, state = _files(out), parquet_export._read_state(out)
+
+    store.insert_many(forms(6, seed=7) + forms(3, seed=8, protocol="long_term"))
+    real, calls = parquet_export.to_arrow, []
+
+    def flaky(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return real(*args)
+    monkeypatch.setattr(parquet_export, "to_arrow", flaky)
+    with pytest.raises(RuntimeError):
+        export(out, store.path, chunk=4)
+    assert _files(out) == before and parquet_export._read_state(out) == state
+
+    monkeypatch.setattr(parquet_export, "to_arrow", real)
+    export(out, store.path)
+    assert _ids(out) == list(range(1, 16))
+
+
+def test_records_saved_during_an_export_wait_for_the_next_run(tmp_path, store, forms, monkeypatch):
+    out = str(tmp_path / "ds")
+    store.insert_many(forms(3, seed=9, protocol="long_term") + forms(3, seed=10))
+    late = forms(2, seed=11)
+    real = parquet_export.to_arrow
+
+    def saving(*args):
+        while late:                           # a standard and a long-term save land mid-export
+            store.save(late.pop())
+        return real(*args)
+    monkeypatch.setattr(parquet_export, "to_arrow", saving)
+    assert export(out, store.path)["last_id"] == 6
+    assert _ids(out) == list(range(1, 7))
+    monkeypatch.setattr(parquet_export, "to_arrow", real)
+    export(out, store.path)
+    assert _ids(out) == list(range(1, 9))
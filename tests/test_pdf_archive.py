@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+import pdf_archive
+from pdf_archive import Archive, parse_fname
+from pdf_report import render_report
+
+NOW = datetime(2024, 5, 1, 10, 15)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return Archive(str(tmp_path / "archive.db"))
+
+
+def test_put_get_round_trip_with_slash_in_po(archive, forms):
+    fd = dict(forms(1)[0], po_number="PO/2024-1", style="ST-1")
+    pdf = render_report(fd, now=NOW, profile="compact").getvalue()
+    sha = archive.put(pdf, "WearTest_PO/2024-1_Shanghai_20240501_101500.pdf", fd['po_number'], "Shanghai", NOW,
+                      fd['style'], "en")
+    assert archive.get(sha) == pdf
+    (row,) = archive.find(po_number="PO/2024-1")
+    assert (row['city'], row['style'], row['generated']) == ("Shanghai", "ST-1", NOW.isoformat())
+
+
+def test_revisions_share_chunks(archive, forms):
+    fd = forms(1)[0]
+    for i in range(5):
+        fd['overall_result'] = f"Revision {i}"
+        archive.put(render_report(fd, now=NOW, profile="compact").getvalue(), f"r{i}.pdf", "PO1", "Shanghai", NOW)
+    s = archive.stats()
+    assert (s['reports'], s['pdfs']) == (5, 5)
+    assert s['stored_bytes'] < s['raw_bytes'] / 2
+
+
+def test_cli_put_parses_file_name(tmp_path, forms, capsys):
+    path = tmp_path / "WearTest_PO_7_Shanghai_20240501_101500.pdf"
+    path.write_bytes(render_report(forms(1)[0], now=NOW, profile="compact").getvalue())
+    db = str(tmp_path / "cli.db")
+    pdf_archive.main(["--db", db, "put", str(path), "--style", "ST-9"])
+    (row,) = Archive(db).find(style="ST-9")
+    assert row['po_number'] == "PO_7" and row['fname'] == path.name
+    assert parse_fname(path.name)['generated'] == "2024-05-01T10:15:00"
+    with pytest.raises(ValueError):
+        parse_fname("report.pdf")
@@ -0,0 +1,199 @@
+import io
+import re
+from datetime import datetime
+
+import pytest
+
+import pdf_report
+from pdf_report import render_merged_report
+
+NOW = datetime(2024, 1, 1)
+
+
+def test_merged_report_count_overstated(forms):
+    out = io.BytesIO()
+    pages = render_merged_report(forms(2), count=5, now=NOW, out=out)
+    assert pages >= 3
+    assert out.getvalue().startswith(b"%PDF")
+
+
+def test_merged_report_count_exact_matches_len(forms):
+    fds = forms(3, seed=2)
+    a, b = io.BytesIO(), io.BytesIO()
+    assert render_merged_report(fds, now=NOW, out=a) == render_merged_report(iter(fds), count=3, now=NOW, out=b)
+    assert a.getvalue() == b.getvalue()
+
+
+def test_flush_page_fallback_renders_same_pages(forms, monkeypatch):
+    fds = forms(2, seed=3)
+    flushed = render_merged_report(fds, now=NOW, out=io.BytesIO())
+    monkeypatch.setattr(pdf_report, "_FLUSH_PAGES", False)
+    assert render_merged_report(fds, now=NOW, out=io.BytesIO()) == flushed
+
+
+# ─── Output profiles ───────────────────────────────────────────────────────────
+_TOKEN = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f]*>|/[^\s/\[\]()<>]+|\[|\]|[^\s\[\]()<>/]+")
+_STATE = {b"rg": "fill", b"g": "fill", b"k": "fill", b"RG": "stroke", b"G": "stroke", b"K": "stroke",
+          b"Tf": "font", b"TL": "leading", b"w": "width", b"gs": "gs", b"d": "dash", b"J": "cap", b"j": "join"}
+_PAINT = {b"Tj", b"TJ", b"'", b'"', b"S", b"s", b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"Do"}
+
+
+def _painted(pdf):
+    """Every paint operator of every uncompressed content stream, with the state it runs under."""
+    events = []
+    for body in re.findall(rb"stream\r?\n(.*?)endstream", pdf, re.S):
+        state, stack, args, arr = {}, [], [], None
+        for tok in _TOKEN.findall(body):
+            if tok == b"[":
+                arr = []
+            elif tok == b"]":
+                args.append(tuple(arr))
+                arr = None
+            elif arr is not None:
+                arr.append(tok)
+            elif tok[:1] in b"(</" or re.fullmatch(rb"-?[\d.]+", tok):
+                args.append(tok)
+            else:
+                if tok in _STATE:
+                    state[_STATE[tok]] = tuple(args)
+                elif tok == b"q":
+                    stack.append(dict(state))
+                elif tok == b"Q":
+                    state = stack.pop()
+                elif tok in _PAINT:
+                    events.append((tok, tuple(args), sorted(state.items())))
+                elif tok not in (b"BT", b"ET"):        # setFont's own empty BT ... ET is what dedupe drops
+                    events.append((tok, tuple(args)))
+                args = []
+    return events
+
+
+@pytest.fixture
+def panel(forms):
+    fd = forms(1, seed=4)[0]
+    fd['testers'] = ["Tester A", "Tester B", "Tester C"]
+    fd['tester_scores'] = {kind: {t: [(i + j) % 5 + 1 for j in range(11)] for i, t in enumerate(fd['testers'])}
+                           for kind in ("comfort", "appearance")}
+    return fd
+
+
+def test_dedupe_keeps_the_drawing_state(panel, monkeypatch):
+    # Same profile (shared chrome and all) both times; only the canvas class differs
+    monkeypatch.setitem(pdf_report.OUTPUT_PROFILES, "uncompressed",
+                        {"compress": False, "invariant": True, "dedupe": True})
+    for lang in ("en", "zh"):
+        dedupe = pdf_report.render_report(panel, lang, now=NOW, profile="uncompressed").getvalue()
+        with monkeypatch.context() as m:
+            m.setattr(pdf_report, "_DedupCanvas", pdf_report.rl_canvas.Canvas)
+            plain = pdf_report.render_report(panel, lang, now=NOW, profile="uncompressed").getvalue()
+        assert len(dedupe) < len(plain)
+        assert _painted(dedupe) == _painted(plain)
+
+
+def test_text_object_does_not_leak_into_later_drawing():
+    from reportlab.lib import colors
+    buf = io.BytesIO()
+    c = pdf_report._DedupCanvas(buf, pageCompression=0)
+    c.setFont('Helvetica', 9)
+    c.setFillColor(colors.red)
+    t = c.beginText()
+    t.setFont('Helvetica-Bold', 9)
+    t.setFillColor(colors.blue)
+    t.textOut("x")
+    c.drawText(t)
+    c.setFont('Helvetica', 9)
+    c.setFillColor(colors.red)
+    c.drawString(20, 20, "after")
+    c.setFillColor(colors.green, alpha=0.5)
+    c.setFillColor(colors.green)
+    c.rect(0, 0, 5, 5, fill=1)
+    c.save()
+    events = _painted(buf.getvalue())
+    after = next(e for e in events if e[:2] == (b"Tj", (b"(after)",)))
+    assert dict(after[2])["fill"] == (b"1", b"0", b"0") and dict(after[2])["font"] == (b"/F1", b"9")
+    assert dict(events[-1][2])["fill"] == (b"0", b".501961", b"0")
+
+
+def test_compact_profile_is_smaller_and_reproducible(panel):
+    default = pdf_report.render_report(panel, now=NOW, profile="default").getvalue()
+    compact = [pdf_report.render_report(panel, now=NOW, profile="compact").getvalue() for _ in range(2)]
+    assert compact[0] == compact[1]                              # invariant: same input, same bytes
+    assert len(compact[0]) < len(default) / 2
+    assert compact[0].count(b"/Type /Page\n") == default.count(b"/Type /Page\n") > 1
+
+
+# ─── Protocol-driven sections ──────────────────────────────────────────────────
+def _shown(pdf):
+    """Per uncompressed content stream, the strings it draws (Helvetica text only), in order."""
+    return [[re.sub(rb"\\(.)", rb"\1", s).decode("latin-1")
+             for s in re.findall(rb"\(((?:\\.|[^\\)])*)\)\s*Tj", body)]
+            for body in re.findall(rb"stream\r?\n(.*?)endstream", pdf, re.S)]
+
+
+def test_matrix_page_breaks_keep_every_row_and_column():
+    from reportlab.pdfgen import canvas as rl_canvas
+    rows = [f"Row {i:02d} question" for i in range(70)]
+    cols = [f"W{j:02d}" for j in range(25)]
+    cells = [["Yes" if (i + j) % 3 else "No" for j in range(len(cols))] for i in range(len(rows))]
+    buf = io.BytesIO()
+    c, pages = rl_canvas.Canvas(buf, pageCompression=0), [1]
+
+    def new_page():
+        c.showPage()
+        pages[0] += 1
+        return pdf_report.CONTENT_TOP
+    y = pdf_report.draw_matrix_table(c, pdf_report.CONTENT_TOP, rows, cols, cells, "en", new_page)
+    c.save()
+    per_page = _shown(buf.getvalue())
+    shown = [s for page in per_page for s in page]
+
+    bands = -(-len(cols) // int((pdf_report.CONTENT_W * 0.64) // 30))
+    assert bands > 1 and pages[0] > bands                         # columns banded and rows split over pages
+    assert pdf_report.FOOTER_H < y < pdf_report.CONTENT_TOP
+    assert [s for s in shown if s.startswith("Row ")] == rows * bands
+    assert sorted(set(s for s in shown if s.startswith("W"))) == cols
+    assert sum(s in ("Yes", "No") for s in shown) == len(rows) * len(cols)
+    assert len(per_page) == pages[0] and all("Question" in page for page in per_page)   # header on every page
+
+
+@pytest.fixture
+def drills(monkeypatch, forms):
+    """A matrix protocol that is neither built in nor in protocols.json, and a form using it."""
+    import form_schema
+    proto = form_schema._normalise_protocol("drills", {
+        "time_periods":  [f"Drill {i}" for i in range(1, 13)],
+        "days_to_track": ["Round 1", "Round 2", "Round 3"],
+        "questions":     ["Outsole lifting at the toe?", "Heel counter collapsed?", "Eyelets pulled out?"],
+        "period_zh":     {"Drill 1": "演练1"},
+        "question_zh":   {"Heel counter collapsed?": "后跟塌陷了吗？"},
+    })
+    monkeypatch.setitem(form_schema.PROTOCOLS, "drills", proto)
+    fd = forms(1, seed=12)[0]
+    for key in ("extended_data", "comfort_scores", "appearance_scores", "issues"):
+        fd.pop(key, None)
+    form_schema.ensure_protocol_fields(fd, proto)
+    fd["extended_data"]["Drill 3"]["Eyelets pulled out?"] = "Yes"
+    fd["issues"]["Round 2"] = "toe cap scuffed on the kerb"
+    return proto, fd
+
+
+def test_nonstandard_protocol_renders_its_matrix(drills, monkeypatch):
+    proto, fd = drills
+    assert "toe cap scuffed on the kerb" in pdf_report.report_texts(fd)
+
+    for lang, first_q, first_p in (("en", "Outsole lifting at the toe?", "Drill 1"),
+                                   ("zh", "Outsole lifting at the toe?", "演练1")):
+        blocks = pdf_report.report_blocks(fd, lang, "Shanghai", NOW, lambda s: s)
+        (_, q_labels, p_labels, cells), = [b for b in blocks if b[0] == "matrix"]
+        assert (q_labels[0], p_labels[0], len(p_labels)) == (first_q, first_p, 12)
+        assert q_labels[1] == ("后跟塌陷了吗？" if lang == "zh" else "Heel counter collapsed?")
+        assert cells[2][2] == ("是" if lang == "zh" else "Yes")
+        assert [b[0] for b in blocks if b[0] in ("period", "matrix")] == ["matrix"]
+
+    monkeypatch.setitem(pdf_report.OUTPUT_PROFILES, "uncompressed",
+                        {"compress": False, "invariant": True, "dedupe": False})
+    pdf = pdf_report.render_report(fd, "en", now=NOW, profile="uncompressed").getvalue()
+    shown = " ".join(s for page in _shown(pdf) for s in page)        # column headers may wrap
+    for label in proto["questions"] + proto["time_periods"] + proto["days_to_track"]:
+        assert re.search(r"(?<!\S)" + r"\s+".join(map(re.escape, label.split())) + r"(?!\S)", shown), label
+    assert "toe cap scuffed on the kerb" in shown
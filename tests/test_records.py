@@ -0,0 +1,50 @@
+import pytest
+
+import rollups
+from autosave import DraftStore, new_draft_id
+from records import RecordStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    return RecordStore(str(tmp_path / "records.db")), str(tmp_path / "drafts.db")
+
+
+def test_regenerating_restored_draft_updates_its_record(stores, forms):
+    records, drafts_path = stores
+    fd, draft_id = forms(1)[0], new_draft_id()
+    drafts = DraftStore(drafts_path, debounce=0)
+    drafts.submit(draft_id, fd)
+    rid = records.save_draft(fd, drafts, draft_id)
+    assert rollups.assessment_count(records) == 1
+
+    # New process, browser refresh: only the draft id survives
+    drafts = DraftStore(drafts_path, debounce=0)
+    restored = drafts.restore(draft_id)
+    restored['overall_result'] = "Edited after restore"
+    assert records.save_draft(restored, drafts, draft_id) == rid
+    assert rollups.assessment_count(records) == 1
+    assert records.get(rid)['overall_result'] == "Edited after restore"
+
+
+def test_changed_po_or_style_starts_a_new_record(stores, forms):
+    records, drafts_path = stores
+    drafts, draft_id = DraftStore(drafts_path), new_draft_id()
+    fd = forms(1)[0]
+    first = records.save_draft(fd, drafts, draft_id)
+    second = records.save_draft(dict(fd, po_number=fd['po_number'] + "-B"), drafts, draft_id)
+    third = records.save_draft(dict(fd, po_number=fd['po_number'] + "-B", style="ST-NEW"), drafts, draft_id)
+    assert len({first, second, third}) == 3
+    assert records.get(first)['po_number'] == fd['po_number']
+    assert rollups.assessment_count(records) == 3
+
+
+def test_discarded_draft_forgets_its_record(stores, forms):
+    records, drafts_path = stores
+    drafts, draft_id = DraftStore(drafts_path), new_draft_id()
+    fd = forms(1)[0]
+    records.save_draft(fd, drafts, draft_id)
+    drafts.discard(draft_id)
+    assert drafts.linked_record(draft_id) is None
+    records.save_draft(fd, drafts, draft_id)
+    assert rollups.assessment_count(records) == 2
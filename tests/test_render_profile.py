@@ -0,0 +1,61 @@
+import re
+import string
+from datetime import date
+
+import pytest
+
+from render_profile import _WORD, scrub
+
+
+def _shape(s):
+    return re.sub(r"[a-z]", "a", re.sub(r"[A-Z]", "A", re.sub(r"[0-9]", "0", re.sub(r"[一-鿿]", "中", s))))
+
+
+@pytest.fixture
+def panel(forms):
+    fd = forms(1, seed=31)[0]
+    names = [f"Tester {c}" for c in string.ascii_uppercase] + ["王 芳", "李 芳"]
+    fd['testers'] = names
+    fd['tester_scores'] = {"comfort": {n: [i % 5 + 1] * 3 for i, n in enumerate(names)},
+                           "appearance": {n: [3, 0, 4] for n in names}}
+    fd['description'] = f"{fd['po_number']} heel 鞋跟 磨损, 7 x 9 mm; Tester Q"
+    fd['prep_date'] = date(2024, 5, 1)
+    return fd
+
+
+@pytest.mark.parametrize("key", [bytes(16), b"k" * 16, None])
+def test_scrub_is_one_to_one_and_keeps_shape(panel, key):
+    out, text = scrub(panel, key)
+    words = {w for s in [panel['description'], panel['po_number'], *panel['testers']] for w in _WORD.findall(s)}
+    mapped = {w: text(w) for w in words}
+    assert len(set(mapped.values())) == len(words)                            # distinct stay distinct
+    assert all(_shape(w) == _shape(m) for w, m in mapped.items())
+    assert _shape(out['description']) == _shape(panel['description'])
+    assert out['description'].startswith(out['po_number'] + " ")             # same word, same output
+    assert out['description'].endswith(text("Tester Q"))
+    assert out['protocol'] == panel['protocol'] and out['prep_date'] == panel['prep_date']
+    for k in ('sample_type', 'fit_sizes', 'upper_feel', 'toe_length'):
+        assert out[k] == panel[k]
+
+
+def test_tester_scores_stay_keyed_by_the_scrubbed_names(panel):
+    out, _ = scrub(panel, bytes(16))
+    assert len(set(out['testers'])) == len(panel['testers'])
+    for kind, rows in out['tester_scores'].items():
+        assert list(rows) == out['testers']
+        assert list(rows.values()) == list(panel['tester_scores'][kind].values())
+
+
+def test_scrub_key_changes_the_output(panel):
+    a, _ = scrub(panel, b"a" * 16)
+    b, _ = scrub(panel, b"b" * 16)
+    assert a['description'] != b['description'] and a['testers'] != b['testers']
+
+
+def test_single_characters_stay_distinct_when_their_shape_fills_up():
+    singles = list(string.ascii_uppercase + string.ascii_lowercase + string.digits)
+    for k in range(300):                        # a few keys in a hundred used to map two letters together
+        _, text = scrub({}, k.to_bytes(16, "little"))
+        outs = [text(c) for c in singles]
+        assert len(set(outs)) == len(singles)
+        assert all(_shape(o) == _shape(c) for o, c in zip(outs, singles))
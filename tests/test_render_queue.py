@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+
+import render_queue
+from render_queue import Broker, FileStore, SQLiteBroker, drain, purge, result, run_worker, submit
+from scheduler import BATCH
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteBroker(str(tmp_path / "queue.db")), FileStore(str(tmp_path / "pdfs"))
+
+
+def _jobs(broker):
+    with broker._connect() as conn:
+        return conn.execute("SELECT id, state, attempts, result FROM jobs").fetchall()
+
+
+def test_drain_scales_with_processes(tmp_path, forms):
+    fd, jobs, walls = forms(1)[0], 60, {}
+    for n in (1, 4):
+        broker = SQLiteBroker(str(tmp_path / f"q{n}.db"))
+        store  = FileStore(str(tmp_path / f"pdfs{n}"))
+        ids    = {submit(broker, fd, priority=BATCH) for _ in range(jobs)}
+        walls[n] = drain(broker, store, n, simulate_ms=25)
+        rows = _jobs(broker)
+        assert {r[0] for r in rows} == ids                       # none lost
+        assert all(r[1] == "done" and r[2] == 1 for r in rows)   # each claimed once
+        assert len({r[3] for r in rows}) == jobs                 # one PDF per job
+        assert sorted(os.listdir(store.root)) == sorted(r[3] for r in rows)
+    assert walls[1] / walls[4] > 2
+
+
+def test_expired_lease_is_reclaimed_then_fails(queue):
+    broker, _ = queue
+    broker.put("j", {}, b"")
+    assert broker.claim("w1", lease=0.01)[0] == "j"
+    time.sleep(0.02)
+    assert broker.claim("w2", lease=0.01)[0] == "j"             # w1 presumed dead
+    assert not broker.complete("j", "w1", "late.pdf")          # and can no longer finish it
+    assert broker.status("j")["state"] == "running"
+    for _ in range(render_queue.MAX_ATTEMPTS - 2):
+        time.sleep(0.02)
+        assert broker.claim("w3", lease=0.01)[0] == "j"
+    time.sleep(0.02)
+    assert broker.claim("w4") is None
+    st = broker.status("j")
+    assert st["state"] == "failed" and "too many" in st["error"]
+    assert not broker.fail("j", "w3", "late")
+
+
+def test_result_deletes_pdf_and_purge_drops_old_jobs(queue, forms):
+    broker, store = queue
+    fd = forms(1)[0]
+    a, b = submit(broker, fd), submit(broker, fd)
+    run_worker(broker, store, drain=True, simulate_ms=0)
+    assert result(broker, store, a).read() == b"%PDF-simulated"
+    assert os.listdir(store.root) == [broker.status(b)["result"]]
+    assert purge(broker, store, ttl=3600) == 0
+    assert purge(broker, store, ttl=-1) == 2
+    assert os.listdir(store.root) == [] and broker.counts() == {}
+
+
+def test_broker_is_abstract():
+    class Partial(Broker):
+        def put(self, job_id, params, form, priority=0):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,82 @@
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+import rollups
+from form_schema import get_protocol
+from records import RecordStore
+
+
+def _scan(store, metric="comfort", **filters):
+    """score_summary / yes_counts / assessment_count by reading every record."""
+    field, scores, answers, n = rollups.METRICS[metric], defaultdict(list), Counter(), 0
+    for _, fd in store.iter_records():
+        if any(str(fd.get(k) or '') != v for k, v in filters.items()):
+            continue
+        n += 1
+        proto = get_protocol(fd.get('protocol'))
+        for day in proto['days_to_track']:
+            v = fd[field].get(day)
+            if isinstance(v, int) and 1 <= v <= 5:
+                scores[day].append(v)
+        for period in proto['time_periods']:
+            for q, a in fd['extended_data'].get(period, {}).items():
+                answers[period, q, "n"] += 1
+                answers[period, q, "yes"] += a == "Yes"
+    summary = {d: {"n": len(v), "mean": sum(v) / len(v), "hist": [v.count(s) for s in range(1, 6)]}
+               for d, v in scores.items()}
+    yes = {(p, q): (answers[p, q, "yes"], answers[p, q, "n"]) for p, q, k in answers if k == "n"}
+    return n, summary, yes
+
+
+def _assert_matches(store, **filters):
+    n, summary, yes = _scan(store, **filters)
+    assert rollups.assessment_count(store, **filters) == n
+    got = rollups.score_summary(store, **filters)
+    assert {d: dict(s, mean=round(s["mean"], 9)) for d, s in got.items()} == \
+           {d: dict(s, mean=round(s["mean"], 9)) for d, s in summary.items()}
+    assert rollups.yes_counts(store, **filters) == yes
+
+
+def _tables(store):
+    with store._connect() as conn:
+        return {t: sorted(conn.execute(f"SELECT * FROM {t}").fetchall()) for t in rollups._TABLES}
+
+
+def test_rollups_match_a_full_scan_after_edits(tmp_path, forms):
+    store = RecordStore(str(tmp_path / "records.db"))
+    batch = forms(40, seed=2) + forms(20, seed=3, protocol="long_term")
+    store.insert_many(batch, source="test")
+    rng = random.Random(4)
+    for rid in rng.sample(range(1, 61), 25):
+        fd = store.get(rid)
+        fd['factory'] = rng.choice(["F-EDITED", fd['factory']])
+        day = rng.choice(list(fd['comfort_scores']))
+        fd['comfort_scores'][day] = rng.choice([1, 5, None])     # None drops the day from the totals
+        period = next(iter(fd['extended_data']))
+        fd['extended_data'][period] = {q: "Yes" for q in fd['extended_data'][period]}
+        store.save(fd, rid)
+    store.save(forms(1, seed=9)[0])
+
+    factories = {fd['factory'] for _, fd in store.iter_records()}
+    assert "F-EDITED" in factories
+    _assert_matches(store)
+    for factory in factories:
+        _assert_matches(store, factory=factory)
+
+    with store._connect() as conn:
+        assert {t: conn.execute(f"SELECT COUNT(*) FROM {t} WHERE n = 0").fetchone()[0]
+                for t in rollups._TABLES} == dict.fromkeys(rollups._TABLES, 0)
+    incremental = _tables(store)
+    before = rollups.breakdown(store, by="factory")
+    rollups.rebuild(store)
+    assert rollups.breakdown(store, by="factory") == pytest.approx(before)
+    assert _tables(store) == incremental                      # emptied groups leave no zero rows behind
+    _assert_matches(store)
+
+
+def test_unknown_dimension_is_rejected(tmp_path):
+    store = RecordStore(str(tmp_path / "records.db"))
+    with pytest.raises(ValueError):
+        rollups.assessment_count(store, colour="red")
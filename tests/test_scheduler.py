@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import API, BATCH, INTERACTIVE, Overloaded, Scheduler
+
+
+@pytest.fixture
+def sched():
+    """One worker, held by a running job until ``sched.release()``."""
+    s = Scheduler(workers=1, depth=(4, 4, 4), per_user=(None, None, None), max_wait=(None, None, None),
+                  batch_idle=0)
+    gate = threading.Event()
+    s.submit(gate.wait)
+    while s.metrics()["interactive"]["running"] != 1:
+        time.sleep(0.001)
+    s.release = gate.set
+    yield s
+    gate.set()
+    s.shutdown()
+
+
+def _drain(s, futs):
+    s.release()
+    for f in futs:
+        f.result(timeout=5)
+
+
+def test_classes_run_in_priority_order(sched):
+    ran = []
+    futs = [sched.submit(ran.append, name, priority=cls)
+            for name, cls in (("batch", BATCH), ("api", API), ("interactive", INTERACTIVE), ("api2", API))]
+    _drain(sched, futs)
+    assert ran == ["interactive", "api", "api2", "batch"]
+
+
+def test_users_take_turns_within_a_class(sched):
+    ran = []
+    futs = [sched.submit(ran.append, f"{u}{i}", user=u) for u, n in (("a", 3), ("b", 1)) for i in range(n)]
+    _drain(sched, futs)
+    assert ran == ["a0", "b0", "a1", "a2"]
+
+
+def test_full_queue_raises_or_blocks(sched):
+    futs = [sched.submit(time.sleep, 0) for _ in range(4)]
+    with pytest.raises(Overloaded, match="full"):
+        sched.submit(time.sleep, 0)
+    with pytest.raises(Overloaded):
+        sched.submit(time.sleep, 0, block=True, timeout=0.05)
+    assert sched.metrics()["interactive"]["rejected"] == 2
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(sched.submit(time.sleep, 0, block=True)))
+    waiter.start()
+    time.sleep(0.05)
+    assert not admitted                          # still blocked: nothing has left the queue
+    _drain(sched, futs)
+    waiter.join(5)
+    assert admitted and admitted[0].result(timeout=5) is None
+
+
+def test_per_user_cap():
+    s = Scheduler(workers=1, per_user=(1, None, None), max_wait=(None, None, None))
+    gate = threading.Event()
+    s.submit(gate.wait, user="a")
+    while s.metrics()["interactive"]["running"] != 1:
+        time.sleep(0.001)
+    s.submit(time.sleep, 0, user="a")
+    with pytest.raises(Overloaded, match="per user"):
+        s.submit(time.sleep, 0, user="a")
+    s.submit(time.sleep, 0, user="b")
+    gate.set()
+    s.shutdown()
+
+
+def test_backlog_estimate_uses_each_class_own_service_time(sched):
+    sched.max_wait = (1.0, 1.0, 1.0)
+    sched._service[BATCH].extend([100.0])                 # slow renders
+    sched._service[INTERACTIVE].extend([0.01] * 199)     # quick generates
+    futs = [sched.submit(time.sleep, 0) for _ in range(3)]          # not held up by slow batch history
+    futs.append(sched.submit(time.sleep, 0, priority=BATCH))
+    with pytest.raises(Overloaded, match="backlog"):                # one slow render already queued
+        sched.submit(time.sleep, 0, priority=BATCH, block=False)
+    _drain(sched, futs)
+
+
+def test_metrics(sched):
+    def boom():
+        raise ValueError("x")
+    futs = [sched.submit(time.sleep, 0.01), sched.submit(boom), sched.submit(time.sleep, 0, priority=BATCH)]
+    m = sched.metrics()
+    assert (m["interactive"]["depth"], m["interactive"]["running"], m["batch"]["depth"]) == (2, 1, 1)
+    sched.release()
+    futs[0].result(timeout=5)
+    with pytest.raises(ValueError):
+        futs[1].result(timeout=5)
+    futs[2].result(timeout=5)
+    time.sleep(0.05)                                         # counters update after the future resolves
+    m = sched.metrics()
+    assert {k: m["interactive"][k] for k in ("submitted", "completed", "failed", "depth", "running")} == \
+           {"submitted": 3, "completed": 2, "failed": 1, "depth": 0, "running": 0}
+    assert m["batch"]["completed"] == 1 and m["api"]["submitted"] == 0
+    assert 0 <= m["interactive"]["wait_p50_ms"] <= m["interactive"]["wait_p95_ms"] <= m["interactive"]["wait_max_ms"]
+    assert m["interactive"]["run_mean_ms"] > 0 and m["api"]["wait_p50_ms"] is None
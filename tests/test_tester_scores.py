@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+import tester_scores as ts
+
+DAYS = ["Day 1", "Day 2", "Day 3", "Day 4"]
+
+
+def _panel(rows, own=3):
+    names = [f"Tester {c}" for c in "ABC"[:len(rows)]]
+    return {"testers": names,
+            "tester_scores": {"comfort": dict(zip(names, rows)), "appearance": {}},
+            "comfort_scores": {d: own for d in DAYS}, "appearance_scores": {d: own for d in DAYS}}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_panel_stats_match_a_cell_by_cell_scan(seed):
+    rng = np.random.default_rng(seed)
+    m = rng.integers(0, 6, size=(4, 7)).astype(np.uint8)
+    m[:, 2] = 0                                                  # a day nobody scored
+    m[1] = 0                                                     # a tester who scored nothing
+    st = ts.panel_stats(m)
+    for d in range(m.shape[1]):
+        col = [v for v in m[:, d].tolist() if v]
+        assert st["day_n"][d] == len(col)
+        assert st["day_min"][d] == (min(col) if col else 0)
+        assert st["day_max"][d] == (max(col) if col else 0)
+        assert st["day_spread"][d] == st["day_max"][d] - st["day_min"][d]
+        if col:
+            assert st["day_mean"][d] == pytest.approx(sum(col) / len(col))
+        else:
+            assert math.isnan(st["day_mean"][d])
+    for t in range(m.shape[0]):
+        row = [v for v in m[t].tolist() if v]
+        assert (st["tester_mean"][t] == pytest.approx(sum(row) / len(row)) if row
+                else math.isnan(st["tester_mean"][t]))
+    cells = [v for v in m.ravel().tolist() if v]
+    assert st["mean"] == pytest.approx(sum(cells) / len(cells))
+    assert math.isnan(ts.panel_stats(np.zeros((2, 3)))["mean"])
+
+
+def test_score_matrix_pads_clips_and_follows_tester_order():
+    fd = _panel([[4, 9, -1], [2, 2, 2, 2, 5]])
+    fd["testers"].reverse()
+    m = ts.score_matrix(fd, "comfort", DAYS)
+    assert m.tolist() == [[2, 2, 2, 2], [4, 5, 0, 0]]
+    ts.set_scores(fd, "appearance", [[1.4, np.nan, 7, 3]])
+    assert fd["tester_scores"]["appearance"] == {"Tester B": [1, 0, 5, 3]}
+
+
+def test_day_scores_round_half_up_and_fill_gaps_from_the_form():
+    fd = _panel([[3, 1, 0, 5], [2, 2, 0, 4]], own=1)
+    # means 2.5, 1.5, unscored, 4.5
+    assert ts.day_scores(fd, "comfort", DAYS) == [3, 2, 1, 5]
+    assert ts.day_scores(fd, "appearance", DAYS) == [1, 1, 1, 1]   # panel, but no appearance scores
+    ts.sync_day_scores(fd, DAYS)
+    assert fd["comfort_scores"] == dict(zip(DAYS, [3, 2, 1, 5]))
+
+
+def test_single_tester_or_unscored_panel_keeps_own_scores():
+    one = _panel([[5, 5, 5, 5]], own=2)
+    empty = _panel([[], [0, 0]], own=2)
+    for fd in (one, empty):
+        assert not ts.is_panel(fd)
+        assert ts.day_scores(fd, "comfort", DAYS) == [2, 2, 2, 2]
+        assert ts.sync_day_scores(fd, DAYS)["comfort_scores"] == {d: 2 for d in DAYS}
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from types import SimpleNamespace as NS
+
+import pytest
+
+import translation
+from scheduler import Overloaded
+
+
+class FakeClient:
+    """OpenAI client stand-in: 'T<text>' per string; ``short`` drops the last string of a batch."""
+
+    def __init__(self, short=False, fail=()):
+        self.short, self.fail, self.calls = short, set(fail), []
+        self.chat = NS(completions=NS(create=self.create))
+
+    def create(self, **kw):
+        text = kw["messages"][-1]["content"]
+        self.calls.append(kw)
+        if "response_format" in kw:
+            out = [f"T{s}" for s in json.loads(text)]
+            content = json.dumps({"t": out[:-1] if self.short else out})
+        elif text in self.fail:
+            raise RuntimeError("api down")
+        else:
+            content = f"T{text}"
+        return NS(choices=[NS(message=NS(content=content))], usage=NS(prompt_tokens=10, completion_tokens=5))
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    translation._failed.clear()
+    translation._inflight.clear()
+    yield
+    translation._failed.clear()
+
+
+class _SubmitOnce:
+    """Runs the first job inline, then is overloaded."""
+
+    def __init__(self):
+        self.outs = None
+
+    def submit(self, fn, *args, **kwargs):
+        if self.outs is not None:
+            raise Overloaded("full")
+        self.outs = args[-1]
+        fn(*args)
+
+
+def test_overload_part_way_resolves_every_future(monkeypatch):
+    pool = _SubmitOnce()
+    monkeypatch.setattr(translation, "_pool", pool)
+    monkeypatch.setattr(translation, "SHORT_TOKENS", 0)      # one batch per string
+    texts = ["heel rubbing", "toe scuff", "sole gap"]
+    with pytest.raises(Overloaded):
+        translation.translate_within(FakeClient(), texts, "zh", {})
+    assert all(f.done() for f in pool.outs.values())
+    assert [pool.outs[t].result() for t in texts] == ["Theel rubbing", "toe scuff", "sole gap"]
+
+
+class _Inline:
+    def submit(self, fn, *args, **kwargs):
+        fn(*args)
+
+
+SHORT = ["heel rubbing", "toe scuff", "sole gap", "lining peel", "lace fray"]
+
+
+def test_plan_batches_keeps_order_and_limits():
+    long_text = "seam split along the vamp " * 40
+    texts = SHORT * 20 + [long_text] + SHORT
+    for budget in (0, 30, 600):
+        batches = translation.plan_batches(texts, budget)
+        flat = [t for b in batches for t in b]
+        assert sorted(flat) == sorted(texts)
+        assert [t for t in flat if t != long_text] == [t for t in texts if t != long_text]
+        assert [long_text] in batches
+        for b in batches:
+            assert len(b) == 1 or (sum(map(translation.est_tokens, b)) <= budget
+                                   and len(b) <= translation.BATCH_MAX_TEXTS)
+    assert all(len(b) == 1 for b in translation.plan_batches(texts, 0))
+    assert max(map(len, translation.plan_batches(texts, 10_000))) == translation.BATCH_MAX_TEXTS
+
+
+def test_batch_budget_follows_the_latency_model(monkeypatch):
+    assert translation.batch_budget() == translation.BATCH_TOKENS                # no usage log attached
+    for model, want in [((100.0, 1.0, 0.6), 2400),
+                        ((2000.0, 10.0, 0.6), translation.BATCH_LIMITS[0]),
+                        ((0.0, 0.01, 0.6), translation.BATCH_LIMITS[1])]:
+        monkeypatch.setattr(translation, "_fitted_model", lambda m=model: m)
+        assert translation.batch_budget() == want
+
+
+@pytest.mark.parametrize("short", [False, True])
+def test_short_strings_share_a_call_and_fall_back_on_mismatch(monkeypatch, short):
+    monkeypatch.setattr(translation, "_pool", _Inline())
+    client = FakeClient(short=short)
+    tx, pending = translation.translate_within(client, SHORT, "zh", {})
+    assert not pending
+    assert [tx(t) for t in SHORT] == [f"T{t}" for t in SHORT]
+    batched = [c for c in client.calls if "response_format" in c]
+    assert len(batched) == 1
+    assert len(client.calls) == (1 + len(SHORT) if short else 1)                # one call per string after a mismatch
+
+
+class BlockingClient(FakeClient):
+    """FakeClient whose calls wait for ``release``; ``entered`` is set once the first call is in."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.entered, self.release = threading.Event(), threading.Event()
+
+    def create(self, **kw):
+        self.entered.set()
+        assert self.release.wait(5)
+        return super().create(**kw)
+
+
+def _concurrent(client, text, n, cache):
+    """``n`` threads calling translate_text together: one leads, the rest join it before it returns."""
+    before = translation.stats()["coalesced"]
+    out = [None] * n
+    def run(i):
+        out[i] = translation.translate_text(client, text, "zh", cache)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    threads[0].start()
+    assert client.entered.wait(5)
+    for th in threads[1:]:
+        th.start()
+    end = time.monotonic() + 5
+    while translation.stats()["coalesced"] - before < n - 1 and time.monotonic() < end:
+        time.sleep(0.001)
+    client.release.set()
+    for th in threads:
+        th.join(5)
+    return out, translation.stats()["coalesced"] - before
+
+
+def test_identical_concurrent_texts_share_one_call():
+    client, cache = BlockingClient(), {}
+    out, coalesced = _concurrent(client, "heel slip", 6, cache)
+    assert out == ["Theel slip"] * 6
+    assert len(client.calls) == 1 and coalesced == 5
+    assert cache == {"heel slip|zh": "Theel slip"} and not translation._inflight
+
+
+def test_leader_failure_reaches_every_waiter_and_is_not_cached(monkeypatch):
+    client, cache = BlockingClient(fail={"heel slip"}), {}
+    out, coalesced = _concurrent(client, "heel slip", 4, cache)
+    assert out == ["heel slip"] * 4                                           # every caller fell back
+    assert len(client.calls) == 1 and coalesced == 3
+    assert cache == {} and not translation._inflight
+
+    gate, errors = threading.Event(), []
+    def call():
+        assert gate.wait(5)
+        raise RuntimeError("api down")
+    def join():
+        try:
+            translation._single_flight(("x", "zh"), call)
+        except RuntimeError as e:
+            errors.append(e)
+    before = translation.stats()["coalesced"]
+    threads = [threading.Thread(target=join) for _ in range(3)]
+    for th in threads:
+        th.start()
+    end = time.monotonic() + 5
+    while translation.stats()["coalesced"] - before < 2 and time.monotonic() < end:
+        time.sleep(0.001)
+    gate.set()
+    for th in threads:
+        th.join(5)
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1 and not translation._inflight
+
+    monkeypatch.setattr(translation, "RETRY_AFTER", 0.0)
+    translation._failed.clear()
+    client.fail.clear()
+    assert translation.translate_text(client, "heel slip", "zh", cache) == "Theel slip"
+    assert len(client.calls) == 2
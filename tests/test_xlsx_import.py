@@ -0,0 +1,50 @@
+from openpyxl import Workbook
+
+import rollups
+from records import RecordStore
+from xlsx_import import import_workbook, plan_columns, template_headers
+
+
+def _cell(fd, path):
+    v = fd
+    for k in path:
+        v = v.get(k) if isinstance(v, dict) else None
+    if isinstance(v, list):
+        return ", ".join(v)
+    return None if v in ("", None) else v
+
+
+def _workbook(path, fds, extra_rows=()):
+    header = list(dict.fromkeys(template_headers("standard") + template_headers("long_term"))) + ["Notes"]
+    proto_col, plan, _ = plan_columns(header)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Wear Tests")
+    ws.append(header)
+    for fd in fds:
+        row = [None] * len(header)
+        row[proto_col] = fd['protocol']
+        for i, p, _ in plan:
+            row[i] = _cell(fd, p)
+        ws.append(row)
+    for row in extra_rows:
+        ws.append(list(row(header)))
+    wb.save(path)
+
+
+def test_streamed_import_matches_the_sheet(tmp_path, forms):
+    fds = forms(23, seed=11) + forms(5, seed=12, protocol="long_term")
+    bad_score = lambda h: ["PO-BAD" if c == "PO Number" else "9" if c == "Comfort | Day 1" else None
+                           for c in h]
+    blank = lambda h: [None] * len(h)
+    _workbook(tmp_path / "in.xlsx", fds, extra_rows=[blank, bad_score])
+    store, seen = RecordStore(str(tmp_path / "records.db")), []
+
+    res = import_workbook(str(tmp_path / "in.xlsx"), store, batch_size=5, source="xlsx",
+                          progress=lambda done, total: seen.append(done))
+
+    assert (res["rows"], res["imported"], res["skipped"]) == (len(fds) + 1, len(fds), 1)
+    assert res["errors"][0][0] == len(fds) + 3 and "score" in res["errors"][0][1]
+    assert res["unknown_columns"] == ["Notes"]
+    assert len(seen) == len(fds) // 5 + 1 and seen == sorted(seen)
+    assert [fd for _, fd in store.iter_records()] == fds
+    assert rollups.assessment_count(store) == len(fds)
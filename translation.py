@@ -0,0 +1,336 @@
+"""
+Free-text translation for PDF reports via GPT-4o-mini.
+
+Independent of Streamlit: the caller passes the OpenAI client and the dict
+used as cache (the app hands in ``st.session_state.translations_cache``).
+
+API calls are single-flight across the whole process: while one session is
+waiting on the API for a (text, language) pair, other sessions asking for
+the same pair wait on that call instead of making their own. ``stats()``
+counts calls made and calls saved.
+
+``translate_within`` bounds the wait: it translates a batch concurrently
+and, at the deadline, hands back whatever has arrived plus the futures
+still pending, so a report can go out with ``PENDING_MARK`` on the
+untranslated strings and be rendered again when they land. A failed call
+returns the original text and is not retried for ``RETRY_AFTER`` seconds;
+it is no longer written to the session cache.
+
+Short strings are batched: ``translate_within`` packs those under
+``SHORT_TOKENS`` into one JSON-mode call per batch until a token budget is
+reached. With a usage log attached (``set_usage_log``), every call's
+tokens and latency are recorded and the budget is the largest batch the
+fitted latency model expects to finish within ``TARGET_LATENCY``; without
+one it is ``WEAR_TEST_TX_BATCH_TOKENS`` (0 turns batching off). A batch
+whose answer does not line up with its input falls back to one call per
+string.
+"""
+from concurrent.futures import Future, wait
+import json
+import os
+import re
+import threading
+import time
+
+from scheduler import INTERACTIVE, Scheduler
+
+DEADLINE     = 5.0             # seconds a report waits for translations
+API_TIMEOUT  = 30.0            # per OpenAI request
+RETRY_AFTER  = 60.0            # a failed (text, language) is not retried sooner
+PENDING_MARK = "【原文】"       # prefixed to text whose translation is still in flight
+
+BATCH_TOKENS   = int(os.getenv("WEAR_TEST_TX_BATCH_TOKENS", "600"))   # default budget, input + output
+BATCH_LIMITS   = (200, 4000)   # adaptive budget is clamped to this range
+BATCH_MAX_TEXTS = 40           # strings per batch, whatever the budget
+SHORT_TOKENS   = 150           # longer strings always go alone
+TARGET_LATENCY = 0.5 * DEADLINE
+OUT_PER_CHAR   = 0.6           # completion tokens per input character until the log says otherwise
+MODEL_TTL      = (60.0, 5.0)   # seconds between latency model refits: with a fit, still without one
+
+_inflight = {}                 # (text, language) -> Future of the API call
+_failed   = {}                 # (text, language) -> monotonic time it may be retried
+_lock     = threading.Lock()
+_stats    = {"api_calls": 0, "coalesced": 0, "failed": 0, "batched_calls": 0, "batched_texts": 0}
+_usage    = None               # translation_usage.UsageLog, if attached
+_model    = [0.0, None]        # [monotonic time fitted, (ms_per_call, ms_per_token, out_per_char)]
+# API calls are I/O bound: many workers, generous queues, same class ordering as renders
+_pool     = Scheduler(workers=16, depth=(512, 2048, 50_000), per_user=(64, 256, None),
+                      max_wait=(None, None, None), name="translate")
+
+
+def stats():
+    """
+    ``{"api_calls": made, "coalesced": saved by joining a call in flight,
+    "batched_calls"/"batched_texts": calls carrying several strings and
+    the strings they carried}``
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def set_usage_log(log):
+    """Record every API call in ``log`` (a translation_usage.UsageLog) and size batches from it."""
+    global _usage
+    _usage   = log
+    _model[:] = [0.0, None]
+
+
+def _fitted_model():
+    if _usage is None:
+        return None
+    now = time.monotonic()
+    if now - _model[0] > MODEL_TTL[_model[1] is None]:
+        _model[:] = [now, _usage.latency_model()]
+    return _model[1]
+
+
+def batch_budget():
+    """Token budget per batch: what the latency model says fits in ``TARGET_LATENCY``, else the default."""
+    model = _fitted_model()
+    if not BATCH_TOKENS or model is None:
+        return BATCH_TOKENS
+    per_call, per_token, _ = model
+    budget = (TARGET_LATENCY * 1000 - per_call) / per_token
+    return int(min(max(budget, BATCH_LIMITS[0]), BATCH_LIMITS[1]))
+
+
+def est_tokens(text):
+    """Rough input + output tokens for translating ``text``."""
+    model = _fitted_model()
+    ratio = model[2] if model else OUT_PER_CHAR
+    return len(text.encode()) // 4 + 1 + int(ratio * len(text)) + 1
+
+
+def plan_batches(texts, budget):
+    """
+    Group ``texts`` into batches of short strings, each within ``budget``
+    estimated tokens and ``BATCH_MAX_TEXTS`` strings; long strings, and
+    everything when ``budget`` is 0, get a batch of their own. Short
+    strings keep their order; a long one does not close the open batch.
+    """
+    batches, cur, used = [], [], 0
+    for t in texts:
+        n = est_tokens(t)
+        if not budget or n > SHORT_TOKENS:
+            batches.append([t])
+            continue
+        if cur and (used + n > budget or len(cur) >= BATCH_MAX_TEXTS):
+            batches.append(cur)
+            cur, used = [], 0
+        cur.append(t)
+        used += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def _single_flight(key, call):
+    """Run ``call()`` once per ``key`` at a time; concurrent callers share its result."""
+    with _lock:
+        fut    = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+        _stats["api_calls" if leader else "coalesced"] += 1
+    if not leader:
+        return fut.result()
+    try:
+        fut.set_result(call())
+    except BaseException as e:
+        fut.set_exception(e)
+    finally:
+        with _lock:
+            del _inflight[key]
+    return fut.result()
+
+
+def _create(client, texts, target_language, report, **kw):
+    """``chat.completions.create`` with the call's tokens and latency sent to the usage log."""
+    t0 = time.perf_counter()
+    try:
+        resp = client.chat.completions.create(model="gpt-4o-mini", temperature=0.1, timeout=API_TIMEOUT, **kw)
+    except Exception:
+        if _usage is not None:
+            _usage.call(report, target_language, len(texts), sum(map(len, texts)), 0, 0,
+                        time.perf_counter() - t0, ok=False)
+        raise
+    if _usage is not None:
+        u = getattr(resp, "usage", None)
+        _usage.call(report, target_language, len(texts), sum(map(len, texts)),
+                    getattr(u, "prompt_tokens", 0) or 0, getattr(u, "completion_tokens", 0) or 0,
+                    time.perf_counter() - t0)
+    return resp
+
+
+def _max_tokens(texts, floor):
+    # A cap, not a charge: twice the expected output leaves room without truncating
+    return max(floor, 2 * sum(est_tokens(t) for t in texts) + 16 * len(texts))
+
+
+def _api_translate(client, text, target_language, report=None):
+    lang_name = "Simplified Chinese" if target_language == "zh" else "English"
+    resp = _create(client, [text], target_language, report,
+        messages=[
+            {"role":"system","content":f"Translate to {lang_name}. Preserve all numbers, codes, measurements. Return ONLY the translation."},
+            {"role":"user","content":text}
+        ],
+        max_tokens=_max_tokens([text], 500)
+    )
+    return resp.choices[0].message.content.strip()
+
+
+def _api_translate_batch(client, texts, target_language, report=None):
+    """Translations of ``texts``, in order, from one JSON-mode call; ValueError if they do not line up."""
+    lang_name = "Simplified Chinese" if target_language == "zh" else "English"
+    resp = _create(client, texts, target_language, report,
+        messages=[
+            {"role":"system","content":f"Translate each string in the JSON array to {lang_name}. Preserve all numbers, codes, measurements. "
+                                       'Return ONLY a JSON object {"t": [...]} with one translation per string, in the same order.'},
+            {"role":"user","content":json.dumps(texts, ensure_ascii=False)}
+        ],
+        response_format={"type": "json_object"}, max_tokens=_max_tokens(texts, 200)
+    )
+    out = json.loads(resp.choices[0].message.content or "{}").get("t")
+    if not isinstance(out, list) or len(out) != len(texts) or not all(isinstance(x, str) for x in out):
+        raise ValueError(f"batch of {len(texts)} came back as {type(out).__name__}")
+    return [x.strip() for x in out]
+
+
+def _needs_api(text, target_language, cache):
+    """
+    True if ``text`` has to go to the API. Otherwise the cache entry is
+    set where the text is kept as is (numbers, codes, Chinese already).
+    """
+    cache_key = f"{text}|{target_language}"
+    if cache_key in cache:
+        return False
+    # Don't translate pure numbers / codes
+    clean = text.replace(' ', '').replace('-', '').replace('/', '')
+    if clean.isdigit() or re.match(r'^[A-Za-z]*\d+[A-Za-z]*$', clean):
+        cache[cache_key] = text
+        return False
+    # Already Chinese?
+    if re.search(r'[\u4e00-\u9fff]', text):
+        cache[cache_key] = text
+        return False
+    return _failed.get((text, target_language), 0) <= time.monotonic()
+
+
+def _mark_failed(key):
+    now = time.monotonic()
+    with _lock:
+        for k in [k for k, t in _failed.items() if t <= now]:
+            del _failed[k]
+        _failed[key] = now + RETRY_AFTER
+        _stats["failed"] += 1
+
+
+def translate_text(client, text, target_language="zh", cache=None, report=None):
+    """Translate free-form user text, memoising results in ``cache``."""
+    if not text or not text.strip():
+        return text
+    if not client:
+        return text
+    cache = {} if cache is None else cache
+    cache_key = f"{text}|{target_language}"
+    if not _needs_api(text, target_language, cache):
+        return cache.get(cache_key, text)
+    key = (text, target_language)
+    try:
+        result = _single_flight(key, lambda: _api_translate(client, text, target_language, report))
+        cache[cache_key] = result
+        return result
+    except Exception:
+        _mark_failed(key)
+        return text
+
+
+def _translate_batch(client, texts, target_language, cache, report, outs):
+    """
+    Translate ``texts`` with one API call and resolve ``outs[text]`` for
+    each. Strings already in flight elsewhere are joined, not re-sent; if
+    the batch fails, what it was leading is retried one call per string.
+    """
+    keys = [(t, target_language) for t in texts]
+    with _lock:
+        joined = {k: _inflight[k] for k in keys if k in _inflight}
+        led    = [k for k in keys if k not in joined]
+        for k in led:
+            _inflight[k] = Future()
+        _stats["coalesced"] += len(joined)
+        if led:
+            _stats["api_calls"] += 1
+        if len(led) > 1:
+            _stats["batched_calls"] += 1
+            _stats["batched_texts"] += len(led)
+    try:
+        results = None
+        if len(led) > 1:
+            try:
+                results = _api_translate_batch(client, [t for t, _ in led], target_language, report)
+            except Exception:
+                with _lock:
+                    _stats["api_calls"] += len(led)
+        if results is None:
+            results = []
+            for t, _ in led:
+                try:
+                    results.append(_api_translate(client, t, target_language, report))
+                except Exception as e:
+                    results.append(e)
+        for k, r in zip(led, results):
+            if isinstance(r, Exception):
+                _inflight[k].set_exception(r)
+            else:
+                _inflight[k].set_result(r)
+    finally:
+        with _lock:
+            futs = {k: _inflight.pop(k) for k in led}
+        for fut in futs.values():
+            if not fut.done():
+                fut.set_exception(RuntimeError("batch aborted"))
+    futs.update(joined)
+    for t, k in zip(texts, keys):
+        try:
+            cache[f"{t}|{target_language}"] = result = futs[k].result()
+        except Exception:
+            _mark_failed(k)
+            result = t
+        outs[t].set_result(result)
+
+
+def translate_within(client, texts, target_language="zh", cache=None, deadline=DEADLINE,
+                     priority=INTERACTIVE, user="", report=None):
+    """
+    Translate ``texts`` concurrently, waiting at most ``deadline`` seconds.
+    Returns ``(tx, pending)``: ``tx(text)`` gives the translation, or the
+    original behind ``PENDING_MARK`` if it has not arrived; ``pending`` is
+    the list of futures still running. ``priority``/``user`` place the calls
+    in the translation scheduler; ``report`` tags them in the usage log.
+    """
+    cache   = {} if cache is None else cache
+    unique  = [t for t in dict.fromkeys(texts) if t and t.strip()]
+    hits    = sum(f"{t}|{target_language}" in cache for t in unique)
+    todo    = [t for t in unique if client and _needs_api(t, target_language, cache)]
+    futures = {t: Future() for t in todo}
+    batches = plan_batches(todo, batch_budget())
+    for i, batch in enumerate(batches):
+        try:
+            _pool.submit(_translate_batch, client, batch, target_language, cache, report, futures,
+                         priority=priority, user=user)
+        except BaseException:
+            # Overloaded part-way: nothing will resolve the rest, so they keep their original text
+            for rest in batches[i:]:
+                for t in rest:
+                    futures[t].set_result(t)
+            raise
+    if _usage is not None and report is not None:
+        _usage.report(report, user, target_language, len(unique), hits)
+    _, pending = wait(futures.values(), timeout=deadline)
+
+    def tx(text):
+        fut = futures.get(text)
+        if fut is None:
+            return translate_text(client, text, target_language, cache, report)
+        return fut.result() if fut.done() else PENDING_MARK + text
+    return tx, list(pending)
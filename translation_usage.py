@@ -0,0 +1,190 @@
+"""
+Token, latency and cost accounting for translation calls.
+
+Every OpenAI request made by translation.py is logged with its report,
+number of strings, input characters, prompt/completion tokens, latency and
+outcome; every report translated through ``translate_within`` gets one row
+with how many of its strings were cache hits. Rows are queued and written
+by a background thread, so a call never waits on SQLite.
+
+``summary`` turns the log into totals, cost, cache hit rate, a latency
+histogram and latency by text length; ``latency_model`` fits latency
+against tokens, which translation.py uses to size its batches.
+
+Prices are USD per million tokens (gpt-4o-mini list prices by default):
+WEAR_TEST_TX_PRICE_IN / WEAR_TEST_TX_PRICE_OUT.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+USAGE_DB = os.getenv(
+    "WEAR_TEST_TX_USAGE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "translation_usage.db"))
+PRICE_IN  = float(os.getenv("WEAR_TEST_TX_PRICE_IN", "0.15"))
+PRICE_OUT = float(os.getenv("WEAR_TEST_TX_PRICE_OUT", "0.60"))
+
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000)      # upper bounds; the last bucket is open
+LENGTH_BUCKETS     = (40, 160, 640)                           # input characters per call
+
+_FLUSH = object()
+
+
+def cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens * PRICE_IN + completion_tokens * PRICE_OUT) / 1e6
+
+
+class UsageLog:
+    """SQLite log of translation calls and reports with a queued writer."""
+
+    def __init__(self, path=None):
+        self.path = path or USAGE_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS calls (
+                                id          INTEGER PRIMARY KEY,
+                                ts          REAL    NOT NULL,
+                                report      TEXT,
+                                language    TEXT    NOT NULL,
+                                texts       INTEGER NOT NULL,
+                                chars       INTEGER NOT NULL,
+                                prompt      INTEGER NOT NULL,
+                                completion  INTEGER NOT NULL,
+                                latency_ms  REAL    NOT NULL,
+                                ok          INTEGER NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS reports (
+                                report      TEXT PRIMARY KEY,
+                                ts          REAL    NOT NULL,
+                                user        TEXT,
+                                language    TEXT    NOT NULL,
+                                texts       INTEGER NOT NULL,
+                                cache_hits  INTEGER NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS calls_report ON calls (report)")
+        self._queue  = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="tx-usage-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ── Recording (any thread) ───────────────────────────────────────────────
+    def call(self, report, language, texts, chars, prompt, completion, latency, ok=True):
+        self._queue.put(("calls", (time.time(), report, language, texts, chars, prompt, completion,
+                                   latency * 1000, int(ok))))
+
+    def report(self, report, user, language, texts, cache_hits):
+        self._queue.put(("reports", (report, time.time(), user, language, texts, cache_hits)))
+
+    def flush(self, timeout=10):
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def _run(self):
+        conn = self._connect()
+        sql  = {"calls":   "INSERT INTO calls (ts, report, language, texts, chars, prompt, completion, "
+                           "latency_ms, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                "reports": "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)"}
+        while True:
+            items = [self._queue.get()]
+            while True:   # write whatever else is already queued in the same transaction
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = {"calls": [], "reports": []}
+            for table, row in items:
+                if table is not _FLUSH:
+                    rows[table].append(row)
+            with conn:
+                for table, batch in rows.items():
+                    if batch:
+                        conn.executemany(sql[table], batch)
+            for table, done in items:
+                if table is _FLUSH:
+                    done.set()
+
+    # ── Reading ──────────────────────────────────────────────────────────────
+    def _calls(self, since):
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT texts, chars, prompt, completion, latency_ms, ok FROM calls "
+                                "WHERE ts >= ?", (since,)).fetchall()
+            rep = conn.execute("SELECT COUNT(*), COALESCE(SUM(texts), 0), COALESCE(SUM(cache_hits), 0) "
+                               "FROM reports WHERE ts >= ?", (since,)).fetchone()
+        return np.array(rows, dtype=np.float64).reshape(-1, 6), rep
+
+    def summary(self, since=0.0):
+        """Totals, cost, cache hit rate and latency distribution since ``since`` (epoch seconds)."""
+        calls, (reports, texts, hits) = self._calls(since)
+        n_texts, chars, prompt, completion, lat, ok = calls.T
+        good  = ok > 0
+        edges = np.array(LATENCY_BUCKETS_MS, dtype=np.float64)
+        hist  = np.bincount(np.searchsorted(edges, lat[good]), minlength=len(edges) + 1)
+        size  = np.searchsorted(np.array(LENGTH_BUCKETS), chars[good])
+        by_len = []
+        for b in range(len(LENGTH_BUCKETS) + 1):
+            l = lat[good][size == b]
+            by_len.append({"chars": (f"<{LENGTH_BUCKETS[0]}" if b == 0 else f"{LENGTH_BUCKETS[b - 1]}+"
+                                     if b == len(LENGTH_BUCKETS) else f"{LENGTH_BUCKETS[b - 1]}-{LENGTH_BUCKETS[b]}"),
+                           "calls": int(len(l)),
+                           "p50_ms": float(np.median(l)) if len(l) else None,
+                           "p95_ms": float(np.percentile(l, 95)) if len(l) else None})
+        p_tok, c_tok = int(prompt.sum()), int(completion.sum())
+        return {
+            "reports":        int(reports),
+            "calls":          int(len(calls)),
+            "failed":         int((~good).sum()),
+            "texts_sent":     int(n_texts.sum()),
+            "texts_per_call": float(n_texts.mean()) if len(calls) else None,
+            "prompt_tokens":  p_tok,
+            "completion_tokens": c_tok,
+            "cost_usd":       cost(p_tok, c_tok),
+            "cost_per_report_usd": cost(p_tok, c_tok) / reports if reports else None,
+            "cache_hit_rate": hits / texts if texts else None,
+            "latency_p50_ms": float(np.median(lat[good])) if good.any() else None,
+            "latency_p95_ms": float(np.percentile(lat[good], 95)) if good.any() else None,
+            "latency_hist":   [(f"≤{int(e)}" if i < len(edges) else f">{int(edges[-1])}", int(h))
+                               for i, (e, h) in enumerate(zip(list(edges) + [np.inf], hist))],
+            "latency_by_length": by_len,
+        }
+
+    def recent_reports(self, limit=20):
+        """Per-report rows, newest first: strings, cache hits, calls, tokens, cost and API time."""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT r.report, r.ts, r.user, r.language, r.texts, r.cache_hits,
+                          COUNT(c.id), COALESCE(SUM(c.prompt), 0), COALESCE(SUM(c.completion), 0),
+                          COALESCE(MAX(c.latency_ms), 0)
+                   FROM reports r LEFT JOIN calls c ON c.report = r.report
+                   GROUP BY r.report ORDER BY r.ts DESC LIMIT ?""", (limit,)).fetchall()
+        cols = ("report", "ts", "user", "language", "texts", "cache_hits", "calls",
+                "prompt_tokens", "completion_tokens", "slowest_call_ms")
+        return [dict(zip(cols, r), cost_usd=cost(r[7], r[8])) for r in rows]
+
+    def latency_model(self, window=500, min_calls=20):
+        """
+        ``(ms_per_call, ms_per_token, completion_tokens_per_char)`` fitted
+        on the last ``window`` successful calls, or None with fewer than
+        ``min_calls`` of them.
+        """
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chars, prompt + completion, completion, latency_ms FROM calls "
+                                "WHERE ok = 1 ORDER BY id DESC LIMIT ?", (window,)).fetchall()
+        if len(rows) < min_calls:
+            return None
+        chars, tokens, completion, lat = np.array(rows, dtype=np.float64).T
+        if np.ptp(tokens) == 0:
+            return None
+        slope, intercept = np.polyfit(tokens, lat, 1)
+        return max(0.0, float(intercept)), max(1e-3, float(slope)), float(completion.sum() / max(1.0, chars.sum()))
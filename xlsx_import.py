@@ -0,0 +1,290 @@
+"""
+Bulk import of legacy wear-test workbooks into the record store.
+
+Expected layout: the first (or named) sheet has one header row, then one
+assessment per row. Columns, in any order:
+
+    basic info / sign-off   PO Number, Factory, Color, Style, Brand, Sample Type,
+                            Description, Fit Sizes, Testers, Protocol,
+                            Prepared By, Date, Approved By, Overall Result
+    fit answers             Upper Feel, Lining Feel, Sock Feel, Toe Length, ... Red Marks
+    extended-wear grid      "<period> | <question>"              (Yes / No)
+    daily scores            "Comfort | <day>", "Appearance | <day>", "Issues | <day>"
+
+Header matching ignores case, spacing and punctuation. Unknown columns are
+reported and skipped; missing columns and blank cells keep the blank-form
+defaults. A row with an unreadable cell is skipped and reported.
+
+Rows stream through openpyxl's read-only iterator and are written
+``batch_size`` at a time, one transaction per batch, so memory stays flat
+whatever the workbook size. ``write_template`` produces an empty workbook
+with every header for a protocol.
+"""
+from datetime import date, datetime
+import argparse
+import re
+import sys
+import time
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.datetime import from_excel
+
+from form_schema import (PROTOCOLS, SAMPLE_TYPES, FEEL_OPTIONS, TEXT_FIELDS, FEEL_FIELDS,
+                         YES_NO_FIELDS, get_protocol, ensure_protocol_fields, default_form_data)
+from records import RecordStore
+
+MAX_ERRORS = 100   # row errors kept in the result; the rest are only counted
+
+_YES = {"yes", "y", "true", "1", "x", "是"}
+_NO  = {"no", "n", "false", "0", "否"}
+
+_SCORE_GROUPS = {"comfort": "comfort_scores", "appearance": "appearance_scores", "issues": "issues"}
+_ALIASES      = {"po": "po_number", "po_no": "po_number", "date": "prep_date",
+                 "fit_size": "fit_sizes", "sizes": "fit_sizes", "tester": "testers",
+                 "result": "overall_result", "colour": "color"}
+
+
+def _norm(h):
+    return re.sub(r"[^0-9a-z\u4e00-\u9fff]+", "_", str(h).lower()).strip("_")
+
+
+# ─── Cell coercion ─────────────────────────────────────────────────────────────
+def _text(v):
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def _yes_no(v):
+    s = _text(v).lower()
+    if v is True or s in _YES:
+        return "Yes"
+    if v is False or s in _NO:
+        return "No"
+    raise ValueError(f"expected Yes/No, got {v!r}")
+
+
+def _choice(options):
+    by_norm = {_norm(o): o for o in options}
+
+    def coerce(v):
+        if isinstance(v, (int, float)) and 1 <= v <= len(options) and float(v).is_integer():
+            return options[int(v) - 1]
+        try:
+            return by_norm[_norm(v)]
+        except KeyError:
+            raise ValueError(f"expected one of {', '.join(options)}, got {v!r}") from None
+    return coerce
+
+
+def _score(v):
+    try:
+        n = float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected a score 1-5, got {v!r}") from None
+    if not n.is_integer() or not 1 <= n <= 5:
+        raise ValueError(f"expected a score 1-5, got {v!r}")
+    return int(n)
+
+
+def _date(v):
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    if isinstance(v, (int, float)):
+        return from_excel(v).date()
+    s = _text(v)
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%Y.%m.%d"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"unreadable date {v!r}")
+
+
+def _list(v):
+    return [s.strip() for s in re.split(r"[,;\n]", _text(v)) if s.strip()]
+
+
+def _protocol(v):
+    s = _norm(v)
+    for name, p in PROTOCOLS.items():
+        if s in (_norm(name), _norm(p['label']), _norm(p['label_zh'])):
+            return name
+    raise ValueError(f"unknown protocol {v!r}")
+
+
+_FIELD_COERCE = {
+    **{k: _text for k in TEXT_FIELDS},
+    **{k: _choice(FEEL_OPTIONS) for k in FEEL_FIELDS},
+    **{k: _yes_no for k in YES_NO_FIELDS},
+    'sample_type': _choice(SAMPLE_TYPES),
+    'fit_sizes':   _list,
+    'testers':     _list,
+    'prep_date':   _date,
+}
+
+
+# ─── Header → column plan ──────────────────────────────────────────────────────
+def _vocab(key):
+    """Normalised name -> canonical name, across every protocol."""
+    return {_norm(v): v for p in PROTOCOLS.values() for v in p[key]}
+
+
+def plan_columns(header):
+    """
+    Map a header row to ``(protocol column or None, [(col, path, coerce)], unknown)``.
+    ``path`` is ``(key,)`` or ``(key, subkey)`` into form_data.
+    """
+    periods, days, questions = _vocab('time_periods'), _vocab('days_to_track'), _vocab('questions')
+    proto_col, plan, unknown = None, [], []
+    for i, h in enumerate(header):
+        if h is None or not str(h).strip():
+            continue
+        if "|" in str(h):
+            left, right = (_norm(x) for x in str(h).split("|", 1))
+            if left in _SCORE_GROUPS and right in days:
+                group = _SCORE_GROUPS[left]
+                plan.append((i, (group, days[right]), _text if group == "issues" else _score))
+            elif left in periods and right in questions:
+                plan.append((i, ('extended_data', periods[left], questions[right]), _yes_no))
+            else:
+                unknown.append(str(h))
+            continue
+        key = _ALIASES.get(_norm(h), _norm(h))
+        if key == "protocol":
+            proto_col = i
+        elif key in _FIELD_COERCE:
+            plan.append((i, (key,), _FIELD_COERCE[key]))
+        else:
+            unknown.append(str(h))
+    return proto_col, plan, unknown
+
+
+def row_to_form_data(row, proto_col, plan):
+    """One worksheet row -> form_data. Raises ValueError naming the bad column."""
+    name = "standard"
+    if proto_col is not None and proto_col < len(row) and row[proto_col] not in (None, ""):
+        name = _protocol(row[proto_col])
+    fd = default_form_data(name)
+    for i, path, coerce in plan:
+        v = row[i] if i < len(row) else None
+        if v is None or (isinstance(v, str) and not v.strip()):
+            continue
+        try:
+            v = coerce(v)
+        except ValueError as e:
+            raise ValueError(f"column {i + 1}: {e}") from None
+        node = fd
+        for k in path[:-1]:
+            node = node.setdefault(k, {})
+        node[path[-1]] = v
+    return ensure_protocol_fields(fd, get_protocol(name))
+
+
+# ─── Import ────────────────────────────────────────────────────────────────────
+def import_workbook(src, store=None, sheet=None, batch_size=1000, progress=None, source=None):
+    """
+    Stream ``src`` (path or binary file object) into ``store``.
+
+    ``progress(rows_done, rows_total)`` is called after every batch; the
+    total comes from the sheet's dimension record and may be None.
+    Returns a summary dict: rows, imported, skipped, errors, unknown_columns.
+    """
+    store = store or RecordStore()
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        total = ws.max_row - 1 if ws.max_row else None
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("the sheet is empty")
+        proto_col, plan, unknown = plan_columns(header)
+        if not plan:
+            raise ValueError("no recognised columns in the header row")
+
+        result = {"rows": 0, "imported": 0, "skipped": 0, "errors": [], "unknown_columns": unknown}
+        batch = []
+        for n, row in enumerate(rows, start=2):
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in row):
+                continue
+            result["rows"] += 1
+            try:
+                batch.append(row_to_form_data(row, proto_col, plan))
+            except ValueError as e:
+                result["skipped"] += 1
+                if len(result["errors"]) < MAX_ERRORS:
+                    result["errors"].append((n, str(e)))
+            if len(batch) >= batch_size:
+                result["imported"] += store.insert_many(batch, source)
+                batch = []
+                if progress:
+                    progress(n - 1, total)
+        if batch:
+            result["imported"] += store.insert_many(batch, source)
+        if progress:
+            progress(total or result["rows"], total or result["rows"])
+        return result
+    finally:
+        wb.close()
+
+
+def template_headers(protocol="standard"):
+    """Every column header the importer understands for ``protocol``."""
+    proto = get_protocol(protocol)
+    pretty = lambda k: {"po_number": "PO Number", "prep_date": "Date"}.get(k, k.replace("_", " ").title())
+    head = [pretty(k) for k in TEXT_FIELDS[:6]] + ["Sample Type", "Fit Sizes", "Testers", "Protocol"]
+    head += [pretty(k) for k in FEEL_FIELDS + YES_NO_FIELDS]
+    head += [f"{p} | {q}" for p in proto['time_periods'] for q in proto['questions']]
+    head += [f"{g} | {d}" for g in ("Comfort", "Appearance", "Issues") for d in proto['days_to_track']]
+    head += [pretty(k) for k in ("prepared_by", "prep_date", "approved_by", "overall_result")]
+    return head
+
+
+def write_template(path, protocol="standard"):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Wear Tests")
+    ws.append(template_headers(protocol))
+    wb.save(path)
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import legacy wear-test workbooks into the record store.")
+    ap.add_argument("workbook", help=".xlsx to import (or to create, with --template)")
+    ap.add_argument("--db", help="record store path (default: WEAR_TEST_RECORDS_DB or data/records.db)")
+    ap.add_argument("--sheet", help="sheet name (default: the first sheet)")
+    ap.add_argument("--batch", type=int, default=1000, help="rows per transaction")
+    ap.add_argument("--template", action="store_true", help="write an empty template instead of importing")
+    ap.add_argument("--protocol", default="standard", help="protocol for --template")
+    args = ap.parse_args(argv)
+
+    if args.template:
+        write_template(args.workbook, args.protocol)
+        print(f"wrote {args.workbook} ({len(template_headers(args.protocol))} columns)")
+        return
+
+    t0 = time.perf_counter()
+
+    def progress(done, total):
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        of   = f" / {total:,} ({done / total:.0%})" if total else ""
+        print(f"\r  {done:,}{of} rows  {rate:,.0f} rows/s", end="", file=sys.stderr)
+
+    res = import_workbook(args.workbook, RecordStore(args.db), args.sheet, args.batch, progress,
+                          source=args.workbook)
+    print(file=sys.stderr)
+    print(f"imported {res['imported']:,} of {res['rows']:,} rows in {time.perf_counter() - t0:.1f}s, "
+          f"skipped {res['skipped']:,}")
+    for n, msg in res["errors"]:
+        print(f"  row {n}: {msg}")
+    if res["skipped"] > len(res["errors"]):
+        print(f"  ... and {res['skipped'] - len(res['errors']):,} more")
+    if res["unknown_columns"]:
+        print("ignored columns: " + ", ".join(res["unknown_columns"]))
+
+
+if __name__ == "__main__":
+    main()